@@ -1,32 +1,10 @@
-import os
-
-import psycopg2
-import psycopg2.extras
 import service.eventService as Events
 from flask import Flask, jsonify, request
 from init_db import init_db
-from psycopg2 import OperationalError
 
 app = Flask(__name__)
 
 
-def get_db_connection():
-    try:
-        pg_user = os.getenv("POSTGRES_USER", "genai_super")
-        pg_pass = os.getenv("POSTGRES_PASSWORD", "mypassword")
-        pg_db = os.getenv("POSTGRES_DB", "mydb")
-        pg_host = os.getenv("POSTGRES_HOST", "0.0.0.0")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-
-        connection = psycopg2.connect(
-            host=pg_host, port=pg_port, database=pg_db, user=pg_user, password=pg_pass
-        )
-        return connection
-    except OperationalError as e:
-        print(f"Error: {e}")
-        return None
-
-
 @app.route("/api/events", methods=["POST"])
 def add_event():
     event_data = request.get_json()
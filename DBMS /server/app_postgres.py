@@ -1,42 +1,236 @@
+import hashlib
+import hmac
+import io
+import logging
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from functools import wraps
 
 import jwt
 import psycopg2
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from psycopg2.extras import DictCursor
-from werkzeug.security import check_password_hash, generate_password_hash
+
+import bulk_import
+import geo
+import invalidation
+import jobs
+import recommendations
+import reports
+import search
+import tracing
+from cache import TTLCache
+from db import get_db_connection, pool_stats
+from hashing import HashPoolBusy, hash_password, needs_rehash, verify_password
+from metrics import CONTENT_TYPE, REGISTRY
+from pagination import decode_cursor, encode_cursor, parse_limit
+from registrations import (
+    SETTABLE_STATUSES,
+    bulk_update_status,
+    parse_capacity,
+    register_for_event,
+    update_status,
+)
+from streaming import EXPORT_FORMATS, stream_copy_export, stream_json_array
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
 
-# PostgreSQL configurations
-pg_user = os.getenv("POSTGRES_USER", "genai_super")
-pg_pass = os.getenv("POSTGRES_PASSWORD", "mypassword")
-pg_db = os.getenv("POSTGRES_DB", "mydb")
-pg_host = os.getenv("POSTGRES_HOST", "0.0.0.0")
-pg_port = os.getenv("POSTGRES_PORT", "5432")
+class TimedJSONProvider(DefaultJSONProvider):
+    """Adds the time spent encoding JSON to the current request's total."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            with tracing.span("json.dumps", "serialize"):
+                return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context():
+                g.serialization_time = (
+                    g.get("serialization_time", 0.0) + time.perf_counter() - started
+                )
+
+
+class App(Flask):
+    json_provider_class = TimedJSONProvider
+
+
+app = App(__name__)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Debug-Timing"])
 
 # JWT configurations
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=1)
 
-
-def get_db_connection():
-    try:
-        connection = psycopg2.connect(
-            host=pg_host, port=pg_port, database=pg_db, user=pg_user, password=pg_pass
+# Authenticated principals (id, role, name) keyed by user id, so token_required
+# does not hit the users table on every request
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+)
+
+# Read-through cache for GET /api/events/<id>; event writes evict their entry
+event_cache = TTLCache(
+    maxsize=int(os.getenv("EVENT_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("EVENT_CACHE_TTL", "30")),
+)
+
+# Per-user recommendation lists; a new registration evicts the user's entry
+recommendation_cache = TTLCache(
+    maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "300")),
+)
+
+
+def _evict_event(payload):
+    if payload["op"] == invalidation.RESET:
+        event_cache.clear()
+    else:
+        event_cache.invalidate(payload["id"])
+
+
+def _evict_event_counts(payload):
+    # Registrations and feedback change the live counters of their event
+    if payload["op"] == invalidation.RESET:
+        event_cache.clear()
+    elif payload.get("event_id") is not None:
+        event_cache.invalidate(payload["event_id"])
+
+
+def _evict_organized_events(payload):
+    # Cached events carry their organizer's name
+    if payload["op"] != invalidation.RESET:
+        event_cache.invalidate_where(lambda event: event["organizer_id"] == payload["id"])
+
+
+def _evict_recommendations(payload):
+    if payload["op"] == invalidation.RESET:
+        recommendation_cache.clear()
+    elif payload.get("user_id") is not None:
+        recommendation_cache.invalidate(payload["user_id"])
+
+
+def _evict_principal(payload):
+    if payload["op"] == invalidation.RESET:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate(payload["id"])
+
+
+# Writes made by other workers reach this process through LISTEN/NOTIFY
+invalidation.subscribe("events", _evict_event)
+invalidation.subscribe("users", _evict_principal)
+invalidation.subscribe("users", _evict_organized_events)
+invalidation.subscribe("registrations", _evict_event_counts)
+invalidation.subscribe("registrations", _evict_recommendations)
+invalidation.subscribe("feedback", _evict_event_counts)
+
+
+REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time to build the response, excluding streamed bodies",
+    ("method", "route", "status"),
+)
+SERIALIZATION_TIME = REGISTRY.histogram(
+    "http_response_serialization_seconds", "Time spent encoding JSON per request", ("route",)
+)
+
+
+def _pool_metrics():
+    stats = pool_stats()
+    return {
+        ("in_use",): stats["in_use"],
+        ("idle",): stats["idle"],
+        ("max",): stats["max_size"],
+    }
+
+
+def _cache_metrics():
+    caches = {
+        "events": event_cache,
+        "principals": principal_cache,
+        "recommendations": recommendation_cache,
+    }
+    return {
+        (name, result): cache.stats()[result]
+        for name, cache in caches.items()
+        for result in ("hits", "misses")
+    }
+
+
+REGISTRY.callback(
+    "db_pool_connections", "Connections in this worker's pool", ("state",), _pool_metrics
+)
+REGISTRY.callback(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up waiting for a connection",
+    (),
+    lambda: {(): pool_stats()["timeouts"]},
+    kind="counter",
+)
+REGISTRY.callback(
+    "cache_lookups_total",
+    "Cache lookups by result",
+    ("cache", "result"),
+    _cache_metrics,
+    kind="counter",
+)
+
+# Optional bearer token for scrapers; /metrics is open when it is unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Lets clients send X-Debug-Timing: 1 to get the breakdown of their request.
+# Off by default: it forces a trace and exposes server timings to anyone
+DEBUG_TIMING = os.getenv("TRACE_DEBUG_TIMING", "0").lower() in ("1", "true")
+
+
+@app.before_request
+def start_request_instrumentation():
+    g.request_started = time.perf_counter()
+    # The rule template, not the path, keeps label cardinality bounded
+    g.route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.debug_timing = DEBUG_TIMING and request.headers.get("X-Debug-Timing") == "1"
+    g.trace = tracing.start_trace(
+        f"{request.method} {g.route}",
+        traceparent=request.headers.get("traceparent"),
+        force=g.debug_timing,
+        **{"http.method": request.method, "http.target": request.path},
+    )
+
+
+@app.after_request
+def finish_request_instrumentation(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started, request.method, g.route, str(response.status_code)
         )
-        return connection
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+        serialization_time = g.pop("serialization_time", None)
+        if serialization_time is not None:
+            SERIALIZATION_TIME.observe(serialization_time, g.route)
+    trace = g.pop("trace", None)
+    if trace is not None:
+        tracing.finish_trace(trace, **{"http.status_code": response.status_code})
+        if g.debug_timing:
+            response.headers["X-Debug-Timing"] = trace.timing_header()
+    return response
+
+
+@app.before_request
+def start_background_workers():
+    with tracing.span("start_background_workers", "middleware"):
+        invalidation.ensure_listener()
+        reports.ensure_refresher()
+        recommendations.ensure_embedder()
+        geo.ensure_location_type()
 
 
 def token_required(f):
@@ -49,17 +243,20 @@ def token_required(f):
         if not token:
             return jsonify({"message": "Token is missing"}), 401
 
-        try:
-            data = jwt.decode(token, app.config["JWT_SECRET_KEY"], algorithms=["HS256"])
-            current_user = get_user_by_id(data["user_id"])
+        with tracing.span("token_required", "auth"):
+            try:
+                data = jwt.decode(
+                    token, app.config["JWT_SECRET_KEY"], algorithms=["HS256"]
+                )
+                current_user = get_principal(data["user_id"])
 
-            if not current_user:
-                return jsonify({"message": "Invalid token"}), 401
+                if not current_user:
+                    return jsonify({"message": "Invalid token"}), 401
 
-        except jwt.ExpiredSignatureError:
-            return jsonify({"message": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"message": "Invalid token"}), 401
+            except jwt.ExpiredSignatureError:
+                return jsonify({"message": "Token has expired"}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({"message": "Invalid token"}), 401
 
         return f(current_user, *args, **kwargs)
 
@@ -73,16 +270,54 @@ def get_user_by_id(user_id):
 
     try:
         with connection.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+            cur.execute("SELECT id, role, name FROM users WHERE id = %s", (user_id,))
             user = cur.fetchone()
             return dict(user) if user else None
     except Exception as e:
-        print(f"Error getting user: {e}")
+        logger.exception("Error getting user: %s", e)
         return None
     finally:
         connection.close()
 
 
+def get_principal(user_id):
+    """Return the cached {id, role, name} record for user_id, loading it on a miss."""
+    return principal_cache.get_or_load(user_id, lambda: get_user_by_id(user_id))
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
+
+
+def server_busy():
+    response = jsonify({"message": "Server busy, please retry shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def upgrade_password_hash(user_id, password):
+    """Re-hash a password with the current parameters after a successful login."""
+    try:
+        new_hash = hash_password(password)
+    except HashPoolBusy:
+        # Try again on a later login rather than slowing this one down
+        return
+    connection = get_db_connection()
+    if connection is None:
+        return
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                "UPDATE users SET password = %s WHERE id = %s", (new_hash, user_id)
+            )
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Error upgrading password hash: %s", e)
+    finally:
+        connection.close()
+
+
 # Auth routes
 @app.route("/api/auth/register", methods=["POST"])
 def register():
@@ -93,27 +328,24 @@ def register():
     if not all(field in data for field in required_fields):
         return jsonify({"message": "Missing required fields"}), 400
 
+    # Hash before borrowing a connection so the KDF never holds a pool slot
+    try:
+        hashed_password = hash_password(data["password"])
+    except HashPoolBusy:
+        return server_busy()
+
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
 
     try:
-        # Check if user already exists
         with connection.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE email = %s", (data["email"],))
-            user = cur.fetchone()
-
-            if user:
-                return jsonify({"message": "User already exists"}), 409
-
-            # Hash password
-            hashed_password = generate_password_hash(data["password"])
-
-            # Insert new user
+            # The unique email constraint doubles as the "already exists" check
             cur.execute(
                 """
                 INSERT INTO users (name, email, password, phone, age, gender, role)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (email) DO NOTHING
                 RETURNING id, name, email, role
             """,
                 (
@@ -126,11 +358,17 @@ def register():
                     data.get("role", "participant"),
                 ),
             )
-            connection.commit()
-
             # Get the newly created user
             new_user = cur.fetchone()
 
+            if not new_user:
+                connection.rollback()
+                return jsonify({"message": "User already exists"}), 409
+
+            # Delivered by the job workers; committed with the user
+            jobs.enqueue(cur, "welcome", {"user_id": new_user["id"]})
+            connection.commit()
+
             # Generate token
             token = jwt.encode(
                 {
@@ -162,54 +400,312 @@ def login():
 
     try:
         with connection.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE email = %s", (data["email"],))
+            cur.execute(
+                "SELECT id, name, email, role, password FROM users WHERE email = %s",
+                (data["email"],),
+            )
             user = cur.fetchone()
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+    finally:
+        # Released before verifying so the KDF never holds a pool slot
+        connection.close()
+
+    try:
+        if not user or not verify_password(user["password"], data["password"]):
+            return jsonify({"message": "Invalid email or password"}), 401
+    except HashPoolBusy:
+        return server_busy()
+
+    if needs_rehash(user["password"]):
+        upgrade_password_hash(user["id"], data["password"])
+
+    token = jwt.encode(
+        {
+            "user_id": user["id"],
+            "exp": datetime.utcnow() + app.config["JWT_ACCESS_TOKEN_EXPIRES"],
+        },
+        app.config["JWT_SECRET_KEY"],
+    )
+
+    return jsonify(
+        {
+            "token": token,
+            "user": {
+                "id": user["id"],
+                "name": user["name"],
+                "email": user["email"],
+                "role": user["role"],
+            },
+        }
+    ), 200
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date") from e
 
-            if not user or not check_password_hash(user["password"], data["password"]):
-                return jsonify({"message": "Invalid email or password"}), 401
 
-            token = jwt.encode(
-                {
-                    "user_id": user["id"],
-                    "exp": datetime.utcnow() + app.config["JWT_ACCESS_TOKEN_EXPIRES"],
-                },
-                app.config["JWT_SECRET_KEY"],
+def _parse_decimal(value, name):
+    try:
+        return Decimal(value)
+    except InvalidOperation as e:
+        raise ValueError(f"{name} must be a number") from e
+
+
+def build_event_filters(args):
+    """
+    Translate event list query parameters into SQL conditions on alias ``e``
+
+    Supported parameters: status, category, date_from, date_to, fee_min,
+    fee_max. Raises ValueError on malformed input.
+
+    Returns:
+        (list of SQL condition strings, list of parameters)
+    """
+    clauses = []
+    params = []
+
+    if args.get("status"):
+        clauses.append("e.status = %s")
+        params.append(args["status"])
+    if args.get("category"):
+        clauses.append("e.category = %s")
+        params.append(args["category"])
+    if args.get("date_from"):
+        clauses.append("e.event_date >= %s")
+        params.append(_parse_date(args["date_from"], "date_from"))
+    if args.get("date_to"):
+        clauses.append("e.event_date <= %s")
+        params.append(_parse_date(args["date_to"], "date_to"))
+    if args.get("fee_min"):
+        clauses.append("e.fee >= %s")
+        params.append(_parse_decimal(args["fee_min"], "fee_min"))
+    if args.get("fee_max"):
+        clauses.append("e.fee <= %s")
+        params.append(_parse_decimal(args["fee_max"], "fee_max"))
+
+    return clauses, params
+
+
+# Live per-event counters, summed over the shard rows that the event_stats
+# triggers maintain (at most 8 rows per event, read through the primary key)
+EVENT_STATS_JOIN = """
+        LEFT JOIN LATERAL (
+            SELECT
+                COALESCE(sum(s.registered), 0) AS registered_count,
+                COALESCE(sum(s.confirmed), 0) AS confirmed_count,
+                COALESCE(sum(s.waitlisted), 0) AS waitlisted_count,
+                COALESCE(sum(s.rating_count), 0) AS rating_count,
+                round(sum(s.rating_sum)::numeric / NULLIF(sum(s.rating_count), 0), 2)
+                    AS avg_rating
+            FROM event_stats s
+            WHERE s.event_id = e.id
+        ) st ON true"""
+
+# Columns that make up an event row's version for ETags. The organizer's
+# name is part of the body but not of the event row, so it is included as is
+EVENT_VERSION_COLUMNS = (
+    "id",
+    "updated_at",
+    "organizer_name",
+    "registered_count",
+    "confirmed_count",
+    "waitlisted_count",
+    "rating_count",
+    "avg_rating",
+)
+
+
+def build_event_page_query(args, paginate=True, fingerprint=False):
+    """
+    Build the keyset-paginated event list query for the request arguments
+
+    Pages are ordered by (event_date, id); ``cursor`` is the opaque value
+    returned in the X-Next-Cursor header of the previous page. One extra row
+    is fetched to detect whether another page exists. With paginate=False
+    the query has no LIMIT and limit is None. With fingerprint=True only
+    the version columns of the same rows are selected, for ETag checks.
+
+    Returns:
+        (sql, params, limit)
+    """
+    limit = parse_limit(args.get("limit")) if paginate else None
+    clauses, params = build_event_filters(args)
+
+    if args.get("cursor"):
+        last_date, last_id = decode_cursor(args["cursor"], 2)
+        try:
+            params.extend([date.fromisoformat(last_date), int(last_id)])
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        clauses.append("(e.event_date, e.id) > (%s, %s)")
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    if fingerprint:
+        source = f"""SELECT e.id, e.updated_at, u.name as organizer_name, st.*
+        FROM events e
+        LEFT JOIN users u ON e.organizer_id = u.id
+        {EVENT_STATS_JOIN}"""
+    else:
+        source = f"""SELECT e.*, u.name as organizer_name, st.*
+        FROM events e
+        LEFT JOIN users u ON e.organizer_id = u.id
+        {EVENT_STATS_JOIN}"""
+    sql = f"""
+        {source}
+        {where}
+        ORDER BY e.event_date, e.id
+    """
+    if limit is not None:
+        sql += "LIMIT %s"
+        params.append(limit + 1)
+    return sql, params, limit
+
+
+def events_etag(rows):
+    """Strong ETag over the row versions, organizer names and counters of event rows."""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(
+            (":".join(str(row[column]) for column in EVENT_VERSION_COLUMNS) + ";").encode()
+        )
+    return digest.hexdigest()
+
+
+def not_modified(etag):
+    """Return a 304 response if the request's If-None-Match matches etag."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Let clients store the body but revalidate it on every use
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def next_event_cursor(rows, limit):
+    """Return the cursor for the page after rows, or None on the last page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last["event_date"].isoformat(), last["id"])
+
+
+# Event routes
+@app.route("/api/events", methods=["GET"])
+def get_events():
+    # stream=1 returns every matching event as a streamed array instead of a page
+    stream = request.args.get("stream", "").lower() in ("1", "true")
+    try:
+        sql, params, limit = build_event_page_query(request.args, paginate=not stream)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if stream:
+        return stream_json_array(sql, params)
+
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            if request.if_none_match:
+                # Revalidation only needs the versions of the rows on the page
+                fp_sql, fp_params, _ = build_event_page_query(
+                    request.args, fingerprint=True
+                )
+                cur.execute(fp_sql, fp_params)
+                unchanged = not_modified(events_etag(cur.fetchall()))
+                if unchanged:
+                    return unchanged
+
+            cur.execute(sql, params)
+            events = cur.fetchall()
+
+            response = jsonify([dict(event) for event in events[:limit]])
+            next_cursor = next_event_cursor(events, limit)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return with_etag(response, events_etag(events)), 200
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+    finally:
+        connection.close()
+
+
+@app.route("/api/events/search", methods=["GET"])
+def search_events():
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        try:
+            backend, trigram = search.detect_backend(connection)
+        except search.SearchUnavailable as e:
+            return jsonify({"message": str(e)}), 503
+        try:
+            sql, params, limit = search.build_search_query(
+                request.args, backend, trigram, build_event_filters(request.args)
             )
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
 
-            return jsonify(
-                {
-                    "token": token,
-                    "user": {
-                        "id": user["id"],
-                        "name": user["name"],
-                        "email": user["email"],
-                        "role": user["role"],
-                    },
-                }
-            ), 200
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(sql, params)
+            events = cur.fetchall()
+
+        response = jsonify([dict(event) for event in events[:limit]])
+        next_cursor = search.next_search_cursor(events, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
     except Exception as e:
+        connection.rollback()
         return jsonify({"message": str(e)}), 500
     finally:
         connection.close()
 
 
-# Event routes
-@app.route("/api/events", methods=["GET"])
-def get_events():
+@app.route("/api/events/nearby", methods=["GET"])
+def nearby_events():
+    try:
+        geo.require_location()
+    except geo.LocationUnavailable as e:
+        return jsonify({"message": str(e)}), 503
+    try:
+        sql, params, limit = geo.build_nearby_query(
+            request.args, build_event_filters(request.args), EVENT_STATS_JOIN
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
 
     try:
         with connection.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("""
-                SELECT e.*, u.name as organizer_name 
-                FROM events e 
-                LEFT JOIN users u ON e.organizer_id = u.id
-            """)
+            cur.execute(sql, params)
             events = cur.fetchall()
-            return jsonify([dict(event) for event in events]), 200
+
+        response = jsonify([dict(event) for event in events[:limit]])
+        next_cursor = geo.next_nearby_cursor(events, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
     except Exception as e:
+        connection.rollback()
         return jsonify({"message": str(e)}), 500
     finally:
         connection.close()
@@ -217,6 +713,11 @@ def get_events():
 
 @app.route("/api/events/<int:event_id>", methods=["GET"])
 def get_event(event_id):
+    event = event_cache.get(event_id)
+    if event is not None:
+        etag = events_etag([event])
+        return not_modified(etag) or (with_etag(jsonify(event), etag), 200)
+
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
@@ -224,10 +725,11 @@ def get_event(event_id):
     try:
         with connection.cursor(cursor_factory=DictCursor) as cur:
             cur.execute(
-                """
-                SELECT e.*, u.name as organizer_name 
-                FROM events e 
-                LEFT JOIN users u ON e.organizer_id = u.id 
+                f"""
+                SELECT e.*, u.name as organizer_name, st.*
+                FROM events e
+                LEFT JOIN users u ON e.organizer_id = u.id
+                {EVENT_STATS_JOIN}
                 WHERE e.id = %s
             """,
                 (event_id,),
@@ -237,7 +739,10 @@ def get_event(event_id):
             if not event:
                 return jsonify({"message": "Event not found"}), 404
 
-            return jsonify(dict(event)), 200
+            event = dict(event)
+            event_cache.set(event_id, event)
+            etag = events_etag([event])
+            return not_modified(etag) or (with_etag(jsonify(event), etag), 200)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
     finally:
@@ -263,6 +768,11 @@ def create_event(current_user):
 
     if not all(field in data for field in required_fields):
         return jsonify({"message": "Missing required fields"}), 400
+    try:
+        capacity = parse_capacity(data.get("capacity"))
+        location = geo.location_from_payload(data)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     connection = get_db_connection()
     if connection is None:
@@ -274,9 +784,10 @@ def create_event(current_user):
                 """
                 INSERT INTO events (
                     name, event_date, venue, category, description,
-                    image, status, registration_deadline, fee, organizer_id
+                    image, status, registration_deadline, fee, organizer_id,
+                    capacity
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING *
             """,
                 (
@@ -290,13 +801,19 @@ def create_event(current_user):
                     data["registration_deadline"],
                     data["fee"],
                     current_user["id"],
+                    capacity,
                 ),
             )
+            new_event = cur.fetchone()
+            if location:
+                new_event = geo.set_event_location(cur, new_event["id"], location)
             connection.commit()
 
-            # Get the newly created event
-            new_event = cur.fetchone()
+            event_cache.invalidate(new_event["id"])
             return jsonify(dict(new_event)), 201
+    except geo.LocationUnavailable as e:
+        connection.rollback()
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         connection.rollback()
         return jsonify({"message": str(e)}), 500
@@ -304,66 +821,147 @@ def create_event(current_user):
         connection.close()
 
 
+# Columns PUT /api/events/<id> may change; only the ones present in the body
+# are written
+EVENT_UPDATABLE_COLUMNS = (
+    "name",
+    "event_date",
+    "venue",
+    "category",
+    "description",
+    "image",
+    "status",
+    "registration_deadline",
+    "fee",
+    "capacity",
+)
+
+
 @app.route("/api/events/<int:event_id>", methods=["PUT"])
 @token_required
 def update_event(current_user, event_id):
     if current_user["role"] not in ["admin", "organizer"]:
         return jsonify({"message": "Unauthorized"}), 403
 
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+    params = {
+        "id": event_id,
+        "user_id": current_user["id"],
+        "is_admin": current_user["role"] == "admin",
+    }
+    assignments = []
+    for column in EVENT_UPDATABLE_COLUMNS:
+        if column in data:
+            assignments.append(f"{column} = %({column})s")
+            params[column] = data[column]
+    try:
+        if "capacity" in data:
+            params["capacity"] = parse_capacity(data["capacity"])
+        location = geo.location_from_payload(data)
+        if location:
+            geo.require_location()
+            assignments.append(
+                "location = ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography"
+            )
+            params["lat"], params["lng"] = location
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except geo.LocationUnavailable as e:
+        return jsonify({"message": str(e)}), 400
+    if not assignments:
+        return jsonify({"message": "No fields to update"}), 400
+
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
 
     try:
         with connection.cursor(cursor_factory=DictCursor) as cur:
-            # Check if event exists and user has permission
-            cur.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-            event = cur.fetchone()
+            # Existence and ownership are decided by the UPDATE itself; the
+            # target CTE only tells "not found" apart from "not yours"
+            cur.execute(
+                f"""
+                WITH target AS (
+                    SELECT id FROM events WHERE id = %(id)s
+                ),
+                updated AS (
+                    UPDATE events SET {", ".join(assignments)}
+                    WHERE id = %(id)s
+                        AND (%(is_admin)s OR organizer_id = %(user_id)s)
+                    RETURNING *
+                )
+                SELECT EXISTS (SELECT 1 FROM target) AS event_found, updated.*
+                FROM (SELECT 1) AS one
+                LEFT JOIN updated ON true
+            """,
+                params,
+            )
+            result = dict(cur.fetchone())
+            connection.commit()
 
-            if not event:
-                return jsonify({"message": "Event not found"}), 404
+        if not result.pop("event_found"):
+            return jsonify({"message": "Event not found"}), 404
+        if result["id"] is None:
+            return jsonify({"message": "Unauthorized"}), 403
+
+        event_cache.invalidate(event_id)
+        return jsonify(result), 200
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        connection.rollback()
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        connection.rollback()
+        return jsonify({"message": str(e)}), 500
+    finally:
+        connection.close()
 
-            if (
-                current_user["role"] != "admin"
-                and event["organizer_id"] != current_user["id"]
-            ):
-                return jsonify({"message": "Unauthorized"}), 403
 
-            # Update event
+@app.route("/api/events/<int:event_id>", methods=["DELETE"])
+@token_required
+def delete_event(current_user, event_id):
+    if current_user["role"] not in ["admin", "organizer"]:
+        return jsonify({"message": "Unauthorized"}), 403
+
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        with connection.cursor() as cur:
             cur.execute(
                 """
-                UPDATE events SET
-                    name = %s,
-                    event_date = %s,
-                    venue = %s,
-                    category = %s,
-                    description = %s,
-                    image = %s,
-                    status = %s,
-                    registration_deadline = %s,
-                    fee = %s
-                WHERE id = %s
-                RETURNING *
-            """,
-                (
-                    data["name"],
-                    data["event_date"],
-                    data["venue"],
-                    data["category"],
-                    data["description"],
-                    data.get("image", event["image"]),
-                    data.get("status", event["status"]),
-                    data["registration_deadline"],
-                    data["fee"],
-                    event_id,
+                WITH target AS (
+                    SELECT id FROM events WHERE id = %(id)s
                 ),
+                deleted AS (
+                    DELETE FROM events
+                    WHERE id = %(id)s
+                        AND (%(is_admin)s OR organizer_id = %(user_id)s)
+                    RETURNING id
+                )
+                SELECT EXISTS (SELECT 1 FROM target), EXISTS (SELECT 1 FROM deleted)
+            """,
+                {
+                    "id": event_id,
+                    "user_id": current_user["id"],
+                    "is_admin": current_user["role"] == "admin",
+                },
             )
+            found, deleted = cur.fetchone()
             connection.commit()
 
-            # Get updated event
-            updated_event = cur.fetchone()
-            return jsonify(dict(updated_event)), 200
+        if not found:
+            return jsonify({"message": "Event not found"}), 404
+        if not deleted:
+            return jsonify({"message": "Unauthorized"}), 403
+
+        event_cache.invalidate(event_id)
+        return jsonify({"message": "Event deleted successfully"}), 200
+    except psycopg2.IntegrityError:
+        connection.rollback()
+        return jsonify(
+            {"message": "Event cannot be deleted while it has registrations, teams, feedback or results"}
+        ), 409
     except Exception as e:
         connection.rollback()
         return jsonify({"message": str(e)}), 500
@@ -371,36 +969,159 @@ def update_event(current_user, event_id):
         connection.close()
 
 
-@app.route("/api/events/<int:event_id>", methods=["DELETE"])
-@token_required
-def delete_event(current_user, event_id):
+# Export routes
+EVENT_EXPORTS = {
+    "registrations": """
+        SELECT
+            r.id AS registration_id,
+            r.registration_date,
+            r.registration_status,
+            s.slot_no,
+            r.user_id,
+            u.name AS user_name,
+            u.email AS user_email,
+            u.phone AS user_phone,
+            r.team_id,
+            t.team_name
+        FROM registrations r
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN teams t ON t.id = r.team_id
+        LEFT JOIN event_slots s ON s.registration_id = r.id
+        WHERE r.event_id = %s
+        ORDER BY r.registration_date, r.id
+    """,
+    "payments": """
+        SELECT
+            p.id AS payment_id,
+            p.registration_id,
+            r.user_id,
+            u.name AS user_name,
+            u.email AS user_email,
+            t.team_name,
+            p.amount,
+            p.payment_status,
+            p.payment_date,
+            p.transaction_id,
+            p.created_at
+        FROM payments p
+        JOIN registrations r ON r.id = p.registration_id
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN teams t ON t.id = r.team_id
+        WHERE r.event_id = %s
+        ORDER BY p.created_at, p.id
+    """,
+}
+
+
+def export_event_rows(current_user, event_id, kind):
     if current_user["role"] not in ["admin", "organizer"]:
         return jsonify({"message": "Unauthorized"}), 403
 
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": "format must be csv or ndjson"}), 400
+
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
 
     try:
-        with connection.cursor(cursor_factory=DictCursor) as cur:
-            # Check if event exists and user has permission
-            cur.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        with connection.cursor() as cur:
+            cur.execute("SELECT organizer_id FROM events WHERE id = %s", (event_id,))
             event = cur.fetchone()
+    except Exception as e:
+        connection.close()
+        return jsonify({"message": str(e)}), 500
 
-            if not event:
-                return jsonify({"message": "Event not found"}), 404
+    if not event:
+        connection.close()
+        return jsonify({"message": "Event not found"}), 404
+    if current_user["role"] != "admin" and event[0] != current_user["id"]:
+        connection.close()
+        return jsonify({"message": "Unauthorized"}), 403
+
+    # Hands the connection over; it is released before the download starts
+    return stream_copy_export(
+        connection, EVENT_EXPORTS[kind], (event_id,), fmt, f"event-{event_id}-{kind}"
+    )
+
+
+@app.route("/api/events/<int:event_id>/registrations/export", methods=["GET"])
+@token_required
+def export_event_registrations(current_user, event_id):
+    return export_event_rows(current_user, event_id, "registrations")
+
+
+@app.route("/api/events/<int:event_id>/payments/export", methods=["GET"])
+@token_required
+def export_event_payments(current_user, event_id):
+    return export_event_rows(current_user, event_id, "payments")
 
-            if (
-                current_user["role"] != "admin"
-                and event["organizer_id"] != current_user["id"]
-            ):
-                return jsonify({"message": "Unauthorized"}), 403
 
-            # Delete event
-            cur.execute("DELETE FROM events WHERE id = %s", (event_id,))
+# User routes
+@app.route("/api/users/me/recommendations", methods=["GET"])
+@token_required
+def get_recommendations(current_user):
+    try:
+        limit = parse_limit(
+            request.args.get("limit"),
+            default=10,
+            maximum=recommendations.MAX_RECOMMENDATIONS,
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    events = recommendation_cache.get(current_user["id"])
+    if events is None:
+        connection = get_db_connection()
+        if connection is None:
+            return jsonify({"message": "Database connection error"}), 500
+        try:
+            events = recommendations.recommend(connection, current_user["id"])
+        except recommendations.RecommendationsUnavailable as e:
+            return jsonify({"message": str(e)}), 503
+        except Exception as e:
+            return jsonify({"message": str(e)}), 500
+        finally:
+            connection.close()
+        recommendation_cache.set(current_user["id"], events)
+
+    return jsonify(events[:limit]), 200
+
+
+@app.route("/api/users/<int:user_id>/role", methods=["PUT"])
+@token_required
+def update_user_role(current_user, user_id):
+    if current_user["role"] != "admin":
+        return jsonify({"message": "Unauthorized"}), 403
+
+    data = request.get_json()
+    if not data or "role" not in data:
+        return jsonify({"message": "Missing role"}), 400
+
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(
+                """
+                UPDATE users SET role = %s
+                WHERE id = %s
+                RETURNING id, name, email, role
+            """,
+                (data["role"], user_id),
+            )
+            user = cur.fetchone()
             connection.commit()
 
-            return jsonify({"message": "Event deleted successfully"}), 200
+            if not user:
+                return jsonify({"message": "User not found"}), 404
+
+            # The old role must not keep authorizing requests
+            invalidate_principal(user_id)
+            return jsonify(dict(user)), 200
     except Exception as e:
         connection.rollback()
         return jsonify({"message": str(e)}), 500
@@ -408,6 +1129,203 @@ def delete_event(current_user, event_id):
         connection.close()
 
 
+# Operational routes
+@app.route("/api/cache/stats", methods=["GET"])
+@token_required
+def get_cache_stats(current_user):
+    if current_user["role"] != "admin":
+        return jsonify({"message": "Unauthorized"}), 403
+
+    return jsonify(
+        {
+            "events": event_cache.stats(),
+            "principals": principal_cache.stats(),
+            "recommendations": recommendation_cache.stats(),
+            "db_pool": pool_stats(),
+        }
+    ), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    if METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        return jsonify({"message": "Unauthorized"}), 401
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+# Bulk import routes
+@app.route("/api/import/<kind>", methods=["POST"])
+@token_required
+def import_rows(current_user, kind):
+    """
+    Import events or users from a CSV (text/csv) or NDJSON
+    (application/x-ndjson) request body; see bulk_import.py
+    """
+    if current_user["role"] != "admin":
+        return jsonify({"message": "Unauthorized"}), 403
+    if kind not in bulk_import.IMPORTS:
+        return jsonify({"message": "Unknown import type"}), 404
+
+    fmt = bulk_import.detect_format(request.content_type, request.args.get("format"))
+    try:
+        max_errors = int(request.args.get("max_errors", bulk_import.MAX_ERRORS))
+    except ValueError:
+        return jsonify({"message": "max_errors must be an integer"}), 400
+
+    # Read the body as it arrives instead of buffering it in memory
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        result = bulk_import.run_import(
+            stream,
+            fmt,
+            kind,
+            defaults={"organizer_id": current_user["id"]},
+            dry_run=request.args.get("dry_run", "").lower() in ("1", "true"),
+            max_errors=max_errors,
+        )
+    except bulk_import.ImportAborted as e:
+        return jsonify(dict(e.result, message=f"Import aborted: {e}")), 400
+    except UnicodeDecodeError:
+        return jsonify({"message": "Request body must be UTF-8"}), 400
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"message": str(e)}), 500
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+    return jsonify(result), 200
+
+
+# Reporting routes
+def run_report(current_user, view, order_by, clauses=None, params=None):
+    """
+    Read rows of a reporting view, scoped to the caller
+
+    Admins see every event; organizers only their own. Responds with the rows
+    and the time the view was last refreshed.
+    """
+    if current_user["role"] not in ["admin", "organizer"]:
+        return jsonify({"message": "Unauthorized"}), 403
+
+    clauses = list(clauses or [])
+    params = list(params or [])
+    if current_user["role"] != "admin":
+        clauses.append("organizer_id = %s")
+        params.append(current_user["id"])
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(f"SELECT * FROM {view} {where} ORDER BY {order_by}", params)
+            rows = [dict(row) for row in cur.fetchall()]
+            cur.execute(
+                "SELECT refreshed_at FROM report_refreshes WHERE view_name = %s",
+                (view,),
+            )
+            refreshed = cur.fetchone()
+            return jsonify(
+                {
+                    "data": rows,
+                    "refreshed_at": refreshed["refreshed_at"] if refreshed else None,
+                }
+            ), 200
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+    finally:
+        connection.close()
+
+
+def event_report_filters(args):
+    if not args.get("event_id"):
+        return [], []
+    try:
+        return ["event_id = %s"], [int(args["event_id"])]
+    except ValueError as e:
+        raise ValueError("event_id must be an integer") from e
+
+
+@app.route("/api/reports/overview", methods=["GET"])
+@token_required
+def get_overview_report(current_user):
+    if current_user["role"] != "admin":
+        return jsonify({"message": "Unauthorized"}), 403
+
+    return run_report(current_user, "mv_platform_overview", "id")
+
+
+@app.route("/api/reports/registrations", methods=["GET"])
+@token_required
+def get_registration_report(current_user):
+    try:
+        clauses, params = event_report_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return run_report(
+        current_user, "mv_event_registration_stats", "event_id", clauses, params
+    )
+
+
+@app.route("/api/reports/revenue", methods=["GET"])
+@token_required
+def get_revenue_report(current_user):
+    try:
+        clauses, params = event_report_filters(request.args)
+        if request.args.get("date_from"):
+            clauses.append("day >= %s")
+            params.append(_parse_date(request.args["date_from"], "date_from"))
+        if request.args.get("date_to"):
+            clauses.append("day <= %s")
+            params.append(_parse_date(request.args["date_to"], "date_to"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return run_report(
+        current_user, "mv_event_revenue_daily", "day, event_id", clauses, params
+    )
+
+
+@app.route("/api/reports/teams", methods=["GET"])
+@token_required
+def get_team_report(current_user):
+    try:
+        clauses, params = event_report_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return run_report(current_user, "mv_team_participation", "event_id", clauses, params)
+
+
+@app.route("/api/reports/feedback", methods=["GET"])
+@token_required
+def get_feedback_report(current_user):
+    try:
+        clauses, params = event_report_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return run_report(current_user, "mv_event_feedback", "event_id", clauses, params)
+
+
+@app.route("/api/reports/refresh", methods=["POST"])
+@token_required
+def refresh_reports(current_user):
+    if current_user["role"] != "admin":
+        return jsonify({"message": "Unauthorized"}), 403
+
+    if not reports.refresh_report_views(wait=True):
+        return jsonify({"message": "Unable to refresh reports"}), 500
+
+    return jsonify({"message": "Reports refreshed"}), 200
+
+
 # Registration routes
 @app.route("/api/registrations", methods=["POST"])
 @token_required
@@ -422,58 +1340,79 @@ def create_registration(current_user):
         return jsonify({"message": "Database connection error"}), 500
 
     try:
-        with connection.cursor(cursor_factory=DictCursor) as cur:
-            # Check if event exists and registration is open
-            cur.execute(
-                """
-                SELECT * FROM events 
-                WHERE id = %s AND registration_deadline >= CURRENT_DATE
-            """,
-                (data["event_id"],),
-            )
-            event = cur.fetchone()
+        outcome, registration = register_for_event(
+            connection, data["event_id"], current_user["id"], data.get("team_id")
+        )
 
-            if not event:
-                return jsonify(
-                    {"message": "Event not found or registration closed"}
-                ), 404
+        if outcome == "closed":
+            return jsonify({"message": "Event not found or registration closed"}), 404
 
-            # Check if already registered
-            cur.execute(
-                """
-                SELECT * FROM registrations 
-                WHERE event_id = %s AND (user_id = %s OR team_id IN (
-                    SELECT team_id FROM team_members WHERE user_id = %s
-                ))
-            """,
-                (data["event_id"], current_user["id"], current_user["id"]),
-            )
+        if outcome == "conflict":
+            return jsonify({"message": "Already registered for this event"}), 409
 
-            if cur.fetchone():
-                return jsonify({"message": "Already registered for this event"}), 409
+        recommendation_cache.invalidate(current_user["id"])
+        return jsonify(registration), 201
+    except Exception as e:
+        connection.rollback()
+        return jsonify({"message": str(e)}), 500
+    finally:
+        connection.close()
 
-            # Create registration
-            cur.execute(
-                """
-                INSERT INTO registrations (
-                    user_id, event_id, team_id, registration_status
-                )
-                VALUES (%s, %s, %s, %s)
-                RETURNING *
-            """,
-                (current_user["id"], data["event_id"], data.get("team_id"), "pending"),
-            )
-            connection.commit()
 
-            # Get the new registration
-            new_registration = cur.fetchone()
-            return jsonify(dict(new_registration)), 201
+MAX_BULK_IDS = 10000
+
+
+@app.route("/api/registrations/bulk", methods=["PUT"])
+@token_required
+def bulk_update_registrations(current_user):
+    if current_user["role"] not in ["admin", "organizer"]:
+        return jsonify({"message": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True) or {}
+    status = data.get("status")
+    if status not in SETTABLE_STATUSES:
+        return jsonify(
+            {"message": f"status must be one of {', '.join(SETTABLE_STATUSES)}"}
+        ), 400
+
+    ids = data.get("ids")
+    selector = data.get("filter") or {}
+    if ids is not None:
+        if (
+            not isinstance(ids, list)
+            or not ids
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+        ):
+            return jsonify({"message": "ids must be a non-empty list of integers"}), 400
+        if len(ids) > MAX_BULK_IDS:
+            return jsonify({"message": f"At most {MAX_BULK_IDS} ids per request"}), 400
+    elif not isinstance(selector.get("event_id"), int):
+        return jsonify({"message": "Provide ids or filter.event_id"}), 400
+
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    try:
+        results = bulk_update_status(
+            connection,
+            current_user,
+            status,
+            ids=ids,
+            event_id=selector.get("event_id"),
+            from_status=selector.get("status"),
+        )
     except Exception as e:
         connection.rollback()
         return jsonify({"message": str(e)}), 500
     finally:
         connection.close()
 
+    summary = {}
+    for result in results:
+        summary[result["outcome"]] = summary.get(result["outcome"], 0) + 1
+    return jsonify({"status": status, "summary": summary, "results": results}), 200
+
 
 @app.route("/api/registrations/<int:registration_id>", methods=["PUT"])
 @token_required
@@ -481,43 +1420,37 @@ def update_registration_status(current_user, registration_id):
     if current_user["role"] not in ["admin", "organizer"]:
         return jsonify({"message": "Unauthorized"}), 403
 
-    data = request.get_json()
-    if not data or "status" not in data:
-        return jsonify({"message": "Missing status"}), 400
+    data = request.get_json(silent=True) or {}
+    status = data.get("status")
+    if status not in SETTABLE_STATUSES:
+        return jsonify(
+            {"message": f"status must be one of {', '.join(SETTABLE_STATUSES)}"}
+        ), 400
 
     connection = get_db_connection()
     if connection is None:
         return jsonify({"message": "Database connection error"}), 500
 
     try:
-        with connection.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT * FROM registrations WHERE id = %s", (registration_id,))
-            registration = cur.fetchone()
-
-            if not registration:
-                return jsonify({"message": "Registration not found"}), 404
-
-            # Update status
-            cur.execute(
-                """
-                UPDATE registrations 
-                SET registration_status = %s 
-                WHERE id = %s
-                RETURNING *
-            """,
-                (data["status"], registration_id),
-            )
-            connection.commit()
-
-            # Get updated registration
-            updated_registration = cur.fetchone()
-            return jsonify(dict(updated_registration)), 200
+        outcome, registration = update_status(
+            connection, current_user, registration_id, status
+        )
     except Exception as e:
         connection.rollback()
         return jsonify({"message": str(e)}), 500
     finally:
         connection.close()
 
+    if outcome == "not_found":
+        return jsonify({"message": "Registration not found"}), 404
+    if outcome == "forbidden":
+        return jsonify({"message": "Unauthorized"}), 403
+    if outcome == "waitlisted":
+        return jsonify(
+            {"message": "No seat is free; the registration is waitlisted"}
+        ), 409
+    return jsonify(registration), 200
+
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
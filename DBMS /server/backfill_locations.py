@@ -0,0 +1,120 @@
+"""
+Backfill events.location from a venue coordinates file
+
+The CSV needs venue, latitude and longitude columns. Every event whose venue
+matches (case-insensitively, ignoring surrounding spaces) and has no location
+yet gets the venue's point. Rows are updated in small committed batches so
+the backfill never holds locks on a large part of the events table.
+
+Run from the server directory:
+    python backfill_locations.py venues.csv [--batch-size 500] [--overwrite]
+"""
+
+import argparse
+import csv
+import sys
+
+from psycopg2.extras import execute_values
+
+from db import get_db_connection
+from geo import parse_coordinates
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="CSV file with venue,latitude,longitude")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--overwrite", action="store_true", help="also replace existing locations"
+    )
+    return parser.parse_args()
+
+
+def read_venues(path):
+    venues = {}
+    with open(path, newline="", encoding="utf-8") as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            try:
+                lat, lng = parse_coordinates(row.get("latitude"), row.get("longitude"))
+            except ValueError as e:
+                sys.exit(f"{path}:{line}: {e}")
+            venue = (row.get("venue") or "").strip().lower()
+            if not venue:
+                sys.exit(f"{path}:{line}: venue is required")
+            venues[venue] = (lng, lat)
+    return venues
+
+
+def backfill(connection, venues, batch_size, overwrite):
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE venue_points (
+                venue TEXT PRIMARY KEY,
+                lng DOUBLE PRECISION NOT NULL,
+                lat DOUBLE PRECISION NOT NULL
+            )
+        """
+        )
+        execute_values(
+            cur,
+            "INSERT INTO venue_points (venue, lng, lat) VALUES %s",
+            [(venue, lng, lat) for venue, (lng, lat) in venues.items()],
+            page_size=1000,
+        )
+        connection.commit()
+
+        pending = "" if overwrite else "AND e.location IS NULL"
+        last_id = 0
+        updated = 0
+        while True:
+            # Walk the table in id order so --overwrite terminates too
+            cur.execute(
+                f"""
+                WITH batch AS (
+                    SELECT e.id, v.lng, v.lat FROM events e
+                    JOIN venue_points v ON v.venue = lower(trim(e.venue))
+                    WHERE e.id > %s {pending}
+                    ORDER BY e.id
+                    LIMIT %s
+                    FOR UPDATE OF e
+                )
+                UPDATE events e
+                SET location = ST_SetSRID(ST_MakePoint(batch.lng, batch.lat), 4326)::geography
+                FROM batch
+                WHERE e.id = batch.id
+                RETURNING e.id
+            """,
+                (last_id, batch_size),
+            )
+            ids = [row[0] for row in cur.fetchall()]
+            connection.commit()
+            if not ids:
+                break
+            last_id = max(ids)
+            updated += len(ids)
+            print(f"updated {updated} events (last id {last_id})")
+
+        cur.execute("SELECT count(*) FROM events WHERE location IS NULL")
+        missing = cur.fetchone()[0]
+        cur.execute("DROP TABLE venue_points")
+        connection.commit()
+    return updated, missing
+
+
+def main():
+    args = parse_args()
+    venues = read_venues(args.path)
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit("Unable to connect to the database")
+    try:
+        updated, missing = backfill(connection, venues, args.batch_size, args.overwrite)
+    finally:
+        connection.close()
+    print(f"Backfilled {updated} events; {missing} still have no location")
+
+
+if __name__ == "__main__":
+    main()
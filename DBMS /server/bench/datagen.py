@@ -0,0 +1,387 @@
+"""
+Vectorized synthetic data generator for realistic-scale fixtures
+
+Builds users, events, teams, team_members, registrations, payments, results
+and feedback as NumPy arrays and streams them into PostgreSQL with COPY.
+Popularity is skewed the way real traffic is: a Zipf law decides how many
+registrations each event draws and how active each participant is, so a few
+events fill up and waitlist while the long tail stays nearly empty. Every id
+is assigned here, so references are consistent by construction, and a given
+--rng-seed always produces the same rows (dates are relative to the day of
+the load).
+
+Ten million registrations load in a few minutes, most of it PostgreSQL
+maintaining indexes and checking foreign keys. Seeded accounts share the load
+test's password, so `python -m bench.loadtest run` works on the result.
+
+Needs NumPy, which the server itself does not; bench/requirements.txt adds it
+to the server's requirements: pip install -r bench/requirements.txt
+
+Run from the server directory against a throwaway database:
+    python -m bench.datagen --registrations 10000000 --reset
+"""
+
+import argparse
+import io
+import logging
+import sys
+import time
+
+import numpy as np
+
+from bench import fixtures
+
+CHUNK_ROWS = 250_000
+USER_SKEW = 0.6
+TEAM_SIZES = (3, 9)
+RESULTS_PER_EVENT = 10
+GENDERS = np.array(["male", "female", "other"])
+# confirmed, pending, cancelled; waitlists come from capacities afterwards
+STATUSES = np.array(["confirmed", "pending", "cancelled"])
+STATUS_WEIGHTS = (0.6, 0.3, 0.1)
+COMMENTS = np.array([
+    "Well organised, would come again",
+    "Great venue",
+    "Started late",
+    "Good competition",
+    "Too crowded",
+])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--registrations", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, help="default: a tenth of --registrations")
+    parser.add_argument("--events", type=int, help="default: one per 500 registrations")
+    parser.add_argument("--teams", type=int, help="default: one per two events")
+    parser.add_argument(
+        "--skew", type=float, default=1.1, help="Zipf exponent of event popularity"
+    )
+    parser.add_argument("--rng-seed", type=int, default=42)
+    parser.add_argument(
+        "--reset", action="store_true", help="empty a database that already holds data"
+    )
+    args = parser.parse_args()
+    args.users = args.users or max(1000, args.registrations // 10)
+    args.events = args.events or max(100, args.registrations // 500)
+    args.teams = args.teams if args.teams is not None else args.events // 2
+    return args
+
+
+def zipf_weights(rng, count, skew):
+    """Zipf probabilities over count items, shuffled so popularity is not id order."""
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return rng.permutation(weights / weights.sum())
+
+
+def money(cents):
+    return np.char.add(
+        np.char.add((cents // 100).astype(str), "."), np.char.zfill((cents % 100).astype(str), 2)
+    )
+
+
+def days(n):
+    return n.astype("timedelta64[D]")
+
+
+def seconds(n):
+    return n.astype("timedelta64[s]")
+
+
+def first_pairs(a, b, width):
+    """Indexes of the first occurrence of each distinct (a, b), in draw order."""
+    _, first = np.unique(a * width + b, return_index=True)
+    first.sort()
+    return first
+
+
+def ranks(groups):
+    """1-based position of each element within its run of equal values in sorted groups."""
+    if not groups.size:
+        return groups
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    lengths = np.diff(np.r_[starts, groups.size])
+    return np.arange(groups.size) - np.repeat(starts, lengths) + 1
+
+
+def unique_pairs(draw, count, width):
+    """
+    Draw (a, b) pairs until count distinct ones exist, keeping the first draws
+
+    Args:
+        draw (callable): draw(n) returns two arrays of n values each
+        width (int): Exclusive upper bound of b, to combine a pair into one key
+    """
+    a = b = np.empty(0, dtype=np.int64)
+    for _ in range(20):
+        missing = count - a.size
+        if missing <= 0:
+            return a[:count], b[:count]
+        new_a, new_b = draw(int(missing * 1.2) + 100)
+        a, b = np.r_[a, new_a], np.r_[b, new_b]
+        first = first_pairs(a, b, width)
+        a, b = a[first], b[first]
+    raise ValueError(f"cannot draw {count} distinct pairs; add users or events")
+
+
+def generate(args, password, today):
+    """Return [(table, {column: array or scalar})] in load order."""
+    rng = np.random.default_rng(args.rng_seed)
+    organizers = max(10, args.users // 100)
+    participants = args.users - organizers
+    if participants <= 0:
+        raise ValueError("--users is too small to leave any participants")
+    now = today.astype("datetime64[s]") + np.timedelta64(12, "h")
+
+    user_ids = np.arange(1, args.users + 1)
+    user_text = user_ids.astype(str)
+    users = {
+        "id": user_ids,
+        "name": np.char.add("Load User ", user_text),
+        "email": np.char.add(np.char.add("user", user_text), "@" + fixtures.EMAIL_DOMAIN),
+        "password": password,
+        "phone": np.char.zfill(user_text, 10),
+        "age": rng.integers(16, 60, args.users),
+        "gender": GENDERS[rng.integers(0, GENDERS.size, args.users)],
+        "role": np.where(user_ids <= organizers, "organizer", "participant"),
+        "created_at": now - seconds(rng.integers(30 * 86400, 730 * 86400, args.users)),
+    }
+
+    event_ids = np.arange(1, args.events + 1)
+    event_day = today + days(rng.integers(-365, 181, args.events))
+    event_status = np.where(event_day < today, "completed", "upcoming")
+    event_status[rng.random(args.events) < 0.02] = "cancelled"
+    fee_cents = np.where(
+        rng.random(args.events) < 0.3, 0, rng.integers(500, 10_000, args.events)
+    )
+    events = {
+        "id": event_ids,
+        "name": np.char.add("Load Event ", event_ids.astype(str)),
+        "event_date": event_day,
+        "venue": np.array(fixtures.VENUES)[rng.integers(0, len(fixtures.VENUES), args.events)],
+        "category": np.array(fixtures.CATEGORIES)[
+            rng.integers(0, len(fixtures.CATEGORIES), args.events)
+        ],
+        "description": np.char.add("Synthetic event ", event_ids.astype(str)),
+        "status": event_status,
+        "registration_deadline": event_day - days(rng.integers(1, 8, args.events)),
+        "fee": money(fee_cents),
+        "organizer_id": rng.integers(1, organizers + 1, args.events),
+        "created_at": event_day.astype("datetime64[s]")
+        - seconds(rng.integers(90 * 86400, 180 * 86400, args.events)),
+    }
+    event_weights = zipf_weights(rng, args.events, args.skew)
+
+    team_ids = np.arange(1, args.teams + 1)
+    team_event = rng.choice(args.events, args.teams, p=event_weights) + 1
+    teams = {
+        "id": team_ids,
+        "team_name": np.char.add("Load Team ", team_ids.astype(str)),
+        "event_id": team_event,
+        "created_by": rng.integers(organizers + 1, args.users + 1, args.teams),
+    }
+    member_team = np.repeat(team_ids, rng.integers(*TEAM_SIZES, args.teams))
+    member_user = rng.integers(organizers + 1, args.users + 1, member_team.size)
+    # The odd duplicate draw just leaves a team one member short
+    first = first_pairs(member_team, member_user, args.users + 1)
+    team_members = {"team_id": member_team[first], "user_id": member_user[first]}
+
+    # Individual registrations, plus one per team for its own event
+    user_weights = zipf_weights(rng, participants, USER_SKEW)
+    count = max(0, args.registrations - args.teams)
+    reg_event, reg_user = unique_pairs(
+        lambda n: (
+            rng.choice(args.events, n, p=event_weights) + 1,
+            rng.choice(participants, n, p=user_weights) + organizers + 1,
+        ),
+        count,
+        args.users + 1,
+    )
+    reg_event = np.r_[reg_event, team_event]
+    reg_user = np.r_[reg_user, np.zeros(args.teams, dtype=np.int64)]
+    reg_team = np.r_[np.zeros(count, dtype=np.int64), team_ids]
+    total = reg_event.size
+    # Sign up one to ninety days before the event, and never in the future
+    reg_date = np.minimum(
+        event_day[reg_event - 1].astype("datetime64[s]")
+        - seconds(rng.integers(86400, 90 * 86400, total)),
+        now - seconds(rng.integers(0, 86400, total)),
+    )
+    # Ids follow arrival order, as they would in production
+    order = np.argsort(reg_date, kind="stable")
+    reg_event, reg_user, reg_team, reg_date = (
+        reg_event[order], reg_user[order], reg_team[order], reg_date[order]
+    )
+    reg_ids = np.arange(1, total + 1)
+    reg_status = rng.choice(STATUSES, total, p=STATUS_WEIGHTS)
+    reg_status[(reg_team > 0) & (reg_status == "pending")] = "confirmed"
+    done = event_status[reg_event - 1] == "completed"
+    reg_status[done & (reg_status == "pending")] = "confirmed"
+
+    # A fifth of the events are capped near their demand, some oversubscribed
+    demand = np.bincount(reg_event[reg_status != "cancelled"], minlength=args.events + 1)[1:]
+    capped = rng.random(args.events) < 0.2
+    capacity = np.maximum(1, np.ceil(demand * rng.uniform(0.8, 1.4, args.events))).astype(int)
+    events["capacity"] = np.where(capped, capacity.astype(str), "\\N")
+
+    solo = reg_user > 0
+    registrations = {
+        "id": reg_ids[solo],
+        "user_id": reg_user[solo],
+        "event_id": reg_event[solo],
+        "registration_status": reg_status[solo],
+        "registration_date": reg_date[solo],
+    }
+    team_registrations = {
+        "id": reg_ids[~solo],
+        "team_id": reg_team[~solo],
+        "event_id": reg_event[~solo],
+        "registration_status": reg_status[~solo],
+        "registration_date": reg_date[~solo],
+    }
+
+    paid = np.flatnonzero((fee_cents[reg_event - 1] > 0) & (reg_status != "cancelled"))
+    pay_status = np.where(reg_status[paid] == "confirmed", "completed", "pending")
+    pay_status[(pay_status == "pending") & (rng.random(paid.size) < 0.1)] = "failed"
+    payments = {
+        "id": np.arange(1, paid.size + 1),
+        "registration_id": reg_ids[paid],
+        "amount": money(fee_cents[reg_event[paid] - 1]),
+        "payment_status": pay_status,
+        "payment_date": reg_date[paid] + seconds(rng.integers(60, 3600, paid.size)),
+        "transaction_id": np.char.add("load-", reg_ids[paid].astype(str)),
+    }
+
+    # The top finishers of each completed event, ranked in random order
+    finished = np.flatnonzero(done & solo & (reg_status == "confirmed"))
+    finished = finished[np.lexsort((rng.random(finished.size), reg_event[finished]))]
+    place = ranks(reg_event[finished])
+    keep = place <= RESULTS_PER_EVENT
+    finished, place = finished[keep], place[keep]
+    results = {
+        "id": np.arange(1, finished.size + 1),
+        "event_id": reg_event[finished],
+        "user_id": reg_user[finished],
+        "ranking": place,
+        "score": np.char.add(((RESULTS_PER_EVENT + 1 - place) * 10).astype(str), " pts"),
+    }
+
+    reviewed = np.flatnonzero(done & solo & (reg_status == "confirmed"))
+    reviewed = reviewed[rng.random(reviewed.size) < 0.4]
+    feedback = {
+        "id": np.arange(1, reviewed.size + 1),
+        "user_id": reg_user[reviewed],
+        "event_id": reg_event[reviewed],
+        # Mostly fours and fives
+        "rating": 5 - np.floor(rng.random(reviewed.size) ** 2 * 5).astype(int),
+        "comments": COMMENTS[rng.integers(0, COMMENTS.size, reviewed.size)],
+        "created_at": event_day[reg_event[reviewed] - 1].astype("datetime64[s]")
+        + seconds(rng.integers(3600, 14 * 86400, reviewed.size)),
+    }
+
+    return [
+        ("users", users),
+        ("events", events),
+        ("teams", teams),
+        ("team_members", team_members),
+        ("registrations", registrations),
+        ("registrations", team_registrations),
+        ("payments", payments),
+        ("results", results),
+        ("feedback", feedback),
+    ]
+
+
+def copy_rows(cur, table, columns):
+    """COPY equal-length column arrays into table; scalars repeat on every row."""
+    names = list(columns)
+    total = next(len(v) for v in columns.values() if isinstance(v, np.ndarray))
+    for start in range(0, total, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, total)
+        # Text is built a chunk at a time; whole string columns would not fit
+        chunk = [
+            value[start:stop].astype(str).tolist()
+            if isinstance(value, np.ndarray)
+            else [value] * (stop - start)
+            for value in columns.values()
+        ]
+        body = "\n".join(map("\t".join, zip(*chunk))) + "\n"
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(names)}) FROM STDIN",
+            io.BytesIO(body.encode()),
+        )
+    return total
+
+
+def report(step, started, rows=None):
+    rows = f"{rows:>11,} rows" if rows is not None else ""
+    print(f"{step:<14} {rows:>16} in {time.perf_counter() - started:6.1f}s")
+
+
+def load(connection, tables, reset=False):
+    """Load generated tables in one transaction; returns row counts per table."""
+    counts = {}
+    with connection.cursor() as cur:
+        if not reset and not fixtures.is_empty(cur):
+            raise RuntimeError("database is not empty; pass --reset to replace its data")
+        # Truncating in the same transaction lets COPY skip WAL under wal_level=minimal
+        fixtures.reset(cur)
+        cur.execute("SET LOCAL work_mem = '256MB'")
+        cur.execute("SET LOCAL maintenance_work_mem = '512MB'")
+        with fixtures.indexes_deferred(cur):
+            with fixtures.triggers_disabled(cur):
+                for table, columns in tables:
+                    started = time.perf_counter()
+                    rows = copy_rows(cur, table, columns)
+                    counts[table] = counts.get(table, 0) + rows
+                    report(table, started, rows)
+                started = time.perf_counter()
+                fixtures.finalize(cur)
+                report("finalize", started)
+            started = time.perf_counter()
+        report("indexes", started)
+        fixtures.sync_sequences(cur)
+    started = time.perf_counter()
+    connection.commit()
+    report("commit", started)
+
+    started = time.perf_counter()
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        connection.autocommit = False
+    report("analyze", started)
+    return counts
+
+
+def main():
+    args = parse_args()
+    # Every COPY chunk is a slow query by the server's standards
+    logging.getLogger("db.slow_query").setLevel(logging.ERROR)
+    from db import get_db_connection
+    from hashing import hash_password
+
+    started = time.perf_counter()
+    try:
+        tables = generate(args, hash_password(fixtures.SEED_PASSWORD), np.datetime64("today", "D"))
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"generated in {time.perf_counter() - started:.1f}s")
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit("Unable to connect to the database")
+    try:
+        counts = load(connection, tables, args.reset)
+    except RuntimeError as e:
+        connection.rollback()
+        sys.exit(str(e))
+    finally:
+        connection.close()
+    print(f"loaded in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Helpers shared by the benchmark seeders
+
+Loading a synthetic dataset row by row through the triggers would enqueue a
+notification job and a cache NOTIFY for every registration. The seeders load
+with user triggers disabled instead, then rebuild what the triggers maintain
+(waitlists, event_slots and event_stats) in a few set-based statements.
+Foreign keys stay enforced throughout.
+
+Everything here rewrites whole tables: point it at a throwaway database.
+"""
+
+from contextlib import contextmanager
+
+# Every seeded account is user<id>@EMAIL_DOMAIN with this password, so the
+# load test can log in to data from either seeder
+SEED_PASSWORD = "loadtest-password"
+EMAIL_DOMAIN = "loadtest.local"
+CATEGORIES = ("football", "cricket", "basketball", "tennis", "athletics", "swimming")
+VENUES = ("City Stadium", "Riverside Arena", "North Court", "Lakeside Grounds", "Central Pool")
+
+# Children first, so the list also works as a delete order
+TABLES = (
+    "feedback",
+    "payments",
+    "results",
+    "event_slots",
+    "event_stats",
+    "registrations",
+    "team_members",
+    "teams",
+    "communication_logs",
+    "events",
+    "users",
+    "jobs",
+)
+
+TRIGGERED_TABLES = ("users", "events", "registrations", "payments", "feedback")
+
+SERIAL_TABLES = (
+    "users", "events", "teams", "registrations", "payments", "feedback", "results",
+)
+
+
+def is_empty(cur):
+    cur.execute("SELECT NOT EXISTS (SELECT 1 FROM users) AND NOT EXISTS (SELECT 1 FROM events)")
+    return cur.fetchone()[0]
+
+
+def reset(cur):
+    """Empty every application table and restart the id sequences at 1."""
+    cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+
+def sync_sequences(cur):
+    """Move each id sequence past the ids a seeder loaded explicitly."""
+    for table in SERIAL_TABLES:
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE(max(id), 0) + 1, false) FROM {table}"
+        )
+
+
+@contextmanager
+def triggers_disabled(cur):
+    """
+    Disable user triggers on the triggered tables for the enclosed statements
+
+    ALTER TABLE is transactional: if the load fails and rolls back, the
+    triggers come back with it. Other sessions block on the tables meanwhile.
+    """
+    for table in TRIGGERED_TABLES:
+        cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+    yield
+    for table in TRIGGERED_TABLES:
+        cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+
+@contextmanager
+def indexes_deferred(cur, tables=TABLES):
+    """
+    Drop the secondary indexes of tables for the enclosed load, then rebuild them
+
+    Building an index once over loaded rows is far cheaper than updating it
+    row by row. Indexes that back a primary key or unique constraint stay,
+    as foreign keys need them; a unique index rebuilt over duplicates fails
+    the load instead.
+    """
+    cur.execute(
+        """
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = ANY(%s::regclass[])
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_constraint c
+                WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid
+            )
+        ORDER BY 1
+    """,
+        (list(tables),),
+    )
+    indexes = cur.fetchall()
+    for name, _ in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    yield
+    for _, definition in indexes:
+        cur.execute(definition)
+
+
+def finalize(cur):
+    """
+    Rebuild trigger-maintained state; call inside triggers_disabled
+
+    Active registrations beyond an event's capacity are waitlisted in
+    arrival order, every seat gets its event_slots row (the first ones held
+    by the active registrations) and event_stats is recomputed.
+    """
+    cur.execute(
+        """
+        WITH ranked AS (
+            SELECT r.id, e.capacity, row_number() OVER (
+                PARTITION BY r.event_id ORDER BY r.registration_date, r.id
+            ) AS n
+            FROM registrations r
+            JOIN events e ON e.id = r.event_id
+            WHERE e.capacity IS NOT NULL
+                AND r.registration_status IN ('pending', 'confirmed')
+        )
+        UPDATE registrations r SET registration_status = 'waitlisted'
+        FROM ranked
+        WHERE r.id = ranked.id AND ranked.n > ranked.capacity
+    """
+    )
+    cur.execute("DELETE FROM event_slots")
+    cur.execute(
+        """
+        INSERT INTO event_slots (event_id, slot_no, registration_id)
+        SELECT e.id, g, seated.id
+        FROM events e
+        CROSS JOIN LATERAL generate_series(1, e.capacity) AS g
+        LEFT JOIN (
+            SELECT r.id, r.event_id, row_number() OVER (
+                PARTITION BY r.event_id ORDER BY r.registration_date, r.id
+            ) AS n
+            FROM registrations r
+            JOIN events c ON c.id = r.event_id AND c.capacity IS NOT NULL
+            WHERE r.registration_status IN ('pending', 'confirmed')
+        ) seated ON seated.event_id = e.id AND seated.n = g
+        WHERE e.capacity IS NOT NULL
+    """
+    )
+    cur.execute("DELETE FROM event_stats")
+    cur.execute(
+        """
+        INSERT INTO event_stats (
+            event_id, shard, registered, confirmed, waitlisted,
+            revenue, rating_sum, rating_count
+        )
+        SELECT
+            e.id,
+            0,
+            COALESCE(r.registered, 0),
+            COALESCE(r.confirmed, 0),
+            COALESCE(r.waitlisted, 0),
+            COALESCE(p.revenue, 0),
+            COALESCE(f.rating_sum, 0),
+            COALESCE(f.rating_count, 0)
+        FROM events e
+        LEFT JOIN (
+            SELECT event_id,
+                count(*) FILTER (WHERE registration_status IN ('pending', 'confirmed'))
+                    AS registered,
+                count(*) FILTER (WHERE registration_status = 'confirmed') AS confirmed,
+                count(*) FILTER (WHERE registration_status = 'waitlisted') AS waitlisted
+            FROM registrations GROUP BY event_id
+        ) r ON r.event_id = e.id
+        LEFT JOIN (
+            SELECT r.event_id, sum(p.amount) AS revenue
+            FROM payments p JOIN registrations r ON r.id = p.registration_id
+            WHERE p.payment_status = 'completed'
+            GROUP BY r.event_id
+        ) p ON p.event_id = e.id
+        LEFT JOIN (
+            SELECT event_id, sum(rating) AS rating_sum, count(rating) AS rating_count
+            FROM feedback GROUP BY event_id
+        ) f ON f.event_id = e.id
+    """
+    )
@@ -0,0 +1,577 @@
+"""
+Mixed read/write load test through the real Flask routes
+
+``seed`` fills a throwaway database with a synthetic dataset: users, events,
+teams, registrations, payments and feedback, scaled by --scale and
+reproducible for a given --rng-seed. ``run`` drives a weighted mix of
+browse, event detail, login, register-for-event and organizer status
+updates for a fixed time, in process through the Flask test client or over
+HTTP against a running server with --url. It reports throughput and
+p50/p95/p99 latency per operation.
+
+A run can be saved as a baseline and later runs compared against it. The
+comparison exits non-zero when p95 latency or throughput regress beyond
+--tolerance or the error rate climbs, so CI can save a baseline on the main
+branch and compare every pull request against it.
+
+Run from the server directory against a throwaway database:
+    python -m bench.loadtest seed --scale 1 --reset
+    python -m bench.loadtest run --duration 30 --concurrency 16 --save-baseline
+    python -m bench.loadtest run --duration 30 --concurrency 16 --compare
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from dotenv import load_dotenv
+
+from bench import fixtures
+
+DEFAULT_MIX = "browse=40,detail=30,login=5,register=20,status=5"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "loadtest.json")
+ERROR_RATE_TOLERANCE = 0.01
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed = commands.add_parser("seed", help="load the synthetic dataset")
+    seed.add_argument("--scale", type=int, default=1, help="2000 users and 200 events per unit")
+    seed.add_argument("--rng-seed", type=int, default=42)
+    seed.add_argument(
+        "--reset", action="store_true", help="empty a database that already holds data"
+    )
+
+    run = commands.add_parser("run", help="run the workload")
+    run.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight pairs")
+    run.add_argument("--rng-seed", type=int, default=42)
+    run.add_argument("--url", help="drive a running server instead of the in-process app")
+    run.add_argument("--baseline", default=DEFAULT_BASELINE)
+    run.add_argument("--save-baseline", action="store_true")
+    run.add_argument("--compare", action="store_true")
+    run.add_argument(
+        "--tolerance", type=float, default=0.10,
+        help="allowed relative p95 increase or throughput drop",
+    )
+    run.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser.parse_args()
+
+
+def seed(connection, scale, rng_seed, reset=False):
+    """Load the dataset in one transaction; returns row counts per table."""
+    from hashing import hash_password
+
+    users = 2000 * scale
+    organizers = max(10, users // 100)
+    params = {
+        "users": users,
+        "organizers": organizers,
+        "events": 200 * scale,
+        "teams": 100 * scale,
+        # One KDF for every seeded account, so logins exercise the real hash
+        "password": hash_password(fixtures.SEED_PASSWORD),
+        "domain": fixtures.EMAIL_DOMAIN,
+        "categories": list(fixtures.CATEGORIES),
+        "venues": list(fixtures.VENUES),
+    }
+    with connection.cursor() as cur:
+        if not reset and not fixtures.is_empty(cur):
+            raise RuntimeError("database is not empty; pass --reset to replace its data")
+        fixtures.reset(cur)
+        # random() is only reproducible from one backend, in row order
+        cur.execute("SET LOCAL max_parallel_workers_per_gather = 0")
+        cur.execute("SELECT setseed(%s)", ((rng_seed % 2000) / 1000 - 1,))
+        with fixtures.triggers_disabled(cur):
+            cur.execute(
+                """
+                INSERT INTO users (name, email, password, phone, age, gender, role)
+                SELECT 'Load User ' || g, 'user' || g || '@' || %(domain)s, %(password)s,
+                    lpad(g::text, 10, '0'), 16 + (random() * 40)::int,
+                    (ARRAY['male', 'female', 'other'])[1 + (random() * 2)::int],
+                    CASE WHEN g <= %(organizers)s THEN 'organizer' ELSE 'participant' END
+                FROM generate_series(1, %(users)s) AS g
+            """,
+                params,
+            )
+            # About a quarter of the events are in the past
+            cur.execute(
+                """
+                INSERT INTO events (
+                    name, event_date, venue, category, description, status,
+                    registration_deadline, fee, organizer_id
+                )
+                SELECT 'Load Event ' || g, day,
+                    (%(venues)s::text[])[1 + g %% array_length(%(venues)s::text[], 1)],
+                    (%(categories)s::text[])[1 + (g / 7) %% array_length(%(categories)s::text[], 1)],
+                    'Synthetic event ' || g || ' for load testing',
+                    CASE WHEN day < CURRENT_DATE THEN 'completed' ELSE 'upcoming' END,
+                    day - 3,
+                    CASE WHEN random() < 0.3 THEN 0 ELSE round((5 + random() * 95)::numeric, 2) END,
+                    1 + g %% %(organizers)s
+                FROM (
+                    SELECT g, CURRENT_DATE + (random() * 240 - 60)::int AS day
+                    FROM generate_series(1, %(events)s) AS g
+                ) d
+            """,
+                params,
+            )
+            cur.execute(
+                """
+                INSERT INTO teams (team_name, event_id, created_by)
+                SELECT 'Load Team ' || g, 1 + (random() * (%(events)s - 1))::int,
+                    %(organizers)s + 1 + (random() * (%(users)s - %(organizers)s - 1))::int
+                FROM generate_series(1, %(teams)s) AS g
+            """,
+                params,
+            )
+            cur.execute(
+                """
+                INSERT INTO team_members (team_id, user_id)
+                SELECT t.id, %(organizers)s + 1 + (random() * (%(users)s - %(organizers)s - 1))::int
+                FROM teams t CROSS JOIN generate_series(1, 5)
+                ON CONFLICT DO NOTHING
+            """,
+                params,
+            )
+            # Five picks per participant, skewed so low event ids are popular
+            cur.execute(
+                """
+                INSERT INTO registrations (user_id, event_id, registration_status, registration_date)
+                SELECT u, 1 + floor(%(events)s * power(random(), 2))::int,
+                    -- 60%% confirmed, 30%% pending, 10%% cancelled
+                    (ARRAY['confirmed', 'confirmed', 'confirmed', 'confirmed', 'confirmed',
+                        'confirmed', 'pending', 'pending', 'pending', 'cancelled'])
+                        [1 + floor(random() * 10)::int],
+                    CURRENT_TIMESTAMP - random() * interval '60 days'
+                FROM generate_series(%(organizers)s + 1, %(users)s) AS u
+                CROSS JOIN generate_series(1, 5)
+                ON CONFLICT DO NOTHING
+            """,
+                params,
+            )
+            cur.execute(
+                """
+                INSERT INTO registrations (team_id, event_id, registration_status)
+                SELECT id, event_id, 'confirmed' FROM teams
+            """
+            )
+            # A fifth of the events have a capacity, some of them oversubscribed
+            cur.execute(
+                """
+                UPDATE events e SET capacity = greatest(1, (c.n * (0.8 + random() * 0.6))::int)
+                FROM (SELECT event_id, count(*) AS n FROM registrations GROUP BY event_id) c
+                WHERE c.event_id = e.id AND e.id % 5 = 0
+            """
+            )
+            cur.execute(
+                """
+                INSERT INTO payments (
+                    registration_id, amount, payment_status, payment_date, transaction_id
+                )
+                SELECT r.id, e.fee,
+                    CASE WHEN r.registration_status = 'confirmed' THEN 'completed'
+                        ELSE 'pending' END,
+                    r.registration_date + interval '1 hour',
+                    'load-' || r.id
+                FROM registrations r JOIN events e ON e.id = r.event_id
+                WHERE e.fee > 0 AND r.registration_status <> 'cancelled'
+            """
+            )
+            cur.execute(
+                """
+                INSERT INTO feedback (user_id, event_id, rating, comments)
+                SELECT r.user_id, r.event_id, 5 - floor(power(random(), 2) * 5)::int,
+                    'Synthetic feedback'
+                FROM registrations r JOIN events e ON e.id = r.event_id
+                WHERE e.status = 'completed' AND r.user_id IS NOT NULL
+                    AND r.registration_status = 'confirmed' AND random() < 0.4
+            """
+            )
+            fixtures.finalize(cur)
+
+        counts = {}
+        for table in fixtures.SERIAL_TABLES + ("team_members", "event_slots"):
+            cur.execute(f"SELECT count(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    connection.commit()
+
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        connection.autocommit = False
+    return counts
+
+
+class Dataset:
+    """Ids the workload picks from, read once from the seeded database."""
+
+    def __init__(self, connection):
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT id, role FROM users WHERE email LIKE %s ORDER BY id",
+                (f"%@{fixtures.EMAIL_DOMAIN}",),
+            )
+            users = cur.fetchall()
+            self.participants = [user_id for user_id, role in users if role == "participant"]
+            self.organizers = [user_id for user_id, role in users if role == "organizer"]
+            cur.execute("SELECT id FROM events ORDER BY id")
+            self.events = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                """
+                SELECT r.id, e.organizer_id FROM registrations r
+                JOIN events e ON e.id = r.event_id
+                WHERE r.registration_status IN ('pending', 'confirmed')
+                    AND e.status = 'upcoming'
+                ORDER BY r.id
+                LIMIT 10000
+            """
+            )
+            self.managed = cur.fetchall()
+        connection.rollback()
+        if not (self.participants and self.organizers and self.events and self.managed):
+            raise RuntimeError("no seeded data found; run `python -m bench.loadtest seed` first")
+
+        # Must match the server's secret when driving it over --url
+        self._secret = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+        self._expires = datetime.now(timezone.utc) + timedelta(days=1)
+        self._tokens = {}
+
+    def token(self, user_id):
+        token = self._tokens.get(user_id)
+        if token is None:
+            token = jwt.encode({"user_id": user_id, "exp": self._expires}, self._secret)
+            self._tokens[user_id] = token
+        return token
+
+    def popular_event(self, rng):
+        # Same skew as the seeded registrations
+        return self.events[int(len(self.events) * rng.random() ** 2)]
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.prefix = parsed.path.rstrip("/")
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.connection.request(method, self.prefix + path, payload, headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+
+
+def browse(client, data, rng):
+    query = "limit=20&status=upcoming"
+    if rng.random() < 0.3:
+        query += f"&category={rng.choice(fixtures.CATEGORIES)}"
+    return client.request("GET", f"/api/events?{query}")
+
+
+def detail(client, data, rng):
+    return client.request("GET", f"/api/events/{data.popular_event(rng)}")
+
+
+def login(client, data, rng):
+    user_id = rng.choice(data.participants)
+    return client.request(
+        "POST",
+        "/api/auth/login",
+        {"email": f"user{user_id}@{fixtures.EMAIL_DOMAIN}", "password": fixtures.SEED_PASSWORD},
+    )
+
+
+def register(client, data, rng):
+    user_id = rng.choice(data.participants)
+    return client.request(
+        "POST",
+        "/api/registrations",
+        {"event_id": data.popular_event(rng)},
+        token=data.token(user_id),
+    )
+
+
+def update_status(client, data, rng):
+    registration_id, organizer_id = rng.choice(data.managed)
+    return client.request(
+        "PUT",
+        f"/api/registrations/{registration_id}",
+        {"status": rng.choice(("pending", "confirmed"))},
+        token=data.token(organizer_id),
+    )
+
+
+OPERATIONS = {
+    "browse": browse,
+    "detail": detail,
+    "login": login,
+    "register": register,
+    "status": update_status,
+}
+
+# Anything else, including 503s from a saturated hash pool, is an error
+EXPECTED_STATUSES = {
+    "browse": {200},
+    "detail": {200},
+    "login": {200},
+    "register": {201, 404, 409},
+    "status": {200},
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise SystemExit(f"weight for {name} must be a number")
+    return mix
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(make_client, data, mix, concurrency, duration, warmup, rng_seed):
+    """Run the mix on concurrency threads; returns {operation: [(ms, status, error)]}."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    samples = [[] for _ in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(rng_seed * 1000 + index)
+        client = make_client()
+        out = samples[index]
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            try:
+                status = OPERATIONS[name](client, data, rng)
+            except Exception as e:
+                status = type(e).__name__
+            end = time.perf_counter()
+            if now >= measure_from:
+                out.append((name, (end - now) * 1000, status))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = {}
+    for thread_samples in samples:
+        for name, latency, status in thread_samples:
+            results.setdefault(name, []).append(
+                (latency, status, status not in EXPECTED_STATUSES[name])
+            )
+    return results
+
+
+def summarize(results, duration):
+    def stats(samples):
+        latencies = [latency for latency, _, _ in samples]
+        return {
+            "count": len(samples),
+            "throughput": round(len(samples) / duration, 2),
+            "errors": sum(1 for _, _, error in samples if error),
+            "statuses": dict(Counter(str(status) for _, status, _ in samples)),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(statistics.mean(latencies), 3),
+        }
+
+    summary = {name: stats(samples) for name, samples in sorted(results.items())}
+    everything = [sample for samples in results.values() for sample in samples]
+    if everything:
+        summary["total"] = stats(everything)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'operation':<10} {'count':>8} {'req/s':>9} {'errors':>7} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for name, row in summary.items():
+        statuses = " ".join(f"{status}:{n}" for status, n in sorted(row["statuses"].items()))
+        print(
+            f"{name:<10} {row['count']:>8} {row['throughput']:>9.1f} {row['errors']:>7} "
+            f"{row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f}  {statuses}"
+        )
+
+
+def compare(summary, config, baseline, tolerance):
+    """Print the change against baseline; returns the regressed operations."""
+    regressions = []
+    print(f"\nagainst baseline from {baseline['created_at']} ({baseline.get('commit') or 'unknown'})")
+    if baseline["config"] != config:
+        print(f"warning: configuration differs from the baseline: {baseline['config']}")
+    for name, row in summary.items():
+        before = baseline["results"].get(name)
+        if before is None or not before["count"]:
+            continue
+        p95_change = row["p95"] / before["p95"] - 1 if before["p95"] else 0.0
+        rate_change = row["throughput"] / before["throughput"] - 1 if before["throughput"] else 0.0
+        error_rate = row["errors"] / row["count"] if row["count"] else 0.0
+        before_error_rate = before["errors"] / before["count"]
+        # Error rates are compared in points: a few more 503s matter, relative or not
+        regressed = (
+            p95_change > tolerance
+            or rate_change < -tolerance
+            or error_rate - before_error_rate > ERROR_RATE_TOLERANCE
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<10} p95 {before['p95']:>9.2f} -> {row['p95']:>9.2f} ({p95_change:+.1%})  "
+            f"req/s {before['throughput']:>9.1f} -> {row['throughput']:>9.1f} "
+            f"({rate_change:+.1%})  errors {before_error_rate:.1%} -> {error_rate:.1%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+    # The same .env as the server, so tokens are signed with its JWT secret
+    load_dotenv()
+    if args.command == "run":
+        # Size the pool before db creates it so every worker thread gets a connection
+        os.environ.setdefault("DB_POOL_MAX_SIZE", str(args.concurrency + 4))
+
+    from db import get_db_connection
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit("Unable to connect to the database")
+    try:
+        if args.command == "seed":
+            started = time.perf_counter()
+            try:
+                counts = seed(connection, args.scale, args.rng_seed, args.reset)
+            except RuntimeError as e:
+                connection.rollback()
+                sys.exit(str(e))
+            print(f"seeded in {time.perf_counter() - started:.1f}s: {counts}")
+            return
+        data = Dataset(connection)
+    finally:
+        connection.close()
+
+    mix = parse_mix(args.mix)
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        from app_postgres import app
+
+        make_client = lambda: InProcessClient(app)
+
+    config = {
+        "target": "http" if args.url else "in-process",
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": mix,
+        "users": len(data.participants) + len(data.organizers),
+        "events": len(data.events),
+    }
+    results = run(
+        make_client, data, mix, args.concurrency, args.duration, args.warmup, args.rng_seed
+    )
+    summary = summarize(results, args.duration)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+    failed = False
+    if args.compare:
+        try:
+            with open(args.baseline, encoding="utf-8") as handle:
+                baseline = json.load(handle)
+        except FileNotFoundError:
+            sys.exit(f"no baseline at {args.baseline}; run with --save-baseline first")
+        regressions = compare(summary, config, baseline, args.tolerance)
+        if regressions:
+            print(f"regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            failed = True
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "commit": git_commit(),
+                    "config": config,
+                    "results": summary,
+                },
+                handle,
+                indent=2,
+            )
+        print(f"baseline saved to {args.baseline}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,619 @@
+"""
+Query-plan checks for the SQL every route issues
+
+Drives every API route once through the Flask test client, plus a pass of
+the embeddings and notification workers, against a seeded database. A db
+statement hook runs EXPLAIN (ANALYZE, BUFFERS) on each statement just before
+it executes, on the same connection inside a savepoint that is rolled back,
+so plans see the route's own transaction (temp tables included) and writes
+are not applied twice.
+
+Each statement is checked against budgets: no sequential scan of a table
+with more than --large-rows rows, and at most --max-buffers shared buffers
+and --max-cost planner cost. EXEMPTIONS below lists the statements that
+legitimately exceed them. The report names the indexes every statement used
+and shows the plan of each failure; the exit status is 1 when any statement
+fails, a route answers with an unexpected 5xx, or a route is not exercised.
+
+The budgets assume a dataset the size of
+    python -m bench.datagen --registrations 1000000 --reset
+
+The run writes to the database: point it at a throwaway copy. From the
+server directory:
+    python -m bench.plancheck --report plan-report.md
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import jwt
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+
+from bench import fixtures
+
+# Statements allowed past the default budgets, by statement name as db.py
+# reports it (caller:verb). "seq_scan" lists tables the statement may scan;
+# a budget of None means unbounded.
+EXEMPTIONS = {
+    # Admins read the platform-wide revenue view; a date range keeps most of it
+    "run_report:select": {"seq_scan": ("mv_event_revenue_daily",)},
+    # Exact HNSW candidate scan over ef_search neighbours of the user's vector
+    "recommend:with": {"max_buffers": 5000},
+    # Background batch: each inserted vector walks and links into the HNSW graph
+    "embed_pending:insert": {"max_buffers": None},
+}
+
+
+class Budget:
+    def __init__(self, large_rows, max_buffers, max_cost):
+        self.large_rows = large_rows
+        self.max_buffers = max_buffers
+        self.max_cost = max_cost
+
+
+class Statement:
+    """Every execution of one statement from one route; keeps the costliest plan."""
+
+    def __init__(self, route, name, sql):
+        self.route = route
+        self.name = name
+        self.sql = sql
+        self.executions = 0
+        self.plan = None
+        self.error = None
+        self.failures = []
+
+    @property
+    def root(self):
+        return self.plan["Plan"]
+
+    def buffers(self, plan=None):
+        node = (plan or self.plan)["Plan"]
+        return node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+
+    def nodes(self):
+        pending = [self.root]
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(node.get("Plans", ()))
+
+    def indexes(self):
+        return sorted({node["Index Name"] for node in self.nodes() if "Index Name" in node})
+
+    def seq_scans(self):
+        return sorted(
+            {node["Relation Name"] for node in self.nodes() if node["Node Type"] == "Seq Scan"}
+        )
+
+    def record(self, sql, plan):
+        self.executions += 1
+        if self.plan is None or self.buffers(plan) > self.buffers():
+            self.sql, self.plan = sql, plan
+
+    def check(self, budget, table_rows):
+        if self.plan is None:
+            return
+        exemption = EXEMPTIONS.get(self.name, {})
+        allowed = set(exemption.get("seq_scan", ()))
+        for table in self.seq_scans():
+            rows = table_rows.get(table, 0)
+            if rows > budget.large_rows and table not in allowed:
+                self.failures.append(f"seq scan on {table} ({rows:,.0f} rows)")
+        max_buffers = exemption.get("max_buffers", budget.max_buffers)
+        if max_buffers is not None and self.buffers() > max_buffers:
+            self.failures.append(f"{self.buffers():,} buffers > {max_buffers:,}")
+        max_cost = exemption.get("max_cost", budget.max_cost)
+        if max_cost is not None and self.root["Total Cost"] > max_cost:
+            self.failures.append(f"cost {self.root['Total Cost']:,.0f} > {max_cost:,}")
+
+    def outline(self):
+        lines = []
+
+        def walk(node, depth):
+            label = node["Node Type"]
+            if "Index Name" in node:
+                label += f" using {node['Index Name']}"
+            if "Relation Name" in node:
+                label += f" on {node['Relation Name']}"
+            lines.append(
+                f"{'  ' * depth}{label} (rows={node.get('Actual Rows')} "
+                f"loops={node.get('Actual Loops')} "
+                f"buffers={node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)})"
+            )
+            for child in node.get("Plans", ()):
+                walk(child, depth + 1)
+
+        walk(self.root, 0)
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "route": self.route,
+            "statement": self.name,
+            "executions": self.executions,
+            "sql": self.sql,
+            "error": self.error,
+            "failures": self.failures,
+            "indexes": self.indexes() if self.plan else [],
+            "seq_scans": self.seq_scans() if self.plan else [],
+            "buffers": self.buffers() if self.plan else None,
+            "cost": self.root["Total Cost"] if self.plan else None,
+            "execution_ms": self.plan["Execution Time"] if self.plan else None,
+            "plan": self.plan,
+        }
+
+
+class Recorder:
+    """The db statement hook: EXPLAINs each statement in place and files the plan."""
+
+    def __init__(self, verbs):
+        self.verbs = verbs
+        self.statements = {}
+        self.label = None
+
+    def route(self):
+        from flask import has_request_context, request
+
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule else request.path
+            return f"{request.method} {rule}"
+        return self.label or "(outside a request)"
+
+    def __call__(self, cursor, name, query, params):
+        if name.rsplit(":", 1)[-1] not in self.verbs:
+            return
+        conn = cursor.connection
+        if conn.get_transaction_status() == TRANSACTION_STATUS_INERROR:
+            return
+        sql = cursor.mogrify(query, params).decode()
+        key = (self.route(), name)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = Statement(*key, sql)
+        # A plain cursor, so the EXPLAIN is neither timed nor passed to hooks
+        explain = psycopg2.extensions.cursor(conn)
+        try:
+            if conn.autocommit:
+                explain.execute("BEGIN")
+            else:
+                explain.execute("SAVEPOINT plancheck")
+            try:
+                explain.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+                statement.record(sql, explain.fetchone()[0][0])
+            except psycopg2.Error as e:
+                statement.executions += 1
+                statement.error = str(e).strip()
+            finally:
+                # Undo whatever EXPLAIN ANALYZE wrote; the real statement follows
+                if conn.autocommit:
+                    explain.execute("ROLLBACK")
+                else:
+                    explain.execute("ROLLBACK TO SAVEPOINT plancheck")
+                    explain.execute("RELEASE SAVEPOINT plancheck")
+        finally:
+            explain.close()
+
+
+class Exerciser:
+    """Calls routes through the test client and keeps track of what was covered."""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.adapter = app.url_map.bind("localhost")
+        self.covered = set()
+        self.unexpected = []
+        self._expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    def routes(self):
+        return {
+            f"{method} {rule.rule}"
+            for rule in self.app.url_map.iter_rules()
+            if rule.endpoint != "static"
+            for method in rule.methods - {"HEAD", "OPTIONS"}
+        }
+
+    def token(self, user_id):
+        return jwt.encode(
+            {"user_id": user_id, "exp": self._expires}, self.app.config["JWT_SECRET_KEY"]
+        )
+
+    def call(self, method, path, user=None, expect=(200,), headers=None, **kwargs):
+        headers = dict(headers or {})
+        if user is not None:
+            headers["Authorization"] = f"Bearer {self.token(user)}"
+        response = self.client.open(path, method=method, headers=headers, **kwargs)
+        # Streamed bodies only run their queries as they are read
+        body = response.get_data(as_text=True)
+        response.close()
+        rule, _ = self.adapter.match(urlsplit(path).path, method, return_rule=True)
+        self.covered.add(f"{method} {rule.rule}")
+        if response.status_code not in expect:
+            self.unexpected.append((f"{method} {path}", response.status_code, body[:300]))
+        return response
+
+
+def pick_targets(connection):
+    """Ids to aim the routes at: the busiest rows, where bad plans hurt most."""
+    targets = {}
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT e.id, e.organizer_id FROM events e
+            JOIN event_stats st ON st.event_id = e.id
+            WHERE e.status = 'upcoming' AND e.registration_deadline >= CURRENT_DATE
+            GROUP BY e.id
+            ORDER BY sum(st.registered) DESC, e.id
+        """
+        )
+        upcoming = cur.fetchall()
+        if not upcoming:
+            raise RuntimeError("no open events; seed with `python -m bench.datagen` first")
+        targets["hot_event"], targets["organizer"] = upcoming[0]
+        targets["typical_event"], targets["typical_organizer"] = upcoming[len(upcoming) // 2]
+        cur.execute(
+            """
+            SELECT event_id FROM event_stats GROUP BY event_id
+            ORDER BY sum(rating_count) DESC, event_id LIMIT 1
+        """
+        )
+        targets["reviewed_event"] = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT u.id FROM users u
+            WHERE u.role = 'participant' AND NOT EXISTS (
+                SELECT 1 FROM registrations r
+                WHERE r.event_id = %s AND r.user_id = u.id
+            )
+            ORDER BY u.id LIMIT 1
+        """,
+            (targets["hot_event"],),
+        )
+        targets["participant"] = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT user_id FROM registrations WHERE user_id IS NOT NULL
+            GROUP BY user_id ORDER BY count(*) DESC, user_id LIMIT 1
+        """
+        )
+        targets["busy_participant"] = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT tm.user_id, t.id, t.event_id FROM team_members tm
+            JOIN teams t ON t.id = tm.team_id
+            JOIN events e ON e.id = t.event_id
+            WHERE e.registration_deadline >= CURRENT_DATE
+            ORDER BY t.id, tm.user_id LIMIT 1
+        """
+        )
+        targets["team_member"], targets["team"], targets["team_event"] = cur.fetchone()
+        cur.execute(
+            """
+            SELECT id FROM registrations
+            WHERE event_id = %s AND registration_status IN ('pending', 'confirmed')
+            ORDER BY id LIMIT 50
+        """,
+            (targets["typical_event"],),
+        )
+        targets["registrations"] = [row[0] for row in cur.fetchall()]
+        cur.execute(
+            """
+            INSERT INTO users (name, email, password, phone, role)
+            VALUES ('Plan Check Admin', %s, '!', '0000000000', 'admin')
+            ON CONFLICT (email) DO UPDATE SET role = 'admin'
+            RETURNING id
+        """,
+            (f"plancheck-admin@{fixtures.EMAIL_DOMAIN}",),
+        )
+        targets["admin"] = cur.fetchone()[0]
+    connection.commit()
+    return targets
+
+
+def exercise(ex, t):
+    """One call per route, aimed at the busiest rows; keep in step with app_postgres.py."""
+    admin, organizer, participant = t["admin"], t["organizer"], t["participant"]
+    hot, typical = t["hot_event"], t["typical_event"]
+    unavailable = (200, 503)
+    today = date.today()
+
+    # Auth
+    suffix = uuid.uuid4().hex[:12]
+    ex.call(
+        "POST",
+        "/api/auth/register",
+        json={
+            "name": "Plan Check",
+            "email": f"plancheck-{suffix}@{fixtures.EMAIL_DOMAIN}",
+            "password": fixtures.SEED_PASSWORD,
+            "phone": "0000000000",
+            "age": 30,
+            "gender": "other",
+        },
+        expect=(201,),
+    )
+    ex.call(
+        "POST",
+        "/api/auth/login",
+        json={
+            "email": f"user{participant}@{fixtures.EMAIL_DOMAIN}",
+            "password": fixtures.SEED_PASSWORD,
+        },
+    )
+
+    # Event reads
+    first = ex.call("GET", "/api/events?status=upcoming&limit=20")
+    ex.call(
+        "GET",
+        "/api/events?status=upcoming&limit=20",
+        headers={"If-None-Match": first.headers.get("ETag", "")},
+        expect=(200, 304),
+    )
+    cursor = first.headers.get("X-Next-Cursor")
+    if cursor:
+        ex.call("GET", f"/api/events?status=upcoming&limit=20&cursor={cursor}")
+    ex.call(
+        "GET",
+        f"/api/events?category={fixtures.CATEGORIES[0]}&date_from={today}"
+        f"&date_to={today + timedelta(days=30)}&fee_max=50&limit=20",
+    )
+    ex.call("GET", f"/api/events?stream=1&category={fixtures.CATEGORIES[1]}&status=upcoming")
+    ex.call("GET", "/api/events/search?q=football%20arena&limit=20", expect=unavailable)
+    ex.call("GET", "/api/events/nearby?lat=51.5&lng=-0.12&radius=25000", expect=unavailable)
+    ex.call("GET", f"/api/events/{hot}")
+
+    # Event writes, on an event of our own so nothing seeded is deleted
+    created = ex.call(
+        "POST",
+        "/api/events",
+        user=organizer,
+        json={
+            "name": f"Plan Check Event {suffix}",
+            "event_date": str(today + timedelta(days=60)),
+            "venue": fixtures.VENUES[0],
+            "category": fixtures.CATEGORIES[0],
+            "description": "Created by bench/plancheck.py",
+            "registration_deadline": str(today + timedelta(days=50)),
+            "fee": 10,
+            "capacity": 50,
+        },
+        expect=(201,),
+    )
+    new_event = (created.get_json(silent=True) or {}).get("id", 0)
+    ex.call("PUT", f"/api/events/{new_event}", user=organizer, json={"capacity": 40, "fee": 12})
+    ex.call("DELETE", f"/api/events/{new_event}", user=organizer)
+
+    # Registrations: a plain signup for the busiest event, and a team signup
+    ex.call("POST", "/api/registrations", user=participant, json={"event_id": hot}, expect=(201,))
+    ex.call(
+        "POST",
+        "/api/registrations",
+        user=t["team_member"],
+        json={"event_id": t["team_event"], "team_id": t["team"]},
+        expect=(201, 409),
+    )
+    ex.call(
+        "PUT",
+        f"/api/registrations/{t['registrations'][0]}",
+        user=t["typical_organizer"],
+        json={"status": "confirmed"},
+    )
+    ex.call(
+        "PUT",
+        "/api/registrations/bulk",
+        user=t["typical_organizer"],
+        json={"status": "confirmed", "ids": t["registrations"]},
+    )
+    ex.call(
+        "PUT",
+        "/api/registrations/bulk",
+        user=t["typical_organizer"],
+        json={"status": "confirmed", "filter": {"event_id": typical, "status": "pending"}},
+    )
+
+    # Exports stream every registration of the busiest event
+    ex.call("GET", f"/api/events/{hot}/registrations/export?format=csv", user=organizer)
+    ex.call("GET", f"/api/events/{hot}/payments/export?format=ndjson", user=organizer)
+
+    # Users
+    ex.call("GET", "/api/users/me/recommendations?limit=10", user=t["busy_participant"], expect=unavailable)
+    ex.call("PUT", f"/api/users/{participant}/role", user=admin, json={"role": "participant"})
+
+    # Reports read the materialized views; organizers see their own events
+    ex.call("POST", "/api/reports/refresh", user=admin, expect=(200, 202))
+    ex.call("GET", "/api/reports/overview", user=admin)
+    ex.call("GET", f"/api/reports/registrations?event_id={hot}", user=organizer)
+    ex.call("GET", "/api/reports/revenue", user=organizer)
+    ex.call("GET", f"/api/reports/revenue?date_from={today - timedelta(days=365)}", user=admin)
+    ex.call("GET", "/api/reports/teams", user=organizer)
+    ex.call("GET", f"/api/reports/feedback?event_id={t['reviewed_event']}", user=admin)
+
+    # Bulk import through the staging tables
+    ex.call(
+        "POST",
+        "/api/import/events",
+        user=admin,
+        data=(
+            "name,event_date,venue,category,registration_deadline,fee,organizer_id\n"
+            f"Imported {suffix},{today + timedelta(days=90)},{fixtures.VENUES[1]},"
+            f"{fixtures.CATEGORIES[2]},{today + timedelta(days=80)},5,{organizer}\n"
+        ),
+        content_type="text/csv",
+    )
+    ex.call(
+        "POST",
+        "/api/import/users",
+        user=admin,
+        data=json.dumps({
+            "name": "Imported User",
+            "email": f"imported-{suffix}@{fixtures.EMAIL_DOMAIN}",
+            "phone": "0000000000",
+        }) + "\n",
+        content_type="application/x-ndjson",
+    )
+
+    # Operations
+    ex.call("GET", "/api/cache/stats", user=admin)
+    ex.call("GET", "/metrics", expect=(200, 401))
+
+
+def run_workers(recorder):
+    """One pass of the background workers, so their statements are checked too."""
+    import jobs
+    import recommendations
+    from db import get_db_connection
+
+    recorder.label = "worker: embeddings"
+    connection = get_db_connection()
+    try:
+        recommendations.embed_pending(connection)
+    except recommendations.RecommendationsUnavailable as e:
+        print(f"skipped embeddings: {e}")
+    finally:
+        connection.close()
+
+    recorder.label = "worker: jobs"
+    with tempfile.TemporaryDirectory() as directory:
+        worker = jobs.Worker(sink=jobs.FileSink(os.path.join(directory, "notifications.log")))
+        worker.run_once()
+        connection = get_db_connection()
+        try:
+            worker.maintain(connection)
+        finally:
+            connection.close()
+    recorder.label = None
+
+
+def table_rows(connection):
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT relname, reltuples FROM pg_class
+            WHERE relnamespace = 'public'::regnamespace AND relkind IN ('r', 'm', 'p')
+        """
+        )
+        rows = dict(cur.fetchall())
+    connection.rollback()
+    return rows
+
+
+def write_report(handle, statements, missing, unexpected, budget):
+    failed = [s for s in statements if s.failures or s.error]
+    handle.write("## Query plans\n\n")
+    handle.write(
+        f"{len(statements)} statements checked, {len(failed)} failing. Budgets: no seq scan "
+        f"over {budget.large_rows:,} rows, {budget.max_buffers:,} buffers, "
+        f"cost {budget.max_cost:,}.\n\n"
+    )
+    handle.write("| Route | Statement | Indexes | Seq scans | Buffers | Cost | ms | Result |\n")
+    handle.write("|---|---|---|---|---:|---:|---:|---|\n")
+    for s in statements:
+        if s.plan is None:
+            cells = ["", "", "", "", ""]
+        else:
+            cells = [
+                ", ".join(s.indexes()) or "-",
+                ", ".join(s.seq_scans()) or "-",
+                f"{s.buffers():,}",
+                f"{s.root['Total Cost']:,.0f}",
+                f"{s.plan['Execution Time']:.2f}",
+            ]
+        result = "; ".join(s.failures) or (f"EXPLAIN failed: {s.error}" if s.error else "ok")
+        handle.write(f"| `{s.route}` | `{s.name}` | {' | '.join(cells)} | {result} |\n")
+
+    for s in failed:
+        handle.write(f"\n### `{s.name}` from `{s.route}`\n\n")
+        handle.write("; ".join(s.failures or [f"EXPLAIN failed: {s.error}"]) + "\n\n")
+        handle.write(f"```sql\n{s.sql[:4000]}\n```\n")
+        if s.plan is not None:
+            handle.write(f"\n```\n{s.outline()}\n```\n")
+    if missing:
+        handle.write("\n### Routes not exercised\n\n")
+        handle.writelines(f"- `{route}`\n" for route in sorted(missing))
+    if unexpected:
+        handle.write("\n### Unexpected responses\n\n")
+        handle.writelines(f"- `{call}`: {status} {body.strip()}\n" for call, status, body in unexpected)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--large-rows", type=int, default=10_000, help="tables this big must not be seq scanned"
+    )
+    parser.add_argument("--max-buffers", type=int, default=2_000)
+    parser.add_argument("--max-cost", type=int, default=20_000)
+    parser.add_argument(
+        "--report", help="append a Markdown report to this file, e.g. $GITHUB_STEP_SUMMARY"
+    )
+    parser.add_argument("--json", help="write every statement and plan here as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    load_dotenv()
+    # No background threads: their statements would land on random routes
+    for name in ("CACHE_INVALIDATION_ENABLED", "REPORTS_REFRESH_ENABLED", "EMBEDDINGS_ENABLED"):
+        os.environ[name] = "0"
+
+    import db
+    from app_postgres import app
+
+    connection = db.get_db_connection()
+    if connection is None:
+        sys.exit("Unable to connect to the database")
+    try:
+        targets = pick_targets(connection)
+        rows = table_rows(connection)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    finally:
+        connection.close()
+
+    recorder = Recorder(db.EXPLAINABLE_VERBS)
+    db.add_statement_hook(recorder)
+    started = time.perf_counter()
+    run_workers(recorder)
+    ex = Exerciser(app)
+    exercise(ex, targets)
+    run_workers(recorder)
+    elapsed = time.perf_counter() - started
+
+    budget = Budget(args.large_rows, args.max_buffers, args.max_cost)
+    statements = sorted(recorder.statements.values(), key=lambda s: (s.route, s.name))
+    for statement in statements:
+        statement.check(budget, rows)
+    missing = ex.routes() - ex.covered
+    # 503 is an optional backend that is not installed, not a failure
+    unexpected = [u for u in ex.unexpected if u[1] >= 500 and u[1] != 503]
+
+    out = io.StringIO()
+    write_report(out, statements, missing, ex.unexpected, budget)
+    report = out.getvalue()
+    print(report)
+    print(f"checked {len(statements)} statements in {elapsed:.1f}s")
+    if args.report:
+        with open(args.report, "a", encoding="utf-8") as handle:
+            handle.write(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump([s.to_dict() for s in statements], handle, indent=2, default=str)
+
+    if any(s.failures or s.error for s in statements) or missing or unexpected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
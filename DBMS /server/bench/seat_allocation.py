@@ -0,0 +1,155 @@
+"""
+Registrations per second on a single hot event
+
+Creates one event with a fixed capacity and a batch of users, then has every
+user register concurrently through registrations.register_for_event (the same
+statement create_registration runs). Reports throughput and latency and
+checks that the event was not oversold.
+
+Run from the server directory:
+    python -m bench.seat_allocation --capacity 1000 --users 5000 --concurrency 32
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--keep", action="store_true", help="leave the benchmark rows in place"
+    )
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def setup(connection, capacity, users, tag):
+    with connection.cursor() as cur:
+        rows = [
+            (f"bench {i}", f"bench-{tag}-{i}@example.com", "x", "0000000000")
+            for i in range(users + 1)
+        ]
+        user_ids = [
+            row[0]
+            for row in execute_values(
+                cur,
+                "INSERT INTO users (name, email, password, phone) VALUES %s RETURNING id",
+                rows,
+                fetch=True,
+                page_size=1000,
+            )
+        ]
+        cur.execute(
+            """
+            INSERT INTO events (
+                name, event_date, venue, category, registration_deadline,
+                fee, organizer_id, capacity
+            )
+            VALUES (%s, CURRENT_DATE + 30, 'Bench Arena', 'bench',
+                    CURRENT_DATE + 30, 0, %s, %s)
+            RETURNING id
+        """,
+            (f"bench {tag}", user_ids[0], capacity),
+        )
+        event_id = cur.fetchone()[0]
+    connection.commit()
+    # The first user is the organizer and does not register
+    return event_id, user_ids
+
+
+def teardown(connection, event_id, user_ids):
+    with connection.cursor() as cur:
+        cur.execute("DELETE FROM event_slots WHERE event_id = %s", (event_id,))
+        cur.execute("DELETE FROM registrations WHERE event_id = %s", (event_id,))
+        cur.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+    connection.commit()
+
+
+def main():
+    args = parse_args()
+    # Size the pool before db creates it so every worker thread gets a connection
+    os.environ["DB_POOL_MAX_SIZE"] = str(args.concurrency + 1)
+    os.environ["DB_POOL_MIN_SIZE"] = str(args.concurrency + 1)
+
+    from db import get_db_connection
+    from registrations import register_for_event
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit("Unable to connect to the database")
+
+    tag = uuid.uuid4().hex[:8]
+    event_id, user_ids = setup(connection, args.capacity, args.users, tag)
+
+    def register(user_id):
+        conn = get_db_connection()
+        started = time.perf_counter()
+        try:
+            outcome, registration = register_for_event(conn, event_id, user_id)
+        except Exception as e:
+            conn.rollback()
+            return "error", time.perf_counter() - started, str(e)
+        finally:
+            conn.close()
+        status = registration["registration_status"] if registration else outcome
+        return status, time.perf_counter() - started, None
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(register, user_ids[1:]))
+        elapsed = time.perf_counter() - started
+
+        outcomes = Counter(status for status, _, _ in results)
+        latencies = [latency * 1000 for _, latency, _ in results]
+        errors = [error for _, _, error in results if error]
+
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT count(*) FROM event_slots WHERE event_id = %s AND registration_id IS NOT NULL",
+                (event_id,),
+            )
+            seated = cur.fetchone()[0]
+        connection.rollback()
+
+        print(f"event {event_id}: capacity={args.capacity} users={args.users} concurrency={args.concurrency}")
+        print(f"outcomes: {dict(outcomes)}")
+        print(f"elapsed: {elapsed:.2f}s  throughput: {len(results) / elapsed:.0f} registrations/s")
+        print(
+            "latency ms: "
+            f"p50={percentile(latencies, 50):.2f} "
+            f"p95={percentile(latencies, 95):.2f} "
+            f"p99={percentile(latencies, 99):.2f} "
+            f"mean={statistics.mean(latencies):.2f}"
+        )
+        expected = min(args.capacity, args.users)
+        print(f"seats taken: {seated} (expected {expected})")
+        if errors:
+            print(f"first error: {errors[0]}")
+        if seated != expected or outcomes["pending"] != expected:
+            sys.exit("seat allocation mismatch")
+    finally:
+        if not args.keep:
+            teardown(connection, event_id, user_ids)
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
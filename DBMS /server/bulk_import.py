@@ -0,0 +1,454 @@
+"""
+Bulk import of events and users from CSV or NDJSON
+
+Rows are validated one at a time as the input is read and written to a
+temporary file, so memory use does not grow with the input. The valid rows
+are then loaded with COPY FROM STDIN into a staging table and merged into the
+real table in one statement. Rows that would duplicate an existing record, or
+an earlier row of the same file, are reported as conflicts and skipped. The
+database connection is only borrowed for the COPY and the merge.
+
+Run from the server directory:
+    python bulk_import.py events fixtures.csv --organizer-id 1
+    python bulk_import.py users members.ndjson --dry-run
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from db import get_db_connection
+from registrations import parse_capacity
+
+MAX_ERRORS = 1000
+SAMPLE_SIZE = 100
+PROGRESS_EVERY = 100_000
+
+# Ranges of the INTEGER and DECIMAL(10, 2) columns; a value outside them
+# would fail inside COPY and abort the whole file instead of one line
+INT_MIN, INT_MAX = -(2**31), 2**31 - 1
+FEE_DIGITS, FEE_PLACES = 10, 2
+
+EVENT_STATUSES = ("upcoming", "ongoing", "completed", "cancelled")
+USER_ROLES = ("admin", "organizer", "participant", "team_manager")
+
+
+class ImportAborted(Exception):
+    """Raised when an import has more invalid rows than allowed; nothing is written."""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def _value(row, name, required=False, max_length=None):
+    value = row.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    if isinstance(value, (dict, list, bool)):
+        raise ValueError(f"{name} must be a scalar")
+    value = str(value)
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def _date(row, name, required=False):
+    value = _value(row, name, required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)") from e
+
+
+def _decimal(row, name, required=False, digits=FEE_DIGITS, places=FEE_PLACES):
+    value = _value(row, name, required)
+    if value is None:
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation as e:
+        raise ValueError(f"{name} must be a number") from e
+    if not number.is_finite() or number < 0:
+        raise ValueError(f"{name} must be a non-negative number")
+    limit = 10 ** (digits - places)
+    if number >= limit:
+        raise ValueError(f"{name} must be less than {limit}")
+    if number != number.quantize(Decimal(1).scaleb(-places)):
+        raise ValueError(f"{name} must have at most {places} decimal places")
+    return number
+
+
+def _int(row, name, required=False, minimum=None):
+    value = _value(row, name, required)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be an integer") from e
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    if not INT_MIN <= number <= INT_MAX:
+        raise ValueError(f"{name} is out of range")
+    return number
+
+
+def _choice(row, name, choices, default):
+    value = _value(row, name) or default
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def parse_event(row, defaults):
+    event_date = _date(row, "event_date", required=True)
+    deadline = _date(row, "registration_deadline", required=True)
+    if deadline > event_date:
+        raise ValueError("registration_deadline is after event_date")
+    organizer_id = _int(row, "organizer_id", minimum=1) or defaults.get("organizer_id")
+    return (
+        _value(row, "name", required=True, max_length=200),
+        event_date,
+        _value(row, "venue", required=True, max_length=200),
+        _value(row, "category", required=True, max_length=100),
+        _value(row, "description"),
+        _value(row, "image", max_length=255),
+        _choice(row, "status", EVENT_STATUSES, "upcoming"),
+        deadline,
+        _decimal(row, "fee", required=True),
+        organizer_id,
+        parse_capacity(_value(row, "capacity")),
+    )
+
+
+def parse_user(row, defaults):
+    email = _value(row, "email", required=True, max_length=100)
+    if "@" not in email:
+        raise ValueError("email is not valid")
+    return (
+        _value(row, "name", required=True, max_length=100),
+        email,
+        # Without a werkzeug hash the account cannot log in until its
+        # password is set; plaintext passwords are never accepted here
+        _value(row, "password_hash", max_length=255) or "!",
+        _value(row, "phone", required=True, max_length=15),
+        _int(row, "age", minimum=0),
+        _value(row, "gender", max_length=20),
+        _choice(row, "role", USER_ROLES, "participant"),
+    )
+
+
+EVENT_COLUMNS = (
+    "name", "event_date", "venue", "category", "description", "image",
+    "status", "registration_deadline", "fee", "organizer_id", "capacity",
+)
+USER_COLUMNS = ("name", "email", "password", "phone", "age", "gender", "role")
+
+# Each merge classifies every staged row once (the CTE snapshot does not see
+# the rows being inserted), inserts the clean ones, and returns
+# (inserted, conflicts, first SAMPLE_SIZE conflicts as JSON)
+EVENT_MERGE_SQL = f"""
+    WITH classified AS (
+        SELECT s.*,
+            CASE
+                WHEN row_number() OVER (
+                    PARTITION BY s.name, s.event_date, s.venue ORDER BY s.line
+                ) > 1 THEN 'duplicate in file'
+                WHEN EXISTS (
+                    SELECT 1 FROM events e
+                    WHERE e.name = s.name AND e.event_date = s.event_date
+                        AND e.venue = s.venue
+                ) THEN 'event already exists'
+                WHEN s.organizer_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM users u WHERE u.id = s.organizer_id
+                ) THEN 'unknown organizer_id'
+            END AS conflict
+        FROM import_events s
+    ),
+    inserted AS (
+        INSERT INTO events ({', '.join(EVENT_COLUMNS)})
+        SELECT {', '.join(EVENT_COLUMNS)} FROM classified
+        WHERE conflict IS NULL
+        ORDER BY line
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM inserted),
+        (SELECT count(*) FROM classified WHERE conflict IS NOT NULL),
+        (SELECT json_agg(c) FROM (
+            SELECT line, name AS key, conflict AS reason FROM classified
+            WHERE conflict IS NOT NULL ORDER BY line LIMIT {SAMPLE_SIZE}
+        ) c)
+"""
+
+USER_MERGE_SQL = f"""
+    WITH classified AS (
+        SELECT s.*,
+            CASE
+                WHEN row_number() OVER (PARTITION BY s.email ORDER BY s.line) > 1
+                    THEN 'duplicate in file'
+                WHEN EXISTS (SELECT 1 FROM users u WHERE u.email = s.email)
+                    THEN 'email already registered'
+            END AS conflict
+        FROM import_users s
+    ),
+    inserted AS (
+        INSERT INTO users ({', '.join(USER_COLUMNS)})
+        SELECT {', '.join(USER_COLUMNS)} FROM classified
+        WHERE conflict IS NULL
+        ORDER BY line
+        -- A concurrent signup with the same email wins
+        ON CONFLICT (email) DO NOTHING
+        RETURNING email
+    ),
+    -- Rows skipped by ON CONFLICT are conflicts too
+    outcome AS (
+        SELECT c.line, c.email, coalesce(c.conflict, CASE
+            WHEN NOT EXISTS (SELECT 1 FROM inserted i WHERE i.email = c.email)
+                THEN 'email already registered'
+        END) AS conflict
+        FROM classified c
+    )
+    SELECT
+        (SELECT count(*) FROM inserted),
+        (SELECT count(*) FROM outcome WHERE conflict IS NOT NULL),
+        (SELECT json_agg(c) FROM (
+            SELECT line, email AS key, conflict AS reason FROM outcome
+            WHERE conflict IS NOT NULL ORDER BY line LIMIT {SAMPLE_SIZE}
+        ) c)
+"""
+
+IMPORTS = {
+    "events": {
+        "parse": parse_event,
+        "columns": EVENT_COLUMNS,
+        "staging": """
+            CREATE TEMP TABLE import_events (
+                line INTEGER NOT NULL,
+                name VARCHAR(200) NOT NULL,
+                event_date DATE NOT NULL,
+                venue VARCHAR(200) NOT NULL,
+                category VARCHAR(100) NOT NULL,
+                description TEXT,
+                image VARCHAR(255),
+                status VARCHAR(20) NOT NULL,
+                registration_deadline DATE NOT NULL,
+                fee DECIMAL(10, 2) NOT NULL,
+                organizer_id INTEGER,
+                capacity INTEGER
+            ) ON COMMIT DROP
+        """,
+        "merge": EVENT_MERGE_SQL,
+    },
+    "users": {
+        "parse": parse_user,
+        "columns": USER_COLUMNS,
+        "staging": """
+            CREATE TEMP TABLE import_users (
+                line INTEGER NOT NULL,
+                name VARCHAR(100) NOT NULL,
+                email VARCHAR(100) NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                phone VARCHAR(15) NOT NULL,
+                age INTEGER,
+                gender VARCHAR(20),
+                role VARCHAR(20) NOT NULL
+            ) ON COMMIT DROP
+        """,
+        "merge": USER_MERGE_SQL,
+    },
+}
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict or the error that made it unreadable)."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            row = ValueError("each line must be a JSON object")
+        yield line_no, row
+
+
+def validate(stream, fmt, kind, spool, defaults=None, max_errors=MAX_ERRORS, progress=None):
+    """
+    Validate rows from stream and write the valid ones to spool as COPY CSV
+
+    Returns:
+        dict with rows, valid, invalid and the first SAMPLE_SIZE errors
+    """
+    parse = IMPORTS[kind]["parse"]
+    defaults = defaults or {}
+    writer = csv.writer(spool, lineterminator="\n")
+    result = {"rows": 0, "valid": 0, "invalid": 0, "errors": []}
+
+    for line, row in read_rows(stream, fmt):
+        result["rows"] += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            values = parse(row, defaults)
+        except ValueError as e:
+            result["invalid"] += 1
+            if len(result["errors"]) < SAMPLE_SIZE:
+                result["errors"].append({"line": line, "error": str(e)})
+            if result["invalid"] > max_errors:
+                raise ImportAborted(f"more than {max_errors} invalid rows", result)
+            continue
+        writer.writerow((line,) + tuple("" if value is None else value for value in values))
+        result["valid"] += 1
+        if progress and result["rows"] % PROGRESS_EVERY == 0:
+            progress("validated", result["rows"])
+    return result
+
+
+def load(connection, kind, spool, dry_run=False, progress=None):
+    """COPY the spooled rows into staging and merge them; returns (inserted, conflicts, samples)."""
+    spec = IMPORTS[kind]
+    with connection.cursor() as cur:
+        cur.execute(spec["staging"])
+        cur.copy_expert(
+            f"COPY import_{kind} (line, {', '.join(spec['columns'])}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            spool,
+        )
+        if progress:
+            progress("merging", cur.rowcount)
+        cur.execute(spec["merge"])
+        inserted, conflicts, samples = cur.fetchone()
+    if dry_run:
+        connection.rollback()
+    else:
+        connection.commit()
+    return inserted, conflicts, samples or []
+
+
+def run_import(stream, fmt, kind, defaults=None, dry_run=False,
+               max_errors=MAX_ERRORS, progress=None):
+    """
+    Validate, stage and merge one import
+
+    Args:
+        stream: text stream of CSV (with a header row) or NDJSON
+        fmt (str): "csv" or "ndjson"
+        kind (str): "events" or "users"
+        defaults (dict): values for missing columns, e.g. organizer_id
+        dry_run (bool): run the merge but roll it back
+        progress: optional callback(phase, rows)
+
+    Returns:
+        Summary dict: rows, valid, invalid, inserted, conflicts, errors,
+        conflict_samples, dry_run
+
+    Raises:
+        ImportAborted: more than max_errors rows failed validation
+        ConnectionError: no database connection was available
+    """
+    if kind not in IMPORTS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError("format must be csv or ndjson")
+
+    with tempfile.TemporaryFile(mode="w+", encoding="utf-8", newline="") as spool:
+        result = validate(stream, fmt, kind, spool, defaults, max_errors, progress)
+        spool.seek(0)
+        if progress:
+            progress("copying", result["valid"])
+
+        connection = get_db_connection()
+        if connection is None:
+            raise ConnectionError("Database connection error")
+        try:
+            inserted, conflicts, samples = load(connection, kind, spool, dry_run, progress)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    result.update(
+        inserted=inserted, conflicts=conflicts, conflict_samples=samples, dry_run=dry_run
+    )
+    return result
+
+
+def detect_format(content_type, explicit=None):
+    if explicit:
+        return explicit.lower()
+    content_type = (content_type or "").lower()
+    if "json" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("kind", choices=sorted(IMPORTS))
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--organizer-id", type=int, help="organizer for events without one")
+    parser.add_argument("--max-errors", type=int, default=MAX_ERRORS)
+    parser.add_argument("--dry-run", action="store_true", help="validate and merge, then roll back")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    started = time.perf_counter()
+
+    def progress(phase, rows):
+        elapsed = time.perf_counter() - started
+        print(f"{phase}: {rows} rows ({elapsed:.1f}s)", file=sys.stderr)
+
+    if args.path == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    else:
+        stream = open(args.path, encoding="utf-8", newline="")
+    try:
+        result = run_import(
+            stream,
+            fmt,
+            args.kind,
+            defaults={"organizer_id": args.organizer_id},
+            dry_run=args.dry_run,
+            max_errors=args.max_errors,
+            progress=progress,
+        )
+    except ImportAborted as e:
+        print(json.dumps(e.result, indent=2, default=str))
+        sys.exit(f"Import aborted: {e}")
+    finally:
+        stream.close()
+
+    print(json.dumps(result, indent=2, default=str))
+    print(
+        f"{result['inserted']} of {result['rows']} rows imported in "
+        f"{time.perf_counter() - started:.1f}s ({result['invalid']} invalid, "
+        f"{result['conflicts']} conflicts){' [dry run]' if args.dry_run else ''}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,596 @@
+import logging
 import os
+import re
+import sys
+import threading
+import time
+from collections import deque
 
 import psycopg2
+import psycopg2.extensions
 from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
 from psycopg2.extras import DictCursor
 
+import tracing
+from metrics import REGISTRY, ROW_BUCKETS
 
-def get_db_connection():
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("db.slow_query")
+
+
+def _env_int(name, default):
     try:
-        pg_user = os.getenv("POSTGRES_USER", "genai_super")
-        pg_pass = os.getenv("POSTGRES_PASSWORD", "mypassword")
-        pg_db = os.getenv("POSTGRES_DB", "mydb")
-        pg_host = os.getenv("POSTGRES_HOST", "0.0.0.0")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-
-        connection = psycopg2.connect(
-            host=pg_host, port=pg_port, database=pg_db, user=pg_user, password=pg_pass
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+SLOW_QUERY_THRESHOLD = _env_float("SLOW_QUERY_THRESHOLD_MS", 200.0) / 1000
+# At most one EXPLAIN per statement name per interval; 0 turns EXPLAIN off
+SLOW_QUERY_EXPLAIN_INTERVAL = _env_float("SLOW_QUERY_EXPLAIN_INTERVAL", 300.0)
+
+QUERY_DURATION = REGISTRY.histogram(
+    "db_query_duration_seconds", "Time spent executing statements", ("statement",)
+)
+QUERY_ROWS = REGISTRY.histogram(
+    "db_query_rows", "Rows returned or affected per statement", ("statement",), ROW_BUCKETS
+)
+QUERY_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Statements that raised a database error", ("statement",)
+)
+SLOW_QUERIES = REGISTRY.counter(
+    "db_slow_queries_total", "Statements slower than SLOW_QUERY_THRESHOLD_MS", ("statement",)
+)
+POOL_WAIT = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Time taken to borrow a connection from the pool"
+)
+
+_VERB = re.compile(r"\s*(?:--[^\n]*\n\s*)*([A-Za-z]+)")
+# Statements EXPLAIN can plan; bench/plancheck.py shares the list
+EXPLAINABLE_VERBS = frozenset(("select", "with", "insert", "update", "delete"))
+# Frames skipped when naming a statement after the function that ran it
+_INTERNAL_MODULES = frozenset((__name__, "psycopg2.extras", "psycopg2.extensions"))
+
+_last_explain = {}
+_explain_lock = threading.Lock()
+_statement_hooks = []
+
+
+def add_statement_hook(hook):
+    """
+    Call hook(cursor, name, query, params) before every statement executed
+
+    Hooks run on the executing thread, before the statement is sent, for
+    execute() only; bench/plancheck.py uses one to EXPLAIN what routes run.
+    """
+    _statement_hooks.append(hook)
+
+
+def _statement(query):
+    """
+    Name a statement after the calling function and its SQL verb
+
+    e.g. ``register_for_event:with``. Names are stable across edits and low in
+    cardinality, unlike the SQL text or the line number.
+    """
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") in _INTERNAL_MODULES:
+        frame = frame.f_back
+    caller = frame.f_code.co_name if frame is not None else "unknown"
+    if isinstance(query, bytes):
+        query = query[:200].decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    match = _VERB.match(query)
+    verb = match.group(1).lower() if match else "unknown"
+    return caller, verb
+
+
+def _sql_text(query):
+    """The statement on one line, for logs and span attributes."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    return " ".join(str(query).split())
+
+
+def _explain(cursor, query, params, name):
+    """Log the plan of a slow statement, at most once per interval per statement."""
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _last_explain.get(name, float("-inf")) < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return None
+        _last_explain[name] = now
+
+    conn = cursor.connection
+    status = conn.get_transaction_status()
+    if status not in (TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS):
+        return None
+    if isinstance(query, bytes):
+        query = query.decode("utf-8")
+    elif not isinstance(query, str):
+        return None
+    # A plain cursor, so the EXPLAIN is neither timed nor named after us
+    explain = psycopg2.extensions.cursor(conn)
+    try:
+        # Inside a transaction a failed EXPLAIN must not abort the caller's work
+        if status == TRANSACTION_STATUS_INTRANS:
+            explain.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain.execute("EXPLAIN " + query, params)
+            plan = "\n".join(row[0] for row in explain.fetchall())
+        except psycopg2.Error as e:
+            if status == TRANSACTION_STATUS_INTRANS:
+                explain.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN failed: {e}"
+        if status == TRANSACTION_STATUS_INTRANS:
+            explain.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        explain.close()
+
+
+class _TimedCursorMixin:
+    """Records latency, row counts and slow statements for every execute."""
+
+    def _timed(self, run, query, params, explainable=True):
+        caller, verb = _statement(query)
+        name = f"{caller}:{verb}"
+        if explainable:
+            for hook in _statement_hooks:
+                hook(self, name, query, params)
+        span = tracing.start_span(name, "db")
+        started = time.perf_counter()
+        try:
+            result = run()
+        except Exception as e:
+            if isinstance(e, psycopg2.Error):
+                QUERY_ERRORS.inc(name)
+            tracing.end_span(span, error=str(e))
+            raise
+        elapsed = time.perf_counter() - started
+        QUERY_DURATION.observe(elapsed, name)
+        rows = self.rowcount
+        if span is not None:
+            tracing.end_span(span, **{"db.statement": _sql_text(query)[:1000], "db.rows": rows})
+        if rows >= 0:
+            QUERY_ROWS.observe(rows, name)
+        if elapsed >= SLOW_QUERY_THRESHOLD:
+            SLOW_QUERIES.inc(name)
+            plan = None
+            if (
+                explainable
+                and SLOW_QUERY_EXPLAIN_INTERVAL
+                and verb in EXPLAINABLE_VERBS
+                and self.name is None
+            ):
+                plan = _explain(self, query, params, name)
+            slow_query_logger.warning(
+                "%s took %.1f ms (%s rows): %s%s",
+                name,
+                elapsed * 1000,
+                rows,
+                _sql_text(query)[:2000],
+                f"\n{plan}" if plan else "",
+            )
+        return result
+
+    def execute(self, query, vars=None):
+        return self._timed(lambda: super(_TimedCursorMixin, self).execute(query, vars), query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(
+            lambda: super(_TimedCursorMixin, self).executemany(query, vars_list),
+            query,
+            None,
+            explainable=False,
+        )
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(
+            lambda: super(_TimedCursorMixin, self).copy_expert(sql, file, size),
+            sql,
+            None,
+            explainable=False,
         )
-        return connection
-    except OperationalError as e:
-        print(f"Error connecting to PostgreSQL: {e}")
+
+
+_timed_factories = {}
+
+
+def _timed_factory(factory):
+    timed = _timed_factories.get(factory)
+    if timed is None:
+        timed = _timed_factories.setdefault(
+            factory, type(f"Timed{factory.__name__}", (_TimedCursorMixin, factory), {})
+        )
+    return timed
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, whatever their cursor_factory, are timed."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory
+        kwargs["cursor_factory"] = _timed_factory(factory or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+
+def connection_params():
+    return {
+        "host": os.getenv("POSTGRES_HOST", "0.0.0.0"),
+        "port": os.getenv("POSTGRES_PORT", "5432"),
+        "database": os.getenv("POSTGRES_DB", "mydb"),
+        "user": os.getenv("POSTGRES_USER", "genai_super"),
+        "password": os.getenv("POSTGRES_PASSWORD", "mypassword"),
+    }
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be borrowed within the pool timeout."""
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """
+    Proxy handed out by the pool.
+
+    Behaves like a psycopg2 connection, except that ``close()`` returns the
+    underlying connection to the pool instead of closing the socket, so the
+    existing ``finally: connection.close()`` blocks keep working unchanged.
+    Attribute reads and writes (``connection.autocommit = True``) and
+    ``with connection:`` all reach the underlying connection.
+    """
+
+    _OWN_ATTRIBUTES = frozenset(("_pool", "_entry"))
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def _connection(self):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return entry.conn
+
+    def __getattr__(self, name):
+        return getattr(self._connection(), name)
+
+    def __setattr__(self, name, value):
+        if name in self._OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._connection(), name, value)
+
+    def __enter__(self):
+        # Like psycopg2: the block is one transaction, the connection stays open
+        self._connection().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._connection().__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def raw(self):
+        return self._entry.conn
+
+    def close(self):
+        entry = self._entry
+        if entry is not None:
+            self._entry = None
+            self._pool.release(entry)
+
+    def __del__(self):
+        # A forgotten close() must not leak the slot forever
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+
+    Args:
+        params (dict): Keyword arguments for psycopg2.connect
+        min_size (int): Connections opened eagerly and kept through idle pruning
+        max_size (int): Hard cap on open connections
+        timeout (float): Seconds to wait for a free connection before giving up
+        max_idle (float): Idle connections older than this are closed
+        max_lifetime (float): Connections older than this are recycled
+        check_interval (float): Idle time after which a checkout runs ``SELECT 1``
+    """
+
+    def __init__(
+        self,
+        params,
+        min_size=1,
+        max_size=10,
+        timeout=5.0,
+        max_idle=300.0,
+        max_lifetime=3600.0,
+        check_interval=30.0,
+    ):
+        self.params = params
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._saturated = 0
+        self._peak_in_use = 0
+        self._opened = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+
+        self._fill_min()
+
+    def _fill_min(self):
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except OperationalError as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning("Error pre-filling connection pool: %s", e)
+                return
+            with self._cond:
+                self._idle.append(entry)
+
+    def _open(self):
+        conn = psycopg2.connect(connection_factory=InstrumentedConnection, **self.params)
+        with self._cond:
+            self._opened += 1
+        return _PoolEntry(conn)
+
+    def _discard(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _usable(self, entry, now):
+        if entry.conn.closed:
+            return False
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return False
+        if self.max_idle and now - entry.last_used > self.max_idle:
+            return False
+        if self.check_interval is not None and now - entry.last_used > self.check_interval:
+            try:
+                # A plain cursor: the check is not a query to time, trace or hook
+                with psycopg2.extensions.cursor(entry.conn) as cur:
+                    cur.execute("SELECT 1")
+                entry.conn.rollback()
+            except psycopg2.Error:
+                with self._cond:
+                    self._health_check_failures += 1
+                return False
+        return True
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    # LIFO keeps a warm working set and lets the rest age out
+                    entry = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no connection available within {self.timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                        self._saturated += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._usable(entry, time.monotonic()):
+                self._discard(entry)
+                continue
+            break
+
+        wait_time = time.monotonic() - started
+        POOL_WAIT.observe(wait_time)
+        with self._cond:
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        with self._cond:
+            self._in_use -= 1
+
+        conn = entry.conn
+        now = time.monotonic()
+        if conn.closed or self._closed:
+            self._discard(entry)
+            return
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # The next borrower expects the default of one transaction per block
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(entry)
+            return
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+        self._prune(now)
+
+    def _prune(self, now):
+        """Close idle connections past max_idle, keeping at least min_size open."""
+        if not self.max_idle:
+            return
+        stale = []
+        with self._cond:
+            # The oldest idle connections sit at the left end of the deque
+            while (
+                self._idle
+                and self._size - len(stale) > self.min_size
+                and now - self._idle[0].last_used > self.max_idle
+            ):
+                stale.append(self._idle.popleft())
+        for entry in stale:
+            self._discard(entry)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_max": self._wait_time_max,
+                "timeouts": self._timeouts,
+                "saturated": self._saturated,
+                "connections_opened": self._opened,
+                "connections_discarded": self._discarded,
+                "health_check_failures": self._health_check_failures,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it on first use.
+
+    The pool is keyed by pid so forked workers (gunicorn) never share sockets
+    inherited from the parent.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                connection_params(),
+                min_size=_env_int("DB_POOL_MIN_SIZE", 1),
+                max_size=_env_int("DB_POOL_MAX_SIZE", 10),
+                timeout=_env_float("DB_POOL_TIMEOUT", 5.0),
+                max_idle=_env_float("DB_POOL_MAX_IDLE", 300.0),
+                max_lifetime=_env_float("DB_POOL_MAX_LIFETIME", 3600.0),
+                check_interval=_env_float("DB_POOL_CHECK_INTERVAL", 30.0),
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """
+    Borrow a connection from the shared pool.
+
+    Call ``close()`` on the result to hand it back. Returns None if the
+    database is unreachable or the pool stays saturated past its timeout.
+    """
+    try:
+        with tracing.span("db.pool.checkout", "pool"):
+            return get_pool().getconn()
+    except (OperationalError, PoolTimeout) as e:
+        logger.error("Error connecting to PostgreSQL: %s", e)
         return None
 
 
@@ -47,7 +619,8 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=F
 
         result = None
         if fetch_one:
-            result = dict(cursor.fetchone()) if cursor.fetchone() else None
+            row = cursor.fetchone()
+            result = dict(row) if row else None
         elif fetch_all:
             result = [dict(row) for row in cursor.fetchall()]
 
@@ -56,7 +629,7 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=F
 
         return result
     except Exception as e:
-        print(f"Database error: {e}")
+        logger.exception("Database error: %s", e)
         if commit:
             connection.rollback()
         return None
@@ -0,0 +1,212 @@
+"""
+Venue coordinates and distance search for events
+
+events.location is a PostGIS geography(Point, 4326) with a GiST index, so
+"near me" queries are answered with an indexed KNN scan instead of filtering
+the whole catalogue. Without PostGIS the column is not created and the nearby
+endpoint reports itself unavailable.
+"""
+
+import logging
+import os
+import struct
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from db import get_db_connection
+from pagination import decode_cursor, encode_cursor, parse_limit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RADIUS = float(os.getenv("NEARBY_DEFAULT_RADIUS", "25000"))
+MAX_RADIUS = float(os.getenv("NEARBY_MAX_RADIUS", "500000"))
+
+# Longitude first, as PostGIS expects
+POINT_SQL = "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography"
+
+_WKB_POINT = 1
+_WKB_SRID_FLAG = 0x20000000
+
+_available = None
+_lock = threading.Lock()
+
+
+class LocationUnavailable(Exception):
+    """Raised when PostGIS is not installed in the database."""
+
+
+def create_location_column(cursor):
+    """Add events.location and its GiST index if PostGIS can be enabled."""
+    cursor.execute("SAVEPOINT geo_postgis;")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT geo_postgis;")
+        logger.warning("PostGIS unavailable, nearby search disabled: %s", e)
+        return False
+    cursor.execute("RELEASE SAVEPOINT geo_postgis;")
+    cursor.execute(
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS location geography(Point, 4326);"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_location ON events USING GIST (location);"
+    )
+    return True
+
+
+def _cast_location(value, cur):
+    # geography values arrive as hex EWKB; expose points as {"lat", "lng"}
+    if value is None:
+        return None
+    raw = bytes.fromhex(value)
+    order = "<" if raw[0] == 1 else ">"
+    (kind,) = struct.unpack(order + "I", raw[1:5])
+    offset = 9 if kind & _WKB_SRID_FLAG else 5
+    if kind & 0xFF != _WKB_POINT:
+        return value
+    lng, lat = struct.unpack(order + "dd", raw[offset : offset + 16])
+    return {"lat": lat, "lng": lng}
+
+
+def ensure_location_type():
+    """
+    Detect PostGIS once per process and register the geography typecaster
+
+    Returns False until the database has been reached once.
+    """
+    global _available
+    if _available is not None:
+        return True
+    with _lock:
+        if _available is not None:
+            return True
+        connection = get_db_connection()
+        if connection is None:
+            return False
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT t.oid FROM pg_type t
+                    WHERE t.typname = 'geography'
+                        AND EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = 'events' AND column_name = 'location'
+                        )
+                """
+                )
+                row = cur.fetchone()
+            connection.rollback()
+        finally:
+            connection.close()
+        if row:
+            psycopg2.extensions.register_type(
+                psycopg2.extensions.new_type((row[0],), "GEOGRAPHY", _cast_location)
+            )
+        _available = bool(row)
+    return True
+
+
+def require_location():
+    ensure_location_type()
+    if not _available:
+        raise LocationUnavailable("Location search is not available")
+
+
+def _parse_float(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{name} must be a number") from e
+
+
+def parse_coordinates(lat, lng):
+    """Validate a latitude/longitude pair, returning (lat, lng) as floats."""
+    lat = _parse_float(lat, "lat")
+    lng = _parse_float(lng, "lng")
+    if not -90 <= lat <= 90:
+        raise ValueError("lat must be between -90 and 90")
+    if not -180 <= lng <= 180:
+        raise ValueError("lng must be between -180 and 180")
+    return lat, lng
+
+
+def location_from_payload(data):
+    """
+    Return (lat, lng) from an event payload's latitude/longitude, or None
+
+    Raises ValueError if only one of them is given or they are out of range.
+    """
+    if data.get("latitude") is None and data.get("longitude") is None:
+        return None
+    if data.get("latitude") is None or data.get("longitude") is None:
+        raise ValueError("latitude and longitude must be given together")
+    return parse_coordinates(data["latitude"], data["longitude"])
+
+
+def set_event_location(cur, event_id, point):
+    """Store point on the event and return the updated row."""
+    require_location()
+    lat, lng = point
+    cur.execute(
+        f"UPDATE events SET location = {POINT_SQL} WHERE id = %s RETURNING *",
+        (lng, lat, event_id),
+    )
+    return cur.fetchone()
+
+
+def build_nearby_query(args, filters, stats_join):
+    """
+    Build the distance-ordered, keyset-paginated nearby events query
+
+    Rows within ``radius`` metres (default NEARBY_DEFAULT_RADIUS) of lat/lng
+    are ordered nearest first by the GiST KNN operator, ties broken by id,
+    and carry ``distance_m``.
+
+    Returns:
+        (sql, params, limit)
+    """
+    lat, lng = parse_coordinates(args.get("lat"), args.get("lng"))
+    radius = DEFAULT_RADIUS
+    if args.get("radius"):
+        radius = _parse_float(args["radius"], "radius")
+        if not 0 < radius <= MAX_RADIUS:
+            raise ValueError(f"radius must be between 0 and {MAX_RADIUS:g} metres")
+    limit = parse_limit(args.get("limit"))
+    clauses, filter_params = filters
+
+    # The origin is repeated as parameters rather than joined in, so the KNN
+    # ordering sees a constant and can walk idx_events_location
+    distance = f"(e.location <-> {POINT_SQL})"
+    params = [lng, lat, lng, lat, radius] + filter_params
+    clauses = [f"ST_DWithin(e.location, {POINT_SQL}, %s)"] + clauses
+    if args.get("cursor"):
+        last_distance, last_id = decode_cursor(args["cursor"], 2)
+        try:
+            last_distance, last_id = float(last_distance), int(last_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        clauses.append(f"({distance} > %s OR ({distance} = %s AND e.id > %s))")
+        params.extend([lng, lat, last_distance, lng, lat, last_distance, last_id])
+    params.extend([lng, lat, limit + 1])
+
+    sql = f"""
+        SELECT e.*, u.name as organizer_name, st.*, {distance} AS distance_m
+        FROM events e
+        LEFT JOIN users u ON e.organizer_id = u.id
+        {stats_join}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {distance}, e.id
+        LIMIT %s
+    """
+    return sql, params, limit
+
+
+def next_nearby_cursor(rows, limit):
+    """Return the cursor for the page after rows, or None on the last page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last["distance_m"], last["id"])
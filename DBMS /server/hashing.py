@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+# werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes made with a different method are upgraded on the next login.
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.getenv("HASH_POOL_MAX_PENDING", str(WORKERS * 4)))
+TIMEOUT = float(os.getenv("HASH_POOL_TIMEOUT", "10"))
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _lock:
+        if _executor is None or _executor_pid != pid:
+            # spawn: forking a process that runs listener threads is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_pid = pid
+    return _executor
+
+
+def _release_slot(future):
+    _slots.release()
+
+
+def _run(fn, *args):
+    # Reject instead of queueing without bound, so a login storm cannot pile
+    # up requests behind the KDF and starve every other endpoint
+    if not _slots.acquire(blocking=False):
+        raise HashPoolBusy("password hashing queue is full")
+    future = None
+    try:
+        future = _get_executor().submit(fn, *args)
+        # The slot is freed when the work finishes, not when the caller stops
+        # waiting, so timed-out hashes still count against MAX_PENDING
+        future.add_done_callback(_release_slot)
+        return future.result(timeout=TIMEOUT)
+    except FutureTimeout as e:
+        raise HashPoolBusy("password hashing timed out") from e
+    except BrokenProcessPool as e:
+        # A worker died; start a fresh pool on the next call
+        shutdown()
+        raise HashPoolBusy("password hashing pool restarted") from e
+    finally:
+        if future is None:
+            _slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+
+def _effective_method(method):
+    """Spell out werkzeug's defaults, e.g. "pbkdf2:sha256" -> "pbkdf2:sha256:600000"."""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        args = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        if not args:
+            args = ["sha256"]
+        if len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ":".join([name, *args])
+
+
+def needs_rehash(stored_hash):
+    """True if stored_hash was made with other parameters than HASH_METHOD."""
+    return _effective_method(stored_hash.split("$", 1)[0]) != _effective_method(HASH_METHOD)
+
+
+def shutdown():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_pid = None
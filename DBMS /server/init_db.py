@@ -1,24 +1,10 @@
-import os
-
 import psycopg2
-from psycopg2 import OperationalError
-
 
-def get_db_connection():
-    try:
-        pg_user = os.getenv("POSTGRES_USER", "genai_super")
-        pg_pass = os.getenv("POSTGRES_PASSWORD", "mypassword")
-        pg_db = os.getenv("POSTGRES_DB", "mydb")
-        pg_host = os.getenv("POSTGRES_HOST", "0.0.0.0")
-        pg_port = os.getenv("POSTGRES_PORT", "5432")
-
-        connection = psycopg2.connect(
-            host=pg_host, port=pg_port, database=pg_db, user=pg_user, password=pg_pass
-        )
-        return connection
-    except OperationalError as e:
-        print(f"Error: {e}")
-        return None
+from db import get_db_connection
+from geo import create_location_column
+from recommendations import create_embedding_table
+from reports import create_report_views
+from search import create_search_index
 
 
 def init_db():
@@ -59,10 +45,56 @@ def init_db():
             registration_deadline DATE NOT NULL,
             fee DECIMAL(10, 2) NOT NULL,
             organizer_id INTEGER REFERENCES users(id),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            capacity INTEGER CONSTRAINT events_capacity_range
+                CHECK (capacity IS NULL OR capacity BETWEEN 1 AND 100000),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
         );
         """)
 
+        # Row version used for ETags; added separately for existing databases
+        cursor.execute("""
+        ALTER TABLE events
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+        """)
+        # NULL capacity means unlimited seats
+        cursor.execute("""
+        ALTER TABLE events
+            ADD COLUMN IF NOT EXISTS capacity INTEGER;
+        """)
+        # Every seat is a row of event_slots, so capacity is bounded (see
+        # registrations.MAX_CAPACITY). Older databases only required
+        # capacity >= 0: oversized capacities are cut down to the maximum, and
+        # the range is added NOT VALID so an event left at capacity 0 keeps it
+        # until it is next edited
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'events_capacity_range'"
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                "UPDATE events SET capacity = 100000 WHERE capacity > 100000;"
+            )
+            cursor.execute("""
+            ALTER TABLE events
+                DROP CONSTRAINT IF EXISTS events_capacity_check,
+                ADD CONSTRAINT events_capacity_range
+                    CHECK (capacity IS NULL OR capacity BETWEEN 1 AND 100000) NOT VALID;
+            """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS events_set_updated_at ON events;")
+        cursor.execute("""
+        CREATE TRIGGER events_set_updated_at
+            BEFORE UPDATE ON events
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        """)
+
         # Create teams table
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS teams (
@@ -91,11 +123,31 @@ def init_db():
             user_id INTEGER REFERENCES users(id),
             team_id INTEGER REFERENCES teams(id),
             event_id INTEGER REFERENCES events(id) NOT NULL,
-            registration_status VARCHAR(20) CHECK (registration_status IN ('pending', 'confirmed', 'cancelled')) DEFAULT 'pending',
+            registration_status VARCHAR(20) CHECK (registration_status IN ('pending', 'confirmed', 'cancelled', 'waitlisted')) DEFAULT 'pending',
             registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """)
 
+        # Allow the waitlisted status on databases created before it existed
+        cursor.execute("""
+        ALTER TABLE registrations
+            DROP CONSTRAINT IF EXISTS registrations_registration_status_check;
+        ALTER TABLE registrations
+            ADD CONSTRAINT registrations_registration_status_check
+            CHECK (registration_status IN ('pending', 'confirmed', 'cancelled', 'waitlisted'));
+        """)
+
+        # Create event_slots table: one pre-created row per seat of an event
+        # with a capacity, claimed by registrations with SKIP LOCKED
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_slots (
+            event_id INTEGER REFERENCES events(id) ON DELETE CASCADE NOT NULL,
+            slot_no INTEGER NOT NULL,
+            registration_id INTEGER UNIQUE REFERENCES registrations(id) ON DELETE SET NULL,
+            PRIMARY KEY (event_id, slot_no)
+        );
+        """)
+
         # Create payments table
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS payments (
@@ -145,6 +197,22 @@ def init_db():
         );
         """)
 
+        # Create event_stats table: exact per-event counters kept by triggers,
+        # split over shard rows that are summed on read
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_stats (
+            event_id INTEGER REFERENCES events(id) ON DELETE CASCADE NOT NULL,
+            shard SMALLINT NOT NULL,
+            registered INTEGER NOT NULL DEFAULT 0,
+            confirmed INTEGER NOT NULL DEFAULT 0,
+            waitlisted INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, shard)
+        );
+        """)
+
         # Create indexes for better query performance
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_events_date ON events(event_date);"
@@ -152,6 +220,16 @@ def init_db():
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_events_status ON events(status);"
         )
+        # Composite indexes backing keyset pagination on (event_date, id)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_date_id ON events(event_date, id);"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_status_date_id ON events(status, event_date, id);"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_category_date_id ON events(category, event_date, id);"
+        )
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_registrations_event ON registrations(event_id);"
         )
@@ -161,6 +239,46 @@ def init_db():
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_registrations_team ON registrations(team_id);"
         )
+        # One registration per user and per team for each event; these back
+        # the INSERT ... ON CONFLICT in create_registration. Databases filled
+        # by the old check-then-insert flow can hold duplicates, which are
+        # merged first: each group keeps its oldest active row, and payments
+        # made against the other rows move to it
+        for column in ("user_id", "team_id"):
+            index = f"uq_registrations_event_{column.split('_')[0]}"
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (index,))
+            if cursor.fetchone()[0]:
+                continue
+            duplicates = f"""
+                SELECT id, keep_id FROM (
+                    SELECT id, first_value(id) OVER (
+                        PARTITION BY event_id, {column}
+                        ORDER BY registration_status = 'cancelled', registration_date, id
+                    ) AS keep_id
+                    FROM registrations
+                    WHERE {column} IS NOT NULL
+                ) ranked
+                WHERE id <> keep_id
+            """
+            cursor.execute(f"""
+            UPDATE payments p SET registration_id = d.keep_id
+            FROM ({duplicates}) d
+            WHERE p.registration_id = d.id;
+            """)
+            cursor.execute(f"""
+            DELETE FROM registrations r
+            USING ({duplicates}) d
+            WHERE r.id = d.id;
+            """)
+            cursor.execute(
+                f"CREATE UNIQUE INDEX {index} ON registrations(event_id, {column}) WHERE {column} IS NOT NULL;"
+            )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_registrations_waitlist ON registrations(event_id, registration_date, id) WHERE registration_status = 'waitlisted';"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_event_slots_free ON event_slots(event_id, slot_no) WHERE registration_id IS NULL;"
+        )
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_team_members_user ON team_members(user_id);"
         )
@@ -174,6 +292,412 @@ def init_db():
             "CREATE INDEX IF NOT EXISTS idx_results_event ON results(event_id);"
         )
 
+        # Seat allocation: keep event_slots in step with events.capacity,
+        # hand a cancelled seat to the oldest waitlisted registration and seat
+        # a cancelled registration that is reinstated
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION sync_event_slots() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.capacity IS NULL THEN
+                -- Unlimited: drop free slots and admit the whole waitlist
+                DELETE FROM event_slots WHERE event_id = NEW.id AND registration_id IS NULL;
+                UPDATE registrations SET registration_status = 'pending'
+                WHERE event_id = NEW.id AND registration_status = 'waitlisted';
+                RETURN NULL;
+            END IF;
+
+            INSERT INTO event_slots (event_id, slot_no)
+            SELECT NEW.id, g FROM generate_series(1, NEW.capacity) AS g
+            ON CONFLICT DO NOTHING;
+            -- Shrinking never evicts a seat that is already taken
+            DELETE FROM event_slots
+            WHERE event_id = NEW.id AND slot_no > NEW.capacity AND registration_id IS NULL;
+
+            -- Seat registrations that hold no slot yet: active ones from before the
+            -- capacity was set first, then the waitlist in arrival order
+            WITH free AS (
+                SELECT slot_no, row_number() OVER (ORDER BY slot_no) AS n
+                FROM event_slots
+                WHERE event_id = NEW.id AND registration_id IS NULL
+            ),
+            waiting AS (
+                SELECT r.id, row_number() OVER (
+                    ORDER BY r.registration_status = 'waitlisted', r.registration_date, r.id
+                ) AS n
+                FROM registrations r
+                WHERE r.event_id = NEW.id
+                    AND r.registration_status IN ('pending', 'confirmed', 'waitlisted')
+                    AND NOT EXISTS (SELECT 1 FROM event_slots s WHERE s.registration_id = r.id)
+            ),
+            assigned AS (
+                UPDATE event_slots s SET registration_id = waiting.id
+                FROM free JOIN waiting USING (n)
+                WHERE s.event_id = NEW.id AND s.slot_no = free.slot_no
+                RETURNING s.registration_id
+            )
+            UPDATE registrations SET registration_status = 'pending'
+            WHERE id IN (SELECT registration_id FROM assigned)
+                AND registration_status = 'waitlisted';
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION release_event_slot() RETURNS trigger AS $$
+        DECLARE
+            freed INTEGER;
+            promoted INTEGER;
+        BEGIN
+            UPDATE event_slots SET registration_id = NULL
+            WHERE registration_id = OLD.id
+            RETURNING slot_no INTO freed;
+            IF freed IS NULL THEN
+                RETURN NULL;
+            END IF;
+
+            SELECT id INTO promoted FROM registrations
+            WHERE event_id = OLD.event_id AND registration_status = 'waitlisted'
+            ORDER BY registration_date, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED;
+            IF promoted IS NOT NULL THEN
+                UPDATE event_slots SET registration_id = promoted
+                WHERE event_id = OLD.event_id AND slot_no = freed;
+                UPDATE registrations SET registration_status = 'pending' WHERE id = promoted;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION claim_event_slot() RETURNS trigger AS $$
+        DECLARE
+            seat INTEGER;
+        BEGIN
+            IF (SELECT capacity FROM events WHERE id = NEW.event_id) IS NULL
+                OR EXISTS (SELECT 1 FROM event_slots WHERE registration_id = NEW.id) THEN
+                RETURN NEW;
+            END IF;
+
+            -- The same pick as REGISTER_SQL; with no seat free the row joins the waitlist
+            SELECT slot_no INTO seat FROM event_slots
+            WHERE event_id = NEW.event_id AND registration_id IS NULL
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED;
+            IF seat IS NULL THEN
+                NEW.registration_status := 'waitlisted';
+            ELSE
+                UPDATE event_slots SET registration_id = NEW.id
+                WHERE event_id = NEW.event_id AND slot_no = seat;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS events_sync_slots_insert ON events;")
+        cursor.execute("""
+        CREATE TRIGGER events_sync_slots_insert
+            AFTER INSERT ON events
+            FOR EACH ROW WHEN (NEW.capacity IS NOT NULL)
+            EXECUTE FUNCTION sync_event_slots();
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS events_sync_slots_update ON events;")
+        cursor.execute("""
+        CREATE TRIGGER events_sync_slots_update
+            AFTER UPDATE OF capacity ON events
+            FOR EACH ROW WHEN (OLD.capacity IS DISTINCT FROM NEW.capacity)
+            EXECUTE FUNCTION sync_event_slots();
+        """)
+        cursor.execute(
+            "DROP TRIGGER IF EXISTS registrations_release_slot ON registrations;"
+        )
+        cursor.execute("""
+        CREATE TRIGGER registrations_release_slot
+            AFTER UPDATE OF registration_status ON registrations
+            FOR EACH ROW WHEN (
+                NEW.registration_status = 'cancelled'
+                AND OLD.registration_status <> 'cancelled'
+            )
+            EXECUTE FUNCTION release_event_slot();
+        """)
+        cursor.execute(
+            "DROP TRIGGER IF EXISTS registrations_claim_slot ON registrations;"
+        )
+        cursor.execute("""
+        CREATE TRIGGER registrations_claim_slot
+            BEFORE UPDATE OF registration_status ON registrations
+            FOR EACH ROW WHEN (
+                OLD.registration_status = 'cancelled'
+                AND NEW.registration_status IN ('pending', 'confirmed')
+            )
+            EXECUTE FUNCTION claim_event_slot();
+        """)
+
+        # Event counters: triggers push deltas into event_stats, then the
+        # table is rebuilt from the source rows so it starts out exact
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_event_stats(
+            p_event_id INTEGER,
+            d_registered INTEGER,
+            d_confirmed INTEGER,
+            d_waitlisted INTEGER,
+            d_revenue NUMERIC,
+            d_rating_sum INTEGER,
+            d_rating_count INTEGER
+        ) RETURNS void AS $$
+            -- Concurrent writers land on different shard rows (by backend pid), so
+            -- a popular event does not serialize every registration on one row
+            INSERT INTO event_stats AS s (
+                event_id, shard, registered, confirmed, waitlisted,
+                revenue, rating_sum, rating_count
+            )
+            VALUES (
+                p_event_id, pg_backend_pid() % 8, d_registered, d_confirmed,
+                d_waitlisted, d_revenue, d_rating_sum, d_rating_count
+            )
+            ON CONFLICT (event_id, shard) DO UPDATE SET
+                registered = s.registered + EXCLUDED.registered,
+                confirmed = s.confirmed + EXCLUDED.confirmed,
+                waitlisted = s.waitlisted + EXCLUDED.waitlisted,
+                revenue = s.revenue + EXCLUDED.revenue,
+                rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+                rating_count = s.rating_count + EXCLUDED.rating_count;
+        $$ LANGUAGE sql;
+        """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION registrations_event_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM bump_event_stats(
+                    OLD.event_id,
+                    -(OLD.registration_status IN ('pending', 'confirmed'))::int,
+                    -(OLD.registration_status = 'confirmed')::int,
+                    -(OLD.registration_status = 'waitlisted')::int,
+                    0, 0, 0
+                );
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM bump_event_stats(
+                    NEW.event_id,
+                    (NEW.registration_status IN ('pending', 'confirmed'))::int,
+                    (NEW.registration_status = 'confirmed')::int,
+                    (NEW.registration_status = 'waitlisted')::int,
+                    0, 0, 0
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION payments_event_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_status = 'completed' THEN
+                PERFORM bump_event_stats(
+                    (SELECT event_id FROM registrations WHERE id = OLD.registration_id),
+                    0, 0, 0, -OLD.amount, 0, 0
+                );
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_status = 'completed' THEN
+                PERFORM bump_event_stats(
+                    (SELECT event_id FROM registrations WHERE id = NEW.registration_id),
+                    0, 0, 0, NEW.amount, 0, 0
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION feedback_event_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                PERFORM bump_event_stats(OLD.event_id, 0, 0, 0, 0, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                PERFORM bump_event_stats(NEW.event_id, 0, 0, 0, 0, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS registrations_event_stats_insert_delete ON registrations;")
+        cursor.execute("""
+        CREATE TRIGGER registrations_event_stats_insert_delete
+            AFTER INSERT OR DELETE ON registrations
+            FOR EACH ROW
+            EXECUTE FUNCTION registrations_event_stats();
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS registrations_event_stats_update ON registrations;")
+        cursor.execute("""
+        CREATE TRIGGER registrations_event_stats_update
+            AFTER UPDATE OF registration_status, event_id ON registrations
+            FOR EACH ROW WHEN (
+                OLD.registration_status IS DISTINCT FROM NEW.registration_status
+                OR OLD.event_id IS DISTINCT FROM NEW.event_id
+            )
+            EXECUTE FUNCTION registrations_event_stats();
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS payments_event_stats ON payments;")
+        cursor.execute("""
+        CREATE TRIGGER payments_event_stats
+            AFTER INSERT OR UPDATE OR DELETE ON payments
+            FOR EACH ROW
+            EXECUTE FUNCTION payments_event_stats();
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS feedback_event_stats ON feedback;")
+        cursor.execute("""
+        CREATE TRIGGER feedback_event_stats
+            AFTER INSERT OR UPDATE OR DELETE ON feedback
+            FOR EACH ROW
+            EXECUTE FUNCTION feedback_event_stats();
+        """)
+        cursor.execute("""
+        TRUNCATE event_stats;
+        INSERT INTO event_stats (
+            event_id, shard, registered, confirmed, waitlisted,
+            revenue, rating_sum, rating_count
+        )
+        SELECT
+            e.id,
+            0,
+            (SELECT count(*) FROM registrations r
+                WHERE r.event_id = e.id AND r.registration_status IN ('pending', 'confirmed')),
+            (SELECT count(*) FROM registrations r
+                WHERE r.event_id = e.id AND r.registration_status = 'confirmed'),
+            (SELECT count(*) FROM registrations r
+                WHERE r.event_id = e.id AND r.registration_status = 'waitlisted'),
+            (SELECT COALESCE(sum(p.amount), 0) FROM payments p
+                JOIN registrations r ON r.id = p.registration_id
+                WHERE r.event_id = e.id AND p.payment_status = 'completed'),
+            (SELECT COALESCE(sum(f.rating), 0) FROM feedback f WHERE f.event_id = e.id),
+            (SELECT count(f.rating) FROM feedback f WHERE f.event_id = e.id)
+        FROM events e;
+        """)
+
+        # Cache invalidation: row changes are broadcast on commit to the
+        # listener thread in every API worker (see invalidation.py)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+        DECLARE
+            rec JSONB;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := to_jsonb(OLD);
+            ELSE
+                rec := to_jsonb(NEW);
+            END IF;
+            PERFORM pg_notify('cache_invalidation', json_build_object(
+                'table', TG_TABLE_NAME,
+                'op', TG_OP,
+                'id', rec->'id',
+                'event_id', rec->'event_id',
+                'user_id', rec->'user_id'
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        for table, timing in (
+            # A new event cannot be cached yet, so inserts are not broadcast
+            ("events", "AFTER UPDATE OR DELETE"),
+            ("users", "AFTER UPDATE OR DELETE"),
+            ("registrations", "AFTER INSERT OR UPDATE OR DELETE"),
+            ("feedback", "AFTER INSERT OR UPDATE OR DELETE"),
+        ):
+            cursor.execute(
+                f"DROP TRIGGER IF EXISTS {table}_cache_invalidation ON {table};"
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER {table}_cache_invalidation
+                {timing} ON {table}
+                FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+            """
+            )
+
+        # Background job queue (see jobs.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            job_type VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'done', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_at TIMESTAMP,
+            locked_by VARCHAR(100),
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+        """)
+        # Partial indexes stay as small as the backlog, not the job history
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(run_at, id)
+            WHERE status = 'pending';
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at)
+            WHERE status = 'running';
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_done ON jobs(finished_at)
+            WHERE status = 'done';
+        """)
+        cursor.execute("""
+        ALTER TABLE communication_logs
+            ADD COLUMN IF NOT EXISTS status VARCHAR(20),
+            ADD COLUMN IF NOT EXISTS job_id BIGINT;
+        """)
+        # Registration notifications are enqueued with the change itself, so
+        # waitlist promotions and bulk updates are covered as well
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION enqueue_registration_notification() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO jobs (job_type, payload)
+            VALUES ('registration_status', json_build_object(
+                'registration_id', NEW.id,
+                'status', NEW.registration_status
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute(
+            "DROP TRIGGER IF EXISTS registrations_notify_insert ON registrations;"
+        )
+        cursor.execute("""
+        CREATE TRIGGER registrations_notify_insert
+            AFTER INSERT ON registrations
+            FOR EACH ROW EXECUTE FUNCTION enqueue_registration_notification();
+        """)
+        cursor.execute(
+            "DROP TRIGGER IF EXISTS registrations_notify_update ON registrations;"
+        )
+        cursor.execute("""
+        CREATE TRIGGER registrations_notify_update
+            AFTER UPDATE OF registration_status ON registrations
+            FOR EACH ROW WHEN (
+                OLD.registration_status IS DISTINCT FROM NEW.registration_status
+            )
+            EXECUTE FUNCTION enqueue_registration_notification();
+        """)
+
+        # Reporting rollups for the dashboards (see reports.py)
+        create_report_views(cursor)
+
+        # Full-text event search: BM25 with pg_search, else tsvector/GIN
+        create_search_index(cursor)
+
+        # Venue coordinates for nearby search, when PostGIS is available
+        create_location_column(cursor)
+
+        # Event embeddings for recommendations, when pgvector is available
+        create_embedding_table(cursor)
+
         # Commit the changes
         connection.commit()
         print("Database initialized successfully")
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import select
+import threading
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from db import connection_params
+
+logger = logging.getLogger(__name__)
+
+# Must match the channel used by notify_cache_invalidation() in init_db.py
+CHANNEL = "cache_invalidation"
+ENABLED = os.getenv("CACHE_INVALIDATION_ENABLED", "1").lower() in ("1", "true")
+
+# Delivered to every handler after the listener (re)connects, because any
+# notifications sent while it was disconnected are lost
+RESET = "RESET"
+
+_handlers = {}
+_listener = None
+_listener_pid = None
+_lock = threading.Lock()
+
+
+def subscribe(table, handler):
+    """
+    Register handler(payload) for row changes on table
+
+    payload is the decoded NOTIFY body: {"table", "op", "id", "event_id",
+    "user_id"}, where op is INSERT, UPDATE, DELETE or RESET.
+    """
+    _handlers.setdefault(table, []).append(handler)
+
+
+def dispatch(payload):
+    if payload.get("op") == RESET:
+        tables = list(_handlers)
+    else:
+        tables = [payload.get("table")]
+    for table in tables:
+        for handler in _handlers.get(table, ()):
+            try:
+                handler(dict(payload, table=table))
+            except Exception as e:
+                logger.exception("Cache invalidation handler error: %s", e)
+
+
+class InvalidationListener(threading.Thread):
+    """Daemon thread that LISTENs on the invalidation channel and dispatches payloads."""
+
+    def __init__(self, channel=CHANNEL, poll_timeout=5.0, max_backoff=30.0):
+        super().__init__(name="cache-invalidation-listener", daemon=True)
+        self.channel = channel
+        self.poll_timeout = poll_timeout
+        self.max_backoff = max_backoff
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _connect(self):
+        # A dedicated connection: LISTEN state must not leak into the pool
+        conn = psycopg2.connect(**connection_params())
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                backoff = 1.0
+                dispatch({"op": RESET})
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            logger.warning(
+                                "Ignoring malformed invalidation payload: %s", notify.payload
+                            )
+                            continue
+                        dispatch(payload)
+            except (psycopg2.Error, OSError) as e:
+                logger.error("Cache invalidation listener error: %s", e)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+def ensure_listener():
+    """Start the listener for the current process if it is not running.
+
+    Safe to call on every request: forked workers each get their own thread.
+    """
+    global _listener, _listener_pid
+    if not ENABLED:
+        return
+    pid = os.getpid()
+    if _listener is not None and _listener_pid == pid and _listener.is_alive():
+        return
+    with _lock:
+        if _listener is None or _listener_pid != pid or not _listener.is_alive():
+            _listener = InvalidationListener()
+            _listener_pid = pid
+            _listener.start()
+
@@ -0,0 +1,418 @@
+"""
+Durable background jobs on PostgreSQL, used for user notifications
+
+Jobs are rows in the ``jobs`` table. They are enqueued in the same transaction
+as the change that causes them: a registration trigger, or enqueue() from a
+request handler. Requests therefore never wait on delivery, and a rolled-back
+request never sends anything. Worker processes claim ready jobs in batches
+with FOR UPDATE SKIP LOCKED, so any number of them can share the queue without
+handing out a job twice. Failed jobs are retried with exponential backoff and
+given up after max_attempts. Every delivery attempt is recorded in
+communication_logs.
+
+Run workers from the server directory:
+    python jobs.py --processes 4
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+
+from psycopg2.extras import DictCursor, Json, execute_values
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "100"))
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job whose worker has not finished it within this many seconds is
+# assumed lost with its worker and handed out again
+VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+NOTIFY_SINK = os.getenv("NOTIFY_SINK", "file")
+NOTIFY_FILE = os.getenv("NOTIFY_FILE", "notifications.log")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_SENDER = os.getenv("SMTP_SENDER", "no-reply@sports-events.local")
+
+
+def enqueue(cur, job_type, payload, max_attempts=5, delay=0):
+    """
+    Add a job on the caller's cursor; it becomes visible when the caller commits
+
+    Args:
+        cur: cursor of the transaction the job belongs to
+        job_type (str): key of HANDLERS
+        payload (dict): JSON-serializable job arguments
+        max_attempts (int): attempts before the job is marked failed
+        delay (float): seconds before the job may run
+    """
+    cur.execute(
+        """
+        INSERT INTO jobs (job_type, payload, max_attempts, run_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * interval '1 second')
+    """,
+        (job_type, Json(payload), max_attempts, delay),
+    )
+
+
+# Handlers turn a batch of jobs into messages with one query per batch.
+# Each returns {job id: message dict, or None when there is nothing to send}.
+# A job missing from the result failed and will be retried.
+def _registration_messages(cur, jobs):
+    ids = [job["payload"]["registration_id"] for job in jobs]
+    cur.execute(
+        """
+        SELECT r.id, u.id AS user_id, u.name, u.email, e.name AS event_name, e.event_date
+        FROM registrations r
+        JOIN events e ON e.id = r.event_id
+        LEFT JOIN users u ON u.id = r.user_id
+        WHERE r.id = ANY(%s)
+    """,
+        (ids,),
+    )
+    rows = {row["id"]: row for row in cur.fetchall()}
+    messages = {}
+    for job in jobs:
+        row = rows.get(job["payload"]["registration_id"])
+        if row is None or row["user_id"] is None:
+            # Deleted since, or a team registration without a contact user
+            messages[job["id"]] = None
+            continue
+        status = job["payload"]["status"]
+        messages[job["id"]] = {
+            "user_id": row["user_id"],
+            "to": row["email"],
+            "message_type": f"registration_{status}",
+            "subject": f"{row['event_name']}: registration {status}",
+            "body": (
+                f"Hi {row['name']},\n\nYour registration for {row['event_name']} "
+                f"on {row['event_date']:%d %b %Y} is now {status}.\n"
+            ),
+        }
+    return messages
+
+
+def _welcome_messages(cur, jobs):
+    cur.execute(
+        "SELECT id, name, email FROM users WHERE id = ANY(%s)",
+        ([job["payload"]["user_id"] for job in jobs],),
+    )
+    users = {row["id"]: row for row in cur.fetchall()}
+    messages = {}
+    for job in jobs:
+        user = users.get(job["payload"]["user_id"])
+        messages[job["id"]] = user and {
+            "user_id": user["id"],
+            "to": user["email"],
+            "message_type": "welcome",
+            "subject": "Welcome to Sports Events",
+            "body": f"Hi {user['name']},\n\nYour account is ready.\n",
+        }
+    return messages
+
+
+HANDLERS = {
+    "registration_status": _registration_messages,
+    "welcome": _welcome_messages,
+}
+
+
+class FileSink:
+    """Appends each message as a JSON line; the default for development."""
+
+    def __init__(self, path=NOTIFY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, messages):
+        with self._lock, open(self.path, "a", encoding="utf-8") as handle:
+            for message in messages:
+                handle.write(json.dumps(message) + "\n")
+        return [None] * len(messages)
+
+
+class SmtpSink:
+    """Sends over SMTP, e.g. to a local MailHog or smtp4dev, one connection per batch."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, sender=SMTP_SENDER):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def deliver(self, messages):
+        errors = []
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    errors.append(None)
+                except smtplib.SMTPException as e:
+                    errors.append(e)
+        return errors
+
+
+def get_sink():
+    return SmtpSink() if NOTIFY_SINK == "smtp" else FileSink()
+
+
+CLAIM_SQL = """
+    UPDATE jobs SET
+        status = 'running',
+        attempts = attempts + 1,
+        locked_at = CURRENT_TIMESTAMP,
+        locked_by = %(worker)s
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE status = 'pending' AND run_at <= CURRENT_TIMESTAMP
+        ORDER BY run_at, id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, job_type, payload, attempts, max_attempts
+"""
+
+# Jobs whose worker died mid-batch on their last attempt are failed, so a job
+# that crashes or hangs every worker claiming it is not handed out forever
+FAIL_LOST_SQL = """
+    UPDATE jobs SET
+        status = 'failed',
+        last_error = 'worker lost',
+        finished_at = CURRENT_TIMESTAMP,
+        locked_at = NULL,
+        locked_by = NULL
+    WHERE status = 'running'
+        AND locked_at < CURRENT_TIMESTAMP - %s * interval '1 second'
+        AND attempts >= max_attempts
+"""
+
+# The other jobs whose worker died mid-batch go back to pending
+REQUEUE_SQL = """
+    UPDATE jobs SET status = 'pending', locked_at = NULL, locked_by = NULL
+    WHERE status = 'running'
+        AND locked_at < CURRENT_TIMESTAMP - %s * interval '1 second'
+"""
+
+PURGE_SQL = """
+    DELETE FROM jobs
+    WHERE status = 'done' AND finished_at < CURRENT_TIMESTAMP - %s * interval '1 day'
+"""
+
+
+class Worker:
+    def __init__(self, sink=None, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.sink = sink or get_sink()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def claim(self, connection):
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(CLAIM_SQL, {"worker": self.name, "limit": self.batch_size})
+            jobs = [dict(row) for row in cur.fetchall()]
+        # Commit the claim right away so the rows are not locked while sending
+        connection.commit()
+        return jobs
+
+    def process(self, connection, jobs):
+        """Deliver a claimed batch and record the outcome of every job."""
+        outcomes = {}
+        messages = {}
+        by_type = {}
+        for job in jobs:
+            by_type.setdefault(job["job_type"], []).append(job)
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            for job_type, batch in by_type.items():
+                handler = HANDLERS.get(job_type)
+                if handler is None:
+                    for job in batch:
+                        outcomes[job["id"]] = f"unknown job type {job_type}"
+                    continue
+                try:
+                    rendered = handler(cur, batch)
+                except Exception as e:
+                    connection.rollback()
+                    rendered = {}
+                    error = str(e)
+                else:
+                    error = "message could not be rendered"
+                for job in batch:
+                    if job["id"] not in rendered:
+                        outcomes[job["id"]] = error
+                    elif rendered[job["id"]] is None:
+                        outcomes[job["id"]] = None
+                    else:
+                        messages[job["id"]] = rendered[job["id"]]
+        connection.rollback()
+
+        if messages:
+            ids = list(messages)
+            try:
+                errors = self.sink.deliver([messages[job_id] for job_id in ids])
+            except Exception as e:
+                errors = [e] * len(ids)
+            for job_id, error in zip(ids, errors):
+                outcomes[job_id] = None if error is None else str(error)
+
+        self.finish(connection, jobs, outcomes, messages)
+        return outcomes
+
+    def finish(self, connection, jobs, outcomes, messages):
+        done = []
+        retry = []
+        logs = []
+        for job in jobs:
+            error = outcomes[job["id"]]
+            message = messages.get(job["id"])
+            if error is None:
+                done.append(job["id"])
+                status = "sent" if message else "skipped"
+            elif job["attempts"] >= job["max_attempts"]:
+                retry.append((job["id"], "failed", error))
+                status = "failed"
+            else:
+                retry.append((job["id"], "pending", error))
+                status = "retrying"
+            if message:
+                logs.append(
+                    (message["user_id"], message["message_type"],
+                     f"{message['subject']}\n\n{message['body']}", status, job["id"])
+                )
+
+        with connection.cursor() as cur:
+            if done:
+                cur.execute(
+                    """
+                    UPDATE jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP,
+                        locked_at = NULL, last_error = NULL
+                    WHERE id = ANY(%s) AND locked_by = %s
+                """,
+                    (done, self.name),
+                )
+            if retry:
+                # Exponential backoff with jitter so failed batches spread out
+                execute_values(
+                    cur,
+                    """
+                    UPDATE jobs SET
+                        status = r.status,
+                        last_error = r.error,
+                        locked_at = NULL,
+                        finished_at = CASE WHEN r.status = 'failed'
+                            THEN CURRENT_TIMESTAMP END,
+                        run_at = CURRENT_TIMESTAMP + least(
+                            r.base * power(2, jobs.attempts - 1), r.cap
+                        ) * (0.5 + random() / 2) * interval '1 second'
+                    FROM (VALUES %s) AS r (id, status, error, base, cap, worker)
+                    WHERE jobs.id = r.id AND jobs.locked_by = r.worker
+                """,
+                    [
+                        (job_id, status, error, BACKOFF_BASE, BACKOFF_MAX, self.name)
+                        for job_id, status, error in retry
+                    ],
+                    template="(%s, %s, %s, %s::float8, %s::float8, %s)",
+                )
+            if logs:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO communication_logs
+                        (user_id, message_type, message_content, status, job_id)
+                    VALUES %s
+                """,
+                    logs,
+                )
+        connection.commit()
+
+    def maintain(self, connection):
+        with connection.cursor() as cur:
+            cur.execute(FAIL_LOST_SQL, (VISIBILITY_TIMEOUT,))
+            cur.execute(REQUEUE_SQL, (VISIBILITY_TIMEOUT,))
+            cur.execute(PURGE_SQL, (RETENTION_DAYS,))
+        connection.commit()
+
+    def run_once(self):
+        """Claim and process one batch; returns the number of jobs handled."""
+        connection = get_db_connection()
+        if connection is None:
+            return 0
+        try:
+            jobs = self.claim(connection)
+            if jobs:
+                self.process(connection, jobs)
+            return len(jobs)
+        except Exception as e:
+            connection.rollback()
+            logger.exception("Error processing jobs: %s", e)
+            return 0
+        finally:
+            connection.close()
+
+    def run(self):
+        last_maintenance = 0.0
+        while not self._stop_event.is_set():
+            if time.monotonic() - last_maintenance > VISIBILITY_TIMEOUT / 10:
+                connection = get_db_connection()
+                if connection is not None:
+                    try:
+                        self.maintain(connection)
+                    except Exception as e:
+                        connection.rollback()
+                        logger.exception("Error maintaining job queue: %s", e)
+                    finally:
+                        connection.close()
+                last_maintenance = time.monotonic()
+            # Keep draining while batches come back full
+            if self.run_once() < self.batch_size:
+                self._stop_event.wait(self.poll_interval * random.uniform(0.5, 1.5))
+
+
+def _run_worker():
+    Worker().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run notification job workers")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _run_worker()
+        return
+    processes = [
+        multiprocessing.Process(target=_run_worker, name=f"job-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor string."""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor (str): Opaque cursor from a previous page
+        size (int): Number of sort key values the cursor must hold
+
+    Returns:
+        list of sort key values
+
+    Raises:
+        ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_limit(raw, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if raw is None or raw == "":
+        return default
+    try:
+        limit = int(raw)
+    except ValueError as e:
+        raise ValueError("limit must be an integer") from e
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
@@ -0,0 +1,296 @@
+"""
+Event recommendations from pgvector similarity
+
+Each event is embedded offline by hashing its category, venue and text
+n-grams into a fixed-size vector, so no model or network access is needed.
+A participant's profile is the mean embedding of the events they registered
+for, and recommendations are the nearest open events to that profile through
+a partial HNSW index. A background thread in each worker embeds new and
+changed events in batches; run ``python recommendations.py`` to embed
+everything at once instead.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+
+import psycopg2
+from psycopg2.extras import DictCursor, execute_values
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 256
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "500"))
+INTERVAL = float(os.getenv("EMBEDDING_INTERVAL", "60"))
+ENABLED = os.getenv("EMBEDDINGS_ENABLED", "1").lower() in ("1", "true")
+MAX_RECOMMENDATIONS = 50
+
+# Arbitrary application-wide key for pg_try_advisory_xact_lock
+_EMBED_LOCK_KEY = 74_110_002
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class RecommendationsUnavailable(Exception):
+    """Raised when the vector extension is not installed."""
+
+
+def create_embedding_table(cursor):
+    """Create event_embeddings and its HNSW index if pgvector can be enabled."""
+    cursor.execute("SAVEPOINT embeddings_vector;")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT embeddings_vector;")
+        logger.warning("pgvector unavailable, recommendations disabled: %s", e)
+        return False
+    cursor.execute("RELEASE SAVEPOINT embeddings_vector;")
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS event_embeddings (
+        event_id INTEGER PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+        embedding vector({EMBEDDING_DIM}) NOT NULL,
+        active BOOLEAN NOT NULL,
+        source_updated_at TIMESTAMP NOT NULL
+    );
+    """)
+    # Only events still open for registration are candidates, so the index
+    # stays small however long the event history grows
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_event_embeddings_active ON event_embeddings
+        USING hnsw (embedding vector_cosine_ops) WHERE active;
+    """)
+    return True
+
+
+def _features(event):
+    """Yield (feature, weight) pairs for an event row."""
+    yield f"category={(event['category'] or '').strip().lower()}", 3.0
+    yield f"venue={(event['venue'] or '').strip().lower()}", 1.5
+    words = _WORD.findall(f"{event['name'] or ''} {event['description'] or ''}".lower())
+    for word in words:
+        yield f"w:{word}", 1.0
+        padded = f"^{word}$"
+        for i in range(len(padded) - 2):
+            yield f"c:{padded[i:i + 3]}", 0.25
+    for first, second in zip(words, words[1:]):
+        yield f"b:{first} {second}", 0.5
+
+
+def embed_event(event):
+    """
+    Embed an event row (name, category, venue, description) as a unit vector
+
+    Features are hashed into EMBEDDING_DIM buckets with a hash-derived sign,
+    so collisions cancel out on average instead of piling up.
+    """
+    vector = [0.0] * EMBEDDING_DIM
+    for feature, weight in _features(event):
+        digest = int.from_bytes(
+            hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+        )
+        sign = 1.0 if digest >> 63 else -1.0
+        vector[digest % EMBEDDING_DIM] += sign * weight
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return "[" + ",".join(f"{value / norm:.6g}" for value in vector) + "]"
+
+
+def embed_pending(connection, batch_size=BATCH_SIZE, wait=False):
+    """
+    Embed events that are new or changed since their last embedding
+
+    Each batch is its own transaction; an advisory lock keeps workers from
+    embedding the same rows twice. Also retires events whose registration
+    has closed from the candidate index.
+
+    Returns:
+        Number of events embedded, or None if another worker held the lock
+    """
+    embedded = 0
+    with connection.cursor(cursor_factory=DictCursor) as cur:
+        while True:
+            if wait:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (_EMBED_LOCK_KEY,))
+            else:
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_EMBED_LOCK_KEY,))
+                if not cur.fetchone()[0]:
+                    connection.rollback()
+                    return None
+            cur.execute(
+                """
+                SELECT e.id, e.name, e.category, e.venue, e.description, e.updated_at,
+                    e.status = 'upcoming' AND e.registration_deadline >= CURRENT_DATE
+                        AS active
+                FROM events e
+                LEFT JOIN event_embeddings x ON x.event_id = e.id
+                WHERE x.event_id IS NULL OR x.source_updated_at < e.updated_at
+                ORDER BY e.id
+                LIMIT %s
+            """,
+                (batch_size,),
+            )
+            events = cur.fetchall()
+            if not events:
+                break
+            execute_values(
+                cur,
+                """
+                INSERT INTO event_embeddings (event_id, embedding, active, source_updated_at)
+                VALUES %s
+                ON CONFLICT (event_id) DO UPDATE SET
+                    embedding = EXCLUDED.embedding,
+                    active = EXCLUDED.active,
+                    source_updated_at = EXCLUDED.source_updated_at
+            """,
+                [
+                    (event["id"], embed_event(event), event["active"], event["updated_at"])
+                    for event in events
+                ],
+                template="(%s, %s::vector, %s, %s)",
+                page_size=batch_size,
+            )
+            connection.commit()
+            embedded += len(events)
+
+        cur.execute("""
+            UPDATE event_embeddings x SET active = false
+            FROM events e
+            WHERE e.id = x.event_id AND x.active
+                AND NOT (e.status = 'upcoming' AND e.registration_deadline >= CURRENT_DATE)
+        """)
+    connection.commit()
+    return embedded
+
+
+def recommend(connection, user_id, limit=MAX_RECOMMENDATIONS):
+    """
+    Return up to limit open events the user has not registered for, most similar first
+
+    Users without registrations get the soonest open events instead, with a
+    null similarity.
+    """
+    with connection.cursor(cursor_factory=DictCursor) as cur:
+        cur.execute("SELECT to_regclass('event_embeddings') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            raise RecommendationsUnavailable("Recommendations are not available")
+
+        cur.execute(
+            """
+            SELECT avg(x.embedding)::text FROM registrations r
+            JOIN event_embeddings x ON x.event_id = r.event_id
+            WHERE r.user_id = %s AND r.registration_status <> 'cancelled'
+        """,
+            (user_id,),
+        )
+        profile = cur.fetchone()[0]
+
+        if profile is None:
+            cur.execute(
+                """
+                SELECT e.*, u.name as organizer_name, NULL::float8 AS similarity
+                FROM events e
+                LEFT JOIN users u ON e.organizer_id = u.id
+                WHERE e.status = 'upcoming' AND e.registration_deadline >= CURRENT_DATE
+                ORDER BY e.event_date, e.id
+                LIMIT %s
+            """,
+                (limit,),
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+        # The index only returns ef_search neighbours; over-fetch so that
+        # dropping events the user already joined still leaves a full page
+        candidates = min(1000, max(100, limit * 4))
+        cur.execute(f"SET LOCAL hnsw.ef_search = {candidates}")
+        cur.execute(
+            """
+            WITH candidates AS (
+                SELECT x.event_id, x.embedding <=> %(profile)s::vector AS distance
+                FROM event_embeddings x
+                WHERE x.active
+                ORDER BY x.embedding <=> %(profile)s::vector
+                LIMIT %(candidates)s
+            )
+            SELECT e.*, u.name as organizer_name, 1 - c.distance AS similarity
+            FROM candidates c
+            JOIN events e ON e.id = c.event_id
+            LEFT JOIN users u ON e.organizer_id = u.id
+            WHERE e.status = 'upcoming' AND e.registration_deadline >= CURRENT_DATE
+                AND NOT EXISTS (
+                    SELECT 1 FROM registrations r
+                    WHERE r.event_id = e.id AND r.user_id = %(user_id)s
+                )
+            ORDER BY c.distance, e.id
+            LIMIT %(limit)s
+        """,
+            {
+                "profile": profile,
+                "candidates": candidates,
+                "user_id": user_id,
+                "limit": limit,
+            },
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+
+class EmbeddingWorker(threading.Thread):
+    def __init__(self, interval=INTERVAL):
+        super().__init__(name="event-embedder", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            connection = get_db_connection()
+            if connection is None:
+                continue
+            try:
+                with connection.cursor() as cur:
+                    cur.execute("SELECT to_regclass('event_embeddings') IS NOT NULL")
+                    installed = cur.fetchone()[0]
+                connection.rollback()
+                if not installed:
+                    return
+                embed_pending(connection)
+            except Exception as e:
+                connection.rollback()
+                logger.exception("Error embedding events: %s", e)
+            finally:
+                connection.close()
+
+
+_worker = None
+_worker_pid = None
+_lock = threading.Lock()
+
+
+def ensure_embedder():
+    """Start the background embedder for the current process if it is not running."""
+    global _worker, _worker_pid
+    if not ENABLED:
+        return
+    pid = os.getpid()
+    if _worker is not None and _worker_pid == pid:
+        return
+    with _lock:
+        if _worker is None or _worker_pid != pid:
+            _worker = EmbeddingWorker()
+            _worker_pid = pid
+            _worker.start()
+
+
+if __name__ == "__main__":
+    connection = get_db_connection()
+    if connection is None:
+        raise SystemExit("Unable to connect to the database")
+    try:
+        print(f"Embedded {embed_pending(connection, wait=True)} events")
+    finally:
+        connection.close()
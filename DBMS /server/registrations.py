@@ -0,0 +1,238 @@
+from psycopg2.extras import DictCursor
+
+# Every seat is a pre-created row of event_slots, so capacity is bounded; the
+# events_capacity_range constraint enforces the same range
+MAX_CAPACITY = 100_000
+
+
+def parse_capacity(value):
+    """
+    Return an event capacity from a payload value; None means unlimited
+
+    Raises ValueError unless it is an integer from 1 to MAX_CAPACITY.
+    """
+    if value is None:
+        return None
+    message = f"capacity must be an integer between 1 and {MAX_CAPACITY}"
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(message)
+    try:
+        capacity = int(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(message) from e
+    if not 1 <= capacity <= MAX_CAPACITY:
+        raise ValueError(message)
+    return capacity
+
+# Deadline check, duplicate checks, seat allocation and INSERT in a single
+# statement. Direct duplicates are rejected by the partial unique indexes on
+# (event_id, user_id) and (event_id, team_id), so concurrent submits cannot
+# both succeed. For events with a capacity, a free row of event_slots is
+# claimed with SKIP LOCKED, so concurrent registrations for one hot event take
+# different slots instead of queueing on a counter row. When no slot is free
+# the registration is waitlisted; the release_event_slot() trigger promotes it
+# when a seat is cancelled. A member's own registration and their team's
+# exclude each other through the NOT EXISTS check, which LOCK_TEAMS_SQL
+# serializes.
+REGISTER_SQL = """
+    WITH open_event AS (
+        SELECT id, capacity FROM events
+        WHERE id = %(event_id)s AND registration_deadline >= CURRENT_DATE
+    ),
+    free_slot AS (
+        SELECT s.event_id, s.slot_no FROM event_slots s
+        WHERE s.event_id = %(event_id)s AND s.registration_id IS NULL
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ),
+    inserted AS (
+        INSERT INTO registrations (
+            user_id, event_id, team_id, registration_status
+        )
+        SELECT
+            %(user_id)s,
+            open_event.id,
+            %(team_id)s,
+            CASE
+                WHEN open_event.capacity IS NULL THEN 'pending'
+                WHEN EXISTS (SELECT 1 FROM free_slot) THEN 'pending'
+                ELSE 'waitlisted'
+            END
+        FROM open_event
+        WHERE NOT EXISTS (
+            -- A team the user belongs to is already registered
+            SELECT 1 FROM registrations r
+            JOIN team_members tm ON tm.team_id = r.team_id
+            WHERE r.event_id = %(event_id)s AND tm.user_id = %(user_id)s
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING *
+    ),
+    claimed AS (
+        UPDATE event_slots s SET registration_id = inserted.id
+        FROM free_slot, inserted
+        WHERE s.event_id = free_slot.event_id
+            AND s.slot_no = free_slot.slot_no
+            AND inserted.registration_status = 'pending'
+        RETURNING s.slot_no
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM open_event) AS event_open,
+        inserted.*,
+        (SELECT slot_no FROM claimed) AS slot_no
+    FROM (SELECT 1) AS one
+    LEFT JOIN inserted ON true
+"""
+
+
+# No index can say "not registered both alone and through a team", so the
+# check in REGISTER_SQL could race. Every team involved (the registering
+# user's and the one registered with) is locked for the event first, in team
+# order, in a statement of its own: REGISTER_SQL then takes its snapshot after
+# a concurrent registration through the same team has committed. Users in no
+# team take no lock. The two-integer advisory key space is used only here.
+LOCK_TEAMS_SQL = """
+    SELECT pg_advisory_xact_lock(%(event_id)s, team_id)
+    FROM (
+        SELECT team_id FROM team_members WHERE user_id = %(user_id)s
+        UNION
+        SELECT %(team_id)s::integer WHERE %(team_id)s IS NOT NULL
+        ORDER BY team_id
+    ) teams
+"""
+
+
+def register_for_event(connection, event_id, user_id, team_id=None):
+    """
+    Register a user (optionally with a team) for an event and commit
+
+    Returns:
+        (outcome, registration) where outcome is "created", "closed" (event
+        missing or past its deadline) or "conflict" (already registered), and
+        registration is the new row as a dict for "created", else None
+    """
+    params = {"event_id": event_id, "user_id": user_id, "team_id": team_id}
+    with connection.cursor(cursor_factory=DictCursor) as cur:
+        cur.execute(LOCK_TEAMS_SQL, params)
+        cur.execute(REGISTER_SQL, params)
+        result = dict(cur.fetchone())
+    connection.commit()
+
+    if not result.pop("event_open"):
+        return "closed", None
+    if result["id"] is None:
+        return "conflict", None
+    return "created", result
+
+
+# Statuses an organizer may set directly. Waitlisted registrations only move
+# up through seat allocation, so apart from cancelling they are left alone.
+# Reinstating a cancelled registration claims a seat through the
+# claim_event_slot() trigger, which waitlists it instead when none is free.
+SETTABLE_STATUSES = ("pending", "confirmed", "cancelled")
+
+# One statement for a whole batch: lock the requested rows in id order (so
+# concurrent batches cannot deadlock), update the ones the caller may change,
+# and report an outcome for every requested id. Ownership is checked against
+# events.organizer_id here rather than in Python.
+BULK_STATUS_SQL = """
+    WITH requested AS (
+        {requested}
+    ),
+    locked AS (
+        SELECT
+            r.id,
+            r.registration_status,
+            %(is_admin)s OR e.organizer_id IS NOT DISTINCT FROM %(user_id)s AS allowed
+        FROM registrations r
+        JOIN events e ON e.id = r.event_id
+        WHERE r.id IN (SELECT id FROM requested)
+        ORDER BY r.id
+        FOR UPDATE OF r
+    ),
+    updated AS (
+        UPDATE registrations r SET registration_status = %(status)s
+        FROM locked l
+        WHERE r.id = l.id
+            AND l.allowed
+            AND l.registration_status <> %(status)s
+            AND (l.registration_status <> 'waitlisted' OR %(status)s = 'cancelled')
+        RETURNING r.id, r.registration_status
+    )
+    SELECT
+        q.id,
+        CASE
+            WHEN l.id IS NULL THEN 'not_found'
+            WHEN NOT l.allowed THEN 'forbidden'
+            WHEN u.registration_status = 'waitlisted' THEN 'waitlisted'
+            WHEN u.id IS NOT NULL THEN 'updated'
+            WHEN l.registration_status = %(status)s THEN 'unchanged'
+            ELSE 'waitlisted'
+        END AS outcome
+    FROM requested q
+    LEFT JOIN locked l ON l.id = q.id
+    LEFT JOIN updated u ON u.id = q.id
+    ORDER BY q.id
+"""
+
+
+def _status_params(principal, status):
+    return {
+        "status": status,
+        "user_id": principal["id"],
+        "is_admin": principal["role"] == "admin",
+    }
+
+
+def bulk_update_status(connection, principal, status, ids=None, event_id=None, from_status=None):
+    """
+    Set the status of many registrations in one statement and commit
+
+    Either ids, or event_id (optionally narrowed to registrations currently in
+    from_status), selects the registrations. Non-admins can only change
+    registrations for events they organize; the rest are reported, not
+    raised, so one bad id does not fail the batch.
+
+    Returns:
+        list of {"id", "outcome"} where outcome is "updated", "unchanged",
+        "not_found", "forbidden" or "waitlisted" (left waitlisted, or
+        reinstated from cancelled with no seat free)
+    """
+    params = _status_params(principal, status)
+    if ids is not None:
+        requested = "SELECT DISTINCT unnest(%(ids)s::integer[]) AS id"
+        params["ids"] = list(ids)
+    else:
+        requested = "SELECT id FROM registrations WHERE event_id = %(event_id)s"
+        params["event_id"] = event_id
+        if from_status is not None:
+            requested += " AND registration_status = %(from_status)s"
+            params["from_status"] = from_status
+
+    with connection.cursor(cursor_factory=DictCursor) as cur:
+        cur.execute(BULK_STATUS_SQL.format(requested=requested), params)
+        results = [dict(row) for row in cur.fetchall()]
+    connection.commit()
+    return results
+
+
+def update_status(connection, principal, registration_id, status):
+    """
+    Set the status of one registration under the bulk rules and commit
+
+    Returns:
+        (outcome, registration) with outcome as for bulk_update_status, and
+        registration the row as it now stands, or None when the outcome is
+        "not_found" or "forbidden"
+    """
+    params = _status_params(principal, status)
+    params["id"] = registration_id
+    with connection.cursor(cursor_factory=DictCursor) as cur:
+        cur.execute(BULK_STATUS_SQL.format(requested="SELECT %(id)s::integer AS id"), params)
+        outcome = cur.fetchone()["outcome"]
+        registration = None
+        if outcome not in ("not_found", "forbidden"):
+            cur.execute("SELECT * FROM registrations WHERE id = %s", (registration_id,))
+            registration = dict(cur.fetchone())
+    connection.commit()
+    return outcome, registration
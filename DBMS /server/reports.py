@@ -0,0 +1,213 @@
+"""
+Reporting rollups served to the admin and organizer dashboards
+
+Every report is a materialized view with a unique index, so it can be
+refreshed CONCURRENTLY without blocking readers. A background thread in each
+worker refreshes them every REPORTS_REFRESH_INTERVAL seconds; an advisory
+lock makes sure only one worker does the work per round. Run
+``python reports.py`` to refresh from cron instead.
+"""
+
+import logging
+import os
+import threading
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("REPORTS_REFRESH_INTERVAL", "300"))
+ENABLED = os.getenv("REPORTS_REFRESH_ENABLED", "1").lower() in ("1", "true")
+
+# Arbitrary application-wide key for pg_try_advisory_xact_lock
+_REFRESH_LOCK_KEY = 74_110_001
+
+REPORT_VIEWS = {
+    "mv_platform_overview": """
+        SELECT
+            1 AS id,
+            (SELECT count(*) FROM users) AS total_users,
+            (SELECT count(*) FROM events) AS total_events,
+            (SELECT count(*) FROM teams) AS total_teams,
+            (SELECT COALESCE(sum(amount), 0) FROM payments
+                WHERE payment_status = 'completed') AS total_revenue,
+            (SELECT count(*) FROM registrations
+                WHERE registration_status = 'pending') AS pending_registrations
+    """,
+    "mv_event_registration_stats": """
+        SELECT
+            e.id AS event_id,
+            e.name AS event_name,
+            e.category,
+            e.organizer_id,
+            count(r.id) AS total,
+            count(r.id) FILTER (WHERE r.registration_status = 'pending') AS pending,
+            count(r.id) FILTER (WHERE r.registration_status = 'confirmed') AS confirmed,
+            count(r.id) FILTER (WHERE r.registration_status = 'cancelled') AS cancelled,
+            count(r.id) FILTER (WHERE r.registration_status = 'waitlisted') AS waitlisted
+        FROM events e
+        LEFT JOIN registrations r ON r.event_id = e.id
+        GROUP BY e.id
+    """,
+    "mv_event_revenue_daily": """
+        SELECT
+            r.event_id,
+            e.organizer_id,
+            COALESCE(p.payment_date, p.created_at)::date AS day,
+            count(*) AS payments,
+            COALESCE(sum(p.amount) FILTER (WHERE p.payment_status = 'completed'), 0) AS revenue,
+            COALESCE(sum(p.amount) FILTER (WHERE p.payment_status = 'refunded'), 0) AS refunded
+        FROM payments p
+        JOIN registrations r ON r.id = p.registration_id
+        JOIN events e ON e.id = r.event_id
+        WHERE COALESCE(p.payment_date, p.created_at) IS NOT NULL
+        GROUP BY r.event_id, e.organizer_id, COALESCE(p.payment_date, p.created_at)::date
+    """,
+    "mv_team_participation": """
+        SELECT
+            t.event_id,
+            e.name AS event_name,
+            e.organizer_id,
+            count(DISTINCT t.id) AS teams,
+            count(tm.user_id) AS members
+        FROM teams t
+        JOIN events e ON e.id = t.event_id
+        LEFT JOIN team_members tm ON tm.team_id = t.id
+        GROUP BY t.event_id, e.name, e.organizer_id
+    """,
+    "mv_event_feedback": """
+        SELECT
+            f.event_id,
+            e.name AS event_name,
+            e.organizer_id,
+            count(*) AS responses,
+            round(avg(f.rating), 2) AS avg_rating,
+            count(*) FILTER (WHERE f.rating = 1) AS rating_1,
+            count(*) FILTER (WHERE f.rating = 2) AS rating_2,
+            count(*) FILTER (WHERE f.rating = 3) AS rating_3,
+            count(*) FILTER (WHERE f.rating = 4) AS rating_4,
+            count(*) FILTER (WHERE f.rating = 5) AS rating_5
+        FROM feedback f
+        JOIN events e ON e.id = f.event_id
+        GROUP BY f.event_id, e.name, e.organizer_id
+    """,
+}
+
+# Unique index columns per view; required by REFRESH ... CONCURRENTLY
+REPORT_KEYS = {
+    "mv_platform_overview": "id",
+    "mv_event_registration_stats": "event_id",
+    "mv_event_revenue_daily": "event_id, day",
+    "mv_team_participation": "event_id",
+    "mv_event_feedback": "event_id",
+}
+
+
+def create_report_views(cursor):
+    """Create the reporting views and their bookkeeping table if missing."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS report_refreshes (
+        view_name VARCHAR(100) PRIMARY KEY,
+        refreshed_at TIMESTAMP NOT NULL
+    );
+    """)
+    for name, query in REPORT_VIEWS.items():
+        cursor.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {query};")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{name} ON {name}({REPORT_KEYS[name]});"
+        )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mv_event_registration_stats_organizer "
+        "ON mv_event_registration_stats(organizer_id);"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mv_event_revenue_daily_organizer "
+        "ON mv_event_revenue_daily(organizer_id, day);"
+    )
+
+
+def refresh_report_views(wait=False):
+    """
+    Refresh every reporting view in one transaction
+
+    Args:
+        wait (bool): Block until another refresher finishes instead of skipping
+
+    Returns:
+        True if this call refreshed the views, False if another worker held
+        the refresh lock or the database was unreachable
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return False
+
+    try:
+        with connection.cursor() as cur:
+            if wait:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (_REFRESH_LOCK_KEY,))
+            else:
+                cur.execute(
+                    "SELECT pg_try_advisory_xact_lock(%s)", (_REFRESH_LOCK_KEY,)
+                )
+                if not cur.fetchone()[0]:
+                    connection.rollback()
+                    return False
+            for name in REPORT_VIEWS:
+                cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name};")
+                cur.execute(
+                    """
+                    INSERT INTO report_refreshes (view_name, refreshed_at)
+                    VALUES (%s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+                """,
+                    (name,),
+                )
+        connection.commit()
+        return True
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Error refreshing report views: %s", e)
+        return False
+    finally:
+        connection.close()
+
+
+class ReportRefresher(threading.Thread):
+    def __init__(self, interval=REFRESH_INTERVAL):
+        super().__init__(name="report-refresher", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            refresh_report_views()
+
+
+_refresher = None
+_refresher_pid = None
+_lock = threading.Lock()
+
+
+def ensure_refresher():
+    """Start the periodic refresher for the current process if it is not running."""
+    global _refresher, _refresher_pid
+    if not ENABLED:
+        return
+    pid = os.getpid()
+    if _refresher is not None and _refresher_pid == pid and _refresher.is_alive():
+        return
+    with _lock:
+        if _refresher is None or _refresher_pid != pid or not _refresher.is_alive():
+            _refresher = ReportRefresher()
+            _refresher_pid = pid
+            _refresher.start()
+
+
+if __name__ == "__main__":
+    if refresh_report_views(wait=True):
+        print("Report views refreshed")
+    else:
+        print("Unable to refresh report views")
@@ -0,0 +1,205 @@
+"""
+Full-text event search
+
+With the ParadeDB pg_search extension installed, events get a BM25 index and
+queries are scored with BM25 and matched fuzzily, so small typos still hit.
+Without it, a GIN index over a weighted tsvector expression is used instead,
+ranked with ts_rank_cd, with pg_trgm similarity on the event name for typos
+when that extension is available. Highlights come from ts_headline in both
+cases and are only computed for the rows on the returned page.
+"""
+
+import logging
+import threading
+
+import psycopg2
+
+from pagination import decode_cursor, encode_cursor, parse_limit
+
+logger = logging.getLogger(__name__)
+
+BM25 = "bm25"
+TSVECTOR = "tsvector"
+
+SEARCH_FIELDS = ("name", "description", "venue", "category")
+
+# Weighted document for the fallback; the queries must repeat this expression
+# exactly for the planner to use idx_events_search
+SEARCH_DOCUMENT = """(
+    setweight(to_tsvector('english', coalesce(e.name, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(e.category, '')), 'B')
+    || setweight(to_tsvector('english', coalesce(e.venue, '')), 'B')
+    || setweight(to_tsvector('english', coalesce(e.description, '')), 'C')
+)"""
+
+HIGHLIGHT_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+_backend = None
+_trigram = False
+_lock = threading.Lock()
+
+
+class SearchUnavailable(Exception):
+    """Raised when no search index has been installed."""
+
+
+def create_search_index(cursor):
+    """Create the BM25 index if pg_search is installed, else the tsvector fallback."""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_search')")
+    if cursor.fetchone()[0]:
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_events_bm25 ON events
+            USING bm25 (id, {', '.join(SEARCH_FIELDS)})
+            WITH (key_field = 'id');
+        """)
+        return BM25
+
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_search ON events "
+        f"USING GIN ({SEARCH_DOCUMENT.replace('e.', '')});"
+    )
+    # pg_trgm is optional; skip typo matching if it cannot be installed
+    cursor.execute("SAVEPOINT search_trgm;")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_name_trgm ON events USING GIN (name gin_trgm_ops);"
+        )
+        cursor.execute("RELEASE SAVEPOINT search_trgm;")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT search_trgm;")
+        logger.warning("pg_trgm unavailable, search will not match typos: %s", e)
+    return TSVECTOR
+
+
+def detect_backend(connection):
+    """
+    Return (backend, trigram) for the database behind connection, once per process
+
+    backend is BM25 when the ParadeDB index exists, else TSVECTOR. trigram
+    tells whether the fallback can match typos through pg_trgm.
+    """
+    global _backend, _trigram
+    if _backend is not None:
+        return _backend, _trigram
+    with _lock:
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    count(*) FILTER (WHERE indexname = 'idx_events_bm25') > 0,
+                    count(*) FILTER (WHERE indexname = 'idx_events_search') > 0,
+                    count(*) FILTER (WHERE indexname = 'idx_events_name_trgm') > 0
+                FROM pg_indexes
+                WHERE tablename = 'events'
+            """
+            )
+            has_bm25, has_tsvector, has_trigram = cur.fetchone()
+        connection.rollback()
+        if has_bm25:
+            _backend, _trigram = BM25, False
+        elif has_tsvector:
+            _backend, _trigram = TSVECTOR, has_trigram
+        else:
+            raise SearchUnavailable("Event search index is not installed")
+    return _backend, _trigram
+
+
+def parse_fuzziness(raw):
+    """Edit distance tolerated per term: 0, 1 (default) or 2."""
+    if raw is None or raw == "":
+        return 1
+    if raw not in ("0", "1", "2"):
+        raise ValueError("fuzzy must be 0, 1 or 2")
+    return int(raw)
+
+
+def build_search_query(args, backend, trigram, filters):
+    """
+    Build the ranked, keyset-paginated event search query
+
+    Results are ordered by (score DESC, id); ``cursor`` is the opaque value
+    returned in the X-Next-Cursor header of the previous page. One extra row
+    is fetched to detect whether another page exists.
+
+    Args:
+        args: request arguments; ``q`` is required
+        backend (str): BM25 or TSVECTOR, from detect_backend
+        trigram (bool): whether the fallback may use pg_trgm
+        filters (tuple): (clauses, params) on alias ``e`` from build_event_filters
+
+    Returns:
+        (sql, params, limit)
+    """
+    text = (args.get("q") or "").strip()
+    if not text:
+        raise ValueError("q is required")
+    limit = parse_limit(args.get("limit"))
+    distance = parse_fuzziness(args.get("fuzzy"))
+    clauses, filter_params = filters
+
+    if backend == BM25:
+        matches = ", ".join(
+            f"paradedb.match('{field}', %s, distance => %s)" for field in SEARCH_FIELDS
+        )
+        score = "paradedb.score(e.id)"
+        condition = f"e.id @@@ paradedb.boolean(should => ARRAY[{matches}])"
+        params = [text, distance] * len(SEARCH_FIELDS)
+    elif trigram and distance:
+        score = f"ts_rank_cd({SEARCH_DOCUMENT}, q.query) + similarity(e.name, %s)"
+        condition = f"({SEARCH_DOCUMENT} @@ q.query OR e.name %% %s)"
+        params = [text, text]
+    else:
+        score = f"ts_rank_cd({SEARCH_DOCUMENT}, q.query)"
+        condition = f"{SEARCH_DOCUMENT} @@ q.query"
+        params = []
+
+    where = " AND ".join([condition] + clauses)
+    params.extend(filter_params)
+
+    page_condition = ""
+    if args.get("cursor"):
+        last_score, last_id = decode_cursor(args["cursor"], 2)
+        try:
+            params.extend([float(last_score), float(last_score), int(last_id)])
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        page_condition = "WHERE m.score < %s OR (m.score = %s AND m.id > %s)"
+    params.append(limit + 1)
+
+    sql = f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+        matches AS (
+            SELECT e.id, ({score})::float8 AS score
+            FROM events e, q
+            WHERE {where}
+        ),
+        page AS (
+            SELECT m.id, m.score FROM matches m
+            {page_condition}
+            ORDER BY m.score DESC, m.id
+            LIMIT %s
+        )
+        SELECT
+            e.*,
+            u.name as organizer_name,
+            page.score,
+            ts_headline('english', e.name, q.query,
+                'StartSel=<mark>, StopSel=</mark>, HighlightAll=true') AS name_highlight,
+            ts_headline('english', coalesce(e.description, ''), q.query,
+                '{HIGHLIGHT_OPTIONS}') AS description_highlight
+        FROM page
+        JOIN events e ON e.id = page.id
+        LEFT JOIN users u ON e.organizer_id = u.id
+        CROSS JOIN q
+        ORDER BY page.score DESC, page.id
+    """
+    return sql, [text] + params, limit
+
+
+def next_search_cursor(rows, limit):
+    """Return the cursor for the page after rows, or None on the last page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last["score"], last["id"])
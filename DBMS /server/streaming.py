@@ -0,0 +1,161 @@
+import gzip
+import logging
+import os
+import tempfile
+import uuid
+
+from flask import Response, current_app, jsonify, request
+from psycopg2.extras import DictCursor
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# COPY options and mimetype per export format. For NDJSON each row is one
+# row_to_json document; JSON escapes every control character, so CSV mode with
+# \x01 as quote and \x02 as delimiter passes the documents through verbatim,
+# which plain text mode would not (it doubles backslashes).
+EXPORT_FORMATS = {
+    "csv": ("WITH (FORMAT csv, HEADER)", "text/csv"),
+    "ndjson": (
+        "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')",
+        "application/x-ndjson",
+    ),
+}
+
+
+def stream_json_array(sql, params=None, batch_size=DEFAULT_BATCH_SIZE, row_transform=dict):
+    """
+    Stream the result of a query as a JSON array
+
+    Rows are read from a server-side named cursor ``batch_size`` at a time and
+    written to the response as they arrive, so memory stays bounded by the
+    batch size rather than the result size. The first batch is fetched before
+    the response starts, so SQL errors still surface as a 500.
+
+    Args:
+        sql (str): SELECT statement to run
+        params (tuple|list): Parameters for the query
+        batch_size (int): Rows fetched per round-trip
+        row_transform (callable): Turns a DictRow into a JSON-serializable value
+
+    Returns:
+        a Flask response
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({"message": "Database connection error"}), 500
+
+    cursor = connection.cursor(
+        name=f"stream_{uuid.uuid4().hex}", cursor_factory=DictCursor
+    )
+    cursor.itersize = batch_size
+    released = False
+
+    def release():
+        nonlocal released
+        if released:
+            return
+        released = True
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        # Returning the connection to the pool rolls back the read transaction
+        connection.close()
+
+    try:
+        cursor.execute(sql, params or ())
+        batch = cursor.fetchmany(batch_size)
+    except Exception as e:
+        release()
+        return jsonify({"message": str(e)}), 500
+
+    dumps = current_app.json.dumps
+
+    def generate():
+        nonlocal batch
+        try:
+            yield "["
+            separator = ""
+            while batch:
+                yield separator + ",".join(dumps(row_transform(row)) for row in batch)
+                separator = ","
+                batch = cursor.fetchmany(batch_size)
+            yield "]"
+        except Exception as e:
+            # Headers are already sent; the truncated body signals the failure
+            logger.exception("Error while streaming rows: %s", e)
+        finally:
+            release()
+
+    response = Response(generate(), mimetype="application/json")
+    # Covers clients that disconnect before the generator is first resumed
+    response.call_on_close(release)
+    return response
+
+
+def stream_copy_export(connection, sql, params, fmt, filename):
+    """
+    Send the result of a query as a CSV or NDJSON file download
+
+    COPY ... TO STDOUT writes into a gzip-compressed temporary file and the
+    connection is returned to the pool before the response starts, so a slow
+    client never holds a database connection and memory stays constant
+    whatever the size of the export. Clients that accept gzip receive the
+    file as is; others get it decompressed on the fly.
+
+    Args:
+        connection: pooled connection to use; it is closed by this function
+        sql (str): SELECT statement to export
+        params (tuple|list): Parameters for the query
+        fmt (str): "csv" or "ndjson"
+        filename (str): Download name, without extension
+
+    Returns:
+        a Flask response
+    """
+    options, mimetype = EXPORT_FORMATS[fmt]
+    if fmt == "ndjson":
+        sql = f"SELECT row_to_json(export) FROM ({sql}) export"
+
+    spool = tempfile.TemporaryFile()
+    try:
+        with connection.cursor() as cur:
+            query = cur.mogrify(sql, params).decode()
+            with gzip.GzipFile(fileobj=spool, mode="wb", compresslevel=6) as compressed:
+                cur.copy_expert(f"COPY ({query}) TO STDOUT {options}", compressed)
+        connection.rollback()
+    except Exception as e:
+        connection.rollback()
+        spool.close()
+        return jsonify({"message": str(e)}), 500
+    finally:
+        connection.close()
+
+    size = spool.tell()
+    spool.seek(0)
+    send_gzip = request.accept_encodings["gzip"] > 0
+    source = spool if send_gzip else gzip.GzipFile(fileobj=spool, mode="rb")
+
+    def generate():
+        try:
+            while True:
+                chunk = source.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
+
+    response = Response(generate(), mimetype=mimetype)
+    response.call_on_close(spool.close)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    response.headers["Vary"] = "Accept-Encoding"
+    if send_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Content-Length"] = str(size)
+    return response
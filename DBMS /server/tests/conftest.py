@@ -0,0 +1,144 @@
+"""
+Fixtures for the database-backed tests
+
+The tests run against TEST_POSTGRES_DB (default sports_test) on the server the
+usual POSTGRES_* variables point at. The session creates the schema with
+init_db and then empties every table, so never point it at a database whose
+data you want to keep. Without a reachable database the tests are skipped.
+"""
+
+import os
+import uuid
+from datetime import date, timedelta
+
+import psycopg2
+import pytest
+
+os.environ["POSTGRES_DB"] = os.getenv("TEST_POSTGRES_DB", "sports_test")
+# No listener, refresher or embedder threads in the test process
+for name in ("CACHE_INVALIDATION_ENABLED", "REPORTS_REFRESH_ENABLED", "EMBEDDINGS_ENABLED"):
+    os.environ[name] = "0"
+
+import db  # noqa: E402  (reads POSTGRES_* on first use)
+
+TABLES = (
+    "feedback",
+    "payments",
+    "results",
+    "event_slots",
+    "event_stats",
+    "registrations",
+    "team_members",
+    "teams",
+    "communication_logs",
+    "events",
+    "users",
+    "jobs",
+)
+
+
+@pytest.fixture(scope="session")
+def database():
+    try:
+        psycopg2.connect(**db.connection_params()).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"test database unavailable: {e}")
+
+    from init_db import init_db
+
+    assert init_db(), "init_db failed"
+    connection = db.get_db_connection()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        connection.commit()
+    finally:
+        connection.close()
+    yield
+    db.close_pool()
+
+
+@pytest.fixture
+def connection(database):
+    connection = db.get_db_connection()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def make_user(connection):
+    """Create a user and return it as a principal: {id, role, name}."""
+
+    def make(role="participant"):
+        name = f"test-{uuid.uuid4().hex[:12]}"
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO users (name, email, password, phone, role)
+                VALUES (%s, %s, 'x', '0000000000', %s)
+                RETURNING id
+            """,
+                (name, f"{name}@example.com", role),
+            )
+            user_id = cur.fetchone()[0]
+        connection.commit()
+        return {"id": user_id, "role": role, "name": name}
+
+    return make
+
+
+@pytest.fixture
+def make_event(connection, make_user):
+    """Create an event open for registration and return its id."""
+
+    def make(capacity=None, organizer=None, deadline_days=10):
+        organizer = organizer or make_user("organizer")
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO events (
+                    name, event_date, venue, category, registration_deadline,
+                    fee, organizer_id, capacity
+                )
+                VALUES ('test event', %s, 'Test Arena', 'football', %s, 10, %s, %s)
+                RETURNING id
+            """,
+                (
+                    date.today() + timedelta(days=30),
+                    date.today() + timedelta(days=deadline_days),
+                    organizer["id"],
+                    capacity,
+                ),
+            )
+            event_id = cur.fetchone()[0]
+        connection.commit()
+        return event_id
+
+    return make
+
+
+@pytest.fixture
+def make_team(connection):
+    """Create a team with the given members and return its id."""
+
+    def make(event_id, members):
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO teams (team_name, event_id, created_by)
+                VALUES ('test team', %s, %s)
+                RETURNING id
+            """,
+                (event_id, members[0]["id"]),
+            )
+            team_id = cur.fetchone()[0]
+            for member in members:
+                cur.execute(
+                    "INSERT INTO team_members (team_id, user_id) VALUES (%s, %s)",
+                    (team_id, member["id"]),
+                )
+        connection.commit()
+        return team_id
+
+    return make
+
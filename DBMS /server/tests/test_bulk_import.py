@@ -0,0 +1,201 @@
+import io
+import json
+import threading
+import time
+import uuid
+
+import pytest
+
+import db
+from bulk_import import ImportAborted, run_import
+
+EVENT_HEADER = "name,event_date,venue,category,registration_deadline,fee,capacity\n"
+
+
+def events_named(connection, name):
+    with connection.cursor() as cur:
+        cur.execute("SELECT capacity FROM events WHERE name = %s ORDER BY id", (name,))
+        capacities = [row[0] for row in cur.fetchall()]
+    connection.commit()
+    return capacities
+
+
+def test_csv_events_are_validated_and_merged(connection, make_user):
+    organizer = make_user("organizer")
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    stream = io.StringIO(
+        EVENT_HEADER
+        + f"{name},2030-05-01,Arena,football,2030-04-01,10,50\n"
+        + f"{name},2030-05-01,Arena,football,2030-04-01,10,60\n"
+        + f"{name},2030-05-01,Arena,football,2030-06-01,10,70\n"
+        + f"{name},2030-05-01,Arena,football,2030-04-01,-5,80\n"
+    )
+
+    result = run_import(stream, "csv", "events", {"organizer_id": organizer["id"]})
+
+    assert (result["rows"], result["valid"], result["invalid"]) == (4, 2, 2)
+    assert [error["line"] for error in result["errors"]] == [4, 5]
+    assert (result["inserted"], result["conflicts"]) == (1, 1)
+    assert result["conflict_samples"] == [
+        {"line": 3, "key": name, "reason": "duplicate in file"}
+    ]
+    assert events_named(connection, name) == [50]
+
+
+def test_reimporting_reports_existing_rows_as_conflicts(connection, make_user):
+    organizer = make_user("organizer")
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    content = EVENT_HEADER + f"{name},2030-05-01,Arena,football,2030-04-01,10,\n"
+    defaults = {"organizer_id": organizer["id"]}
+
+    assert run_import(io.StringIO(content), "csv", "events", defaults)["inserted"] == 1
+    result = run_import(io.StringIO(content), "csv", "events", defaults)
+
+    assert (result["inserted"], result["conflicts"]) == (0, 1)
+    assert result["conflict_samples"][0]["reason"] == "event already exists"
+    assert events_named(connection, name) == [None]
+
+
+def test_ndjson_users_skip_registered_emails(connection, make_user):
+    existing = make_user()
+    email = f"import-{uuid.uuid4().hex[:8]}@example.com"
+    stream = io.StringIO(
+        "\n".join(
+            [
+                json.dumps({"name": "New", "email": email, "phone": "1", "role": "organizer"}),
+                json.dumps({"name": "Old", "email": f"{existing['name']}@example.com",
+                            "phone": "1"}),
+                "not json",
+                json.dumps({"name": "Bad", "email": "nobody", "phone": "1"}),
+            ]
+        )
+    )
+
+    result = run_import(stream, "ndjson", "users")
+
+    assert (result["valid"], result["invalid"], result["inserted"]) == (2, 2, 1)
+    assert result["conflict_samples"][0]["reason"] == "email already registered"
+    with connection.cursor() as cur:
+        cur.execute("SELECT role, password FROM users WHERE email = %s", (email,))
+        assert cur.fetchone() == ("organizer", "!")
+    connection.commit()
+
+
+def test_dry_run_writes_nothing(connection, make_user):
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    stream = io.StringIO(EVENT_HEADER + f"{name},2030-05-01,Arena,football,2030-04-01,10,5\n")
+
+    result = run_import(
+        stream, "csv", "events", {"organizer_id": make_user("organizer")["id"]}, dry_run=True
+    )
+
+    assert result["inserted"] == 1
+    assert events_named(connection, name) == []
+
+
+def test_too_many_invalid_rows_abort_the_import(connection):
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    stream = io.StringIO(
+        EVENT_HEADER
+        + f"{name},2030-05-01,Arena,football,2030-04-01,10,5\n"
+        + "bad,not-a-date,Arena,football,2030-04-01,10,5\n" * 3
+    )
+
+    with pytest.raises(ImportAborted) as aborted:
+        run_import(stream, "csv", "events", max_errors=2)
+
+    assert aborted.value.result["invalid"] == 3
+    assert events_named(connection, name) == []
+
+
+def test_capacity_out_of_range_is_a_line_error(connection, make_user):
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    stream = io.StringIO(
+        EVENT_HEADER
+        + f"{name},2030-05-01,Arena,football,2030-04-01,10,2000000000\n"
+        + f"{name},2030-05-02,Arena,football,2030-04-01,10,0\n"
+    )
+
+    result = run_import(stream, "csv", "events", {"organizer_id": make_user("organizer")["id"]})
+
+    assert result["invalid"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert all("capacity" in error["error"] for error in result["errors"])
+    assert events_named(connection, name) == []
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [
+        ("fee", "100000000"),
+        ("fee", "10.005"),
+        ("capacity", "99999999999"),
+        ("organizer_id", "2147483648"),
+    ],
+)
+def test_values_outside_column_ranges_are_line_errors(connection, make_user, column, value):
+    name = f"import-{uuid.uuid4().hex[:8]}"
+    row = {
+        "name": name,
+        "event_date": "2030-05-01",
+        "venue": "Arena",
+        "category": "football",
+        "registration_deadline": "2030-04-01",
+        "fee": "10",
+        column: value,
+    }
+
+    result = run_import(
+        io.StringIO(json.dumps(row)), "ndjson", "events",
+        {"organizer_id": make_user("organizer")["id"]},
+    )
+
+    assert result["invalid"] == 1
+    assert column in result["errors"][0]["error"]
+    assert events_named(connection, name) == []
+
+
+def test_user_age_outside_int4_is_a_line_error(connection):
+    email = f"import-{uuid.uuid4().hex[:8]}@example.com"
+    row = {"name": "Old", "email": email, "phone": "1", "age": 2**31}
+
+    result = run_import(io.StringIO(json.dumps(row)), "ndjson", "users")
+
+    assert (result["invalid"], result["inserted"]) == (1, 0)
+    assert "age" in result["errors"][0]["error"]
+
+
+def test_email_taken_during_the_import_is_a_conflict(connection):
+    email = f"import-{uuid.uuid4().hex[:8]}@example.com"
+    signup = db.get_db_connection()
+    try:
+        # A signup inserts the email but has not committed when the import
+        # classifies its rows, so only ON CONFLICT catches it
+        with signup.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO users (name, email, password, phone)
+                VALUES ('Signup', %s, 'x', '1')
+            """,
+                (email,),
+            )
+        results = []
+        row = {"name": "Imported", "email": email, "phone": "1"}
+        thread = threading.Thread(
+            target=lambda: results.append(
+                run_import(io.StringIO(json.dumps(row)), "ndjson", "users")
+            )
+        )
+        thread.start()
+        time.sleep(0.5)
+        assert thread.is_alive(), "import did not wait for the signup"
+        signup.commit()
+        thread.join(timeout=10)
+    finally:
+        signup.close()
+
+    result = results[0]
+    assert (result["inserted"], result["conflicts"]) == (0, 1)
+    assert result["conflict_samples"] == [
+        {"line": 1, "key": email, "reason": "email already registered"}
+    ]
@@ -0,0 +1,79 @@
+from registrations import bulk_update_status, register_for_event
+
+
+def register(connection, event_id, user):
+    outcome, registration = register_for_event(connection, event_id, user["id"])
+    assert outcome == "created"
+    return registration["id"]
+
+
+def status_of(connection, registration_id):
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT registration_status FROM registrations WHERE id = %s", (registration_id,)
+        )
+        status = cur.fetchone()[0]
+    connection.commit()
+    return status
+
+
+def test_bulk_update_reports_an_outcome_per_id(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    own_event = make_event(organizer=organizer)
+    other_event = make_event()
+    pending = register(connection, own_event, make_user())
+    confirmed = register(connection, own_event, make_user())
+    bulk_update_status(connection, organizer, "confirmed", ids=[confirmed])
+    foreign = register(connection, other_event, make_user())
+
+    results = bulk_update_status(
+        connection, organizer, "confirmed", ids=[pending, confirmed, foreign, 0]
+    )
+
+    assert results == [
+        {"id": 0, "outcome": "not_found"},
+        {"id": pending, "outcome": "updated"},
+        {"id": confirmed, "outcome": "unchanged"},
+        {"id": foreign, "outcome": "forbidden"},
+    ]
+    assert status_of(connection, pending) == "confirmed"
+    assert status_of(connection, foreign) == "pending"
+
+
+def test_admins_may_update_any_event(connection, make_user, make_event):
+    admin = make_user("admin")
+    registration = register(connection, make_event(), make_user())
+
+    results = bulk_update_status(connection, admin, "confirmed", ids=[registration])
+
+    assert results == [{"id": registration, "outcome": "updated"}]
+
+
+def test_waitlisted_registrations_can_only_be_cancelled(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=1, organizer=organizer)
+    register(connection, event_id, make_user())
+    waitlisted = register(connection, event_id, make_user())
+
+    assert bulk_update_status(connection, organizer, "confirmed", ids=[waitlisted]) == [
+        {"id": waitlisted, "outcome": "waitlisted"}
+    ]
+    assert status_of(connection, waitlisted) == "waitlisted"
+    assert bulk_update_status(connection, organizer, "cancelled", ids=[waitlisted]) == [
+        {"id": waitlisted, "outcome": "updated"}
+    ]
+
+
+def test_filter_selects_an_events_registrations_by_status(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    event_id = make_event(organizer=organizer)
+    confirmed = register(connection, event_id, make_user())
+    bulk_update_status(connection, organizer, "confirmed", ids=[confirmed])
+    pending = [register(connection, event_id, make_user()) for _ in range(3)]
+
+    results = bulk_update_status(
+        connection, organizer, "cancelled", event_id=event_id, from_status="pending"
+    )
+
+    assert results == [{"id": i, "outcome": "updated"} for i in sorted(pending)]
+    assert status_of(connection, confirmed) == "confirmed"
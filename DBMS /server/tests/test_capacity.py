@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import pytest
+
+import db
+from registrations import MAX_CAPACITY, bulk_update_status, register_for_event
+
+
+def seats(connection, event_id):
+    """registration_status by registration id, and the ids holding a slot."""
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT id, registration_status FROM registrations WHERE event_id = %s",
+            (event_id,),
+        )
+        statuses = dict(cur.fetchall())
+        cur.execute(
+            """
+            SELECT registration_id FROM event_slots
+            WHERE event_id = %s AND registration_id IS NOT NULL
+        """,
+            (event_id,),
+        )
+        seated = {row[0] for row in cur.fetchall()}
+    connection.commit()
+    return statuses, seated
+
+
+def register(connection, event_id, user):
+    outcome, registration = register_for_event(connection, event_id, user["id"])
+    assert outcome == "created"
+    return registration
+
+
+def test_registrations_past_capacity_are_waitlisted(connection, make_user, make_event):
+    event_id = make_event(capacity=2)
+
+    first, second, third = (register(connection, event_id, make_user()) for _ in range(3))
+
+    assert [r["registration_status"] for r in (first, second, third)] == [
+        "pending",
+        "pending",
+        "waitlisted",
+    ]
+    assert {first["slot_no"], second["slot_no"]} == {1, 2}
+    assert third["slot_no"] is None
+    _, seated = seats(connection, event_id)
+    assert seated == {first["id"], second["id"]}
+
+
+def test_concurrent_registrations_never_oversell(connection, make_user, make_event):
+    event_id = make_event(capacity=5)
+    users = [make_user() for _ in range(20)]
+
+    def attempt(user):
+        borrowed = db.get_db_connection()
+        try:
+            return register_for_event(borrowed, event_id, user["id"])[1]
+        finally:
+            borrowed.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        registrations = list(pool.map(attempt, users))
+
+    statuses, seated = seats(connection, event_id)
+    active = {i for i, status in statuses.items() if status == "pending"}
+    assert len(statuses) == 20
+    assert len(active) == 5
+    assert seated == active
+    assert sorted(r["slot_no"] for r in registrations if r["slot_no"]) == [1, 2, 3, 4, 5]
+
+
+def test_cancelling_a_seat_promotes_the_oldest_waitlisted(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=1, organizer=organizer)
+    seated = register(connection, event_id, make_user())
+    oldest = register(connection, event_id, make_user())
+    newest = register(connection, event_id, make_user())
+
+    bulk_update_status(connection, organizer, "cancelled", ids=[seated["id"]])
+
+    statuses, holders = seats(connection, event_id)
+    assert statuses == {
+        seated["id"]: "cancelled",
+        oldest["id"]: "pending",
+        newest["id"]: "waitlisted",
+    }
+    assert holders == {oldest["id"]}
+
+
+def test_reinstating_a_cancelled_registration_claims_a_free_seat(
+    connection, make_user, make_event
+):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=2, organizer=organizer)
+    registration = register(connection, event_id, make_user())
+    bulk_update_status(connection, organizer, "cancelled", ids=[registration["id"]])
+    assert seats(connection, event_id)[1] == set()
+
+    results = bulk_update_status(connection, organizer, "confirmed", ids=[registration["id"]])
+
+    assert results == [{"id": registration["id"], "outcome": "updated"}]
+    statuses, holders = seats(connection, event_id)
+    assert statuses[registration["id"]] == "confirmed"
+    assert holders == {registration["id"]}
+
+
+def test_reinstating_into_a_full_event_waitlists(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=1, organizer=organizer)
+    cancelled = register(connection, event_id, make_user())
+    bulk_update_status(connection, organizer, "cancelled", ids=[cancelled["id"]])
+    holder = register(connection, event_id, make_user())
+
+    results = bulk_update_status(connection, organizer, "confirmed", ids=[cancelled["id"]])
+
+    assert results == [{"id": cancelled["id"], "outcome": "waitlisted"}]
+    statuses, holders = seats(connection, event_id)
+    assert statuses[cancelled["id"]] == "waitlisted"
+    assert holders == {holder["id"]}
+
+
+def test_bulk_reinstatement_seats_up_to_capacity(connection, make_user, make_event):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=2, organizer=organizer)
+    ids = [register(connection, event_id, make_user())["id"] for _ in range(2)]
+    ids.append(register(connection, event_id, make_user())["id"])
+    bulk_update_status(connection, organizer, "cancelled", ids=ids)
+
+    results = bulk_update_status(connection, organizer, "pending", ids=ids)
+
+    outcomes = sorted(r["outcome"] for r in results)
+    assert outcomes == ["updated", "updated", "waitlisted"]
+    statuses, holders = seats(connection, event_id)
+    assert holders == {i for i, status in statuses.items() if status == "pending"}
+    assert len(holders) == 2
+
+
+def test_schema_rejects_capacity_out_of_range(connection, make_event):
+    event_id = make_event()
+
+    for capacity in (0, MAX_CAPACITY + 1):
+        with pytest.raises(psycopg2.errors.CheckViolation):
+            with connection.cursor() as cur:
+                cur.execute("UPDATE events SET capacity = %s WHERE id = %s", (capacity, event_id))
+        connection.rollback()
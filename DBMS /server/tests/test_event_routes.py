@@ -0,0 +1,125 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import jwt
+import pytest
+
+import invalidation
+from registrations import MAX_CAPACITY
+
+
+@pytest.fixture
+def send(database):
+    from app_postgres import app
+
+    client = app.test_client()
+
+    def send(method, principal, path, body, if_none_match=None):
+        token = jwt.encode(
+            {
+                "user_id": principal["id"],
+                "exp": datetime.now(timezone.utc) + timedelta(minutes=5),
+            },
+            app.config["JWT_SECRET_KEY"],
+            algorithm="HS256",
+        )
+        headers = {"Authorization": f"Bearer {token}"}
+        if if_none_match:
+            headers["If-None-Match"] = if_none_match
+        return client.open(path, method=method, json=body, headers=headers)
+
+    return send
+
+
+def event_payload(**fields):
+    return {
+        "name": "capacity test",
+        "event_date": str(date.today() + timedelta(days=30)),
+        "venue": "Test Arena",
+        "category": "football",
+        "description": "",
+        "registration_deadline": str(date.today() + timedelta(days=10)),
+        "fee": 10,
+        **fields,
+    }
+
+
+def slot_count(connection, event_id):
+    with connection.cursor() as cur:
+        cur.execute("SELECT count(*) FROM event_slots WHERE event_id = %s", (event_id,))
+        count = cur.fetchone()[0]
+    connection.commit()
+    return count
+
+
+@pytest.mark.parametrize("capacity", [0, -1, MAX_CAPACITY + 1, 2_000_000_000, 2.5, "many", True])
+def test_create_rejects_capacity_out_of_range(make_user, send, capacity):
+    response = send("POST", make_user("organizer"), "/api/events", event_payload(capacity=capacity))
+
+    assert response.status_code == 400
+    assert "capacity" in response.get_json()["message"]
+
+
+def test_create_accepts_capacity_in_range(connection, make_user, send):
+    response = send("POST", make_user("organizer"), "/api/events", event_payload(capacity=3))
+
+    assert response.status_code == 201
+    assert response.get_json()["capacity"] == 3
+    assert slot_count(connection, response.get_json()["id"]) == 3
+
+
+def test_update_rejects_capacity_out_of_range(connection, make_user, make_event, send):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=2, organizer=organizer)
+
+    response = send(
+        "PUT", organizer, f"/api/events/{event_id}", {"capacity": 2_000_000_000}
+    )
+
+    assert response.status_code == 400
+    assert slot_count(connection, event_id) == 2
+    assert send("PUT", organizer, f"/api/events/{event_id}", {"capacity": None}).status_code == 200
+
+
+def rename(connection, user, name):
+    with connection.cursor() as cur:
+        cur.execute("UPDATE users SET name = %s WHERE id = %s", (name, user["id"]))
+    connection.commit()
+    # The listener thread is off in tests; deliver its notification directly
+    invalidation.dispatch({"table": "users", "op": "UPDATE", "id": user["id"]})
+
+
+def test_list_etag_changes_when_the_organizer_is_renamed(
+    connection, make_user, make_event, send
+):
+    organizer = make_user("organizer")
+    event_id = make_event(organizer=organizer)
+    category = f"cat-{uuid.uuid4().hex[:8]}"
+    with connection.cursor() as cur:
+        cur.execute("UPDATE events SET category = %s WHERE id = %s", (category, event_id))
+    connection.commit()
+    path = f"/api/events?category={category}"
+    etag = send("GET", organizer, path, None).headers["ETag"]
+    assert send("GET", organizer, path, None, etag).status_code == 304
+
+    rename(connection, organizer, "Renamed Organizer")
+
+    response = send("GET", organizer, path, None, etag)
+    assert response.status_code == 200
+    assert response.get_json()[0]["organizer_name"] == "Renamed Organizer"
+
+
+def test_cached_event_is_refreshed_when_the_organizer_is_renamed(
+    connection, make_user, make_event, send
+):
+    organizer = make_user("organizer")
+    event_id = make_event(organizer=organizer)
+    path = f"/api/events/{event_id}"
+    etag = send("GET", organizer, path, None).headers["ETag"]
+    assert send("GET", organizer, path, None, etag).status_code == 304
+
+    rename(connection, organizer, "Renamed Organizer")
+
+    response = send("GET", organizer, path, None, etag)
+    assert response.status_code == 200
+    assert response.get_json()["organizer_name"] == "Renamed Organizer"
@@ -0,0 +1,169 @@
+import pytest
+from psycopg2.extras import DictCursor
+
+import jobs
+from registrations import register_for_event
+
+
+class RecordingSink:
+    def __init__(self, error=None):
+        self.error = error
+        self.messages = []
+
+    def deliver(self, messages):
+        self.messages.extend(messages)
+        return [self.error] * len(messages)
+
+
+@pytest.fixture
+def queue(connection):
+    """An empty job queue; returns a function that reads a job back."""
+    with connection.cursor() as cur:
+        cur.execute("DELETE FROM jobs")
+    connection.commit()
+
+    def job(job_id):
+        with connection.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(
+                """
+                SELECT *, extract(epoch FROM run_at - CURRENT_TIMESTAMP) AS delay
+                FROM jobs WHERE id = %s
+            """,
+                (job_id,),
+            )
+            row = cur.fetchone()
+        connection.commit()
+        return row
+
+    return job
+
+
+def enqueue(connection, job_type, payload, **kwargs):
+    with connection.cursor() as cur:
+        jobs.enqueue(cur, job_type, payload, **kwargs)
+        cur.execute("SELECT currval(pg_get_serial_sequence('jobs', 'id'))")
+        job_id = cur.fetchone()[0]
+    connection.commit()
+    return job_id
+
+
+def log_statuses(connection, job_id):
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT status FROM communication_logs WHERE job_id = %s ORDER BY id", (job_id,)
+        )
+        statuses = [row[0] for row in cur.fetchall()]
+    connection.commit()
+    return statuses
+
+
+def test_delivered_job_is_done_and_logged(connection, make_user, queue):
+    user = make_user()
+    job_id = enqueue(connection, "welcome", {"user_id": user["id"]})
+    sink = RecordingSink()
+
+    assert jobs.Worker(sink=sink).run_once() == 1
+
+    assert queue(job_id)["status"] == "done"
+    assert [message["to"] for message in sink.messages] == [f"{user['name']}@example.com"]
+    assert log_statuses(connection, job_id) == ["sent"]
+
+
+def test_registration_change_enqueues_a_notification(connection, make_user, make_event, queue):
+    user = make_user()
+    _, registration = register_for_event(connection, make_event(), user["id"])
+    sink = RecordingSink()
+
+    jobs.Worker(sink=sink).run_once()
+
+    assert [message["message_type"] for message in sink.messages] == ["registration_pending"]
+    assert sink.messages[0]["user_id"] == user["id"]
+
+
+def test_failed_delivery_backs_off_exponentially(connection, make_user, queue):
+    job_id = enqueue(connection, "welcome", {"user_id": make_user()["id"]})
+    worker = jobs.Worker(sink=RecordingSink(error="mailbox unavailable"))
+
+    worker.run_once()
+    first = queue(job_id)
+    assert first["status"] == "pending"
+    assert first["attempts"] == 1
+    assert first["last_error"] == "mailbox unavailable"
+    # Jitter keeps the delay between half and all of base * 2^(attempts - 1)
+    assert jobs.BACKOFF_BASE * 0.5 - 1 <= first["delay"] <= jobs.BACKOFF_BASE
+    # Not ready yet, so a second pass leaves it alone
+    assert worker.run_once() == 0
+
+    with connection.cursor() as cur:
+        cur.execute("UPDATE jobs SET run_at = CURRENT_TIMESTAMP WHERE id = %s", (job_id,))
+    connection.commit()
+    worker.run_once()
+    second = queue(job_id)
+    assert second["attempts"] == 2
+    assert jobs.BACKOFF_BASE - 1 <= second["delay"] <= jobs.BACKOFF_BASE * 2
+    assert log_statuses(connection, job_id) == ["retrying", "retrying"]
+
+
+def test_job_fails_after_max_attempts(connection, make_user, queue):
+    job_id = enqueue(connection, "welcome", {"user_id": make_user()["id"]}, max_attempts=1)
+
+    jobs.Worker(sink=RecordingSink(error="mailbox unavailable")).run_once()
+
+    job = queue(job_id)
+    assert job["status"] == "failed"
+    assert job["finished_at"] is not None
+    assert log_statuses(connection, job_id) == ["failed"]
+
+
+def test_unknown_job_type_is_retried_with_an_error(connection, queue):
+    job_id = enqueue(connection, "carrier_pigeon", {})
+
+    jobs.Worker(sink=RecordingSink()).run_once()
+
+    job = queue(job_id)
+    assert job["status"] == "pending"
+    assert job["last_error"] == "unknown job type carrier_pigeon"
+
+
+def test_stale_running_job_is_requeued(connection, make_user, queue):
+    job_id = enqueue(connection, "welcome", {"user_id": make_user()["id"]})
+    worker = jobs.Worker(sink=RecordingSink())
+    worker.claim(connection)
+    with connection.cursor() as cur:
+        cur.execute(
+            "UPDATE jobs SET locked_at = locked_at - %s * interval '2 seconds' WHERE id = %s",
+            (jobs.VISIBILITY_TIMEOUT, job_id),
+        )
+    connection.commit()
+
+    worker.maintain(connection)
+
+    assert queue(job_id)["status"] == "pending"
+    assert worker.run_once() == 1
+    assert queue(job_id)["status"] == "done"
+
+
+def test_stale_job_on_its_last_attempt_fails(connection, make_user, queue):
+    job_id = enqueue(connection, "welcome", {"user_id": make_user()["id"]}, max_attempts=2)
+    worker = jobs.Worker(sink=RecordingSink())
+
+    def lose_worker():
+        assert worker.claim(connection)
+        with connection.cursor() as cur:
+            cur.execute(
+                "UPDATE jobs SET locked_at = locked_at - %s * interval '2 seconds' WHERE id = %s",
+                (jobs.VISIBILITY_TIMEOUT, job_id),
+            )
+        connection.commit()
+        worker.maintain(connection)
+
+    lose_worker()
+    assert queue(job_id)["status"] == "pending"
+    lose_worker()
+
+    job = queue(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert job["last_error"] == "worker lost"
+    assert job["finished_at"] is not None
+    assert worker.run_once() == 0
@@ -0,0 +1,37 @@
+"""
+Runs bench/plancheck.py against PLANCHECK_POSTGRES_DB
+
+The plan budgets only mean something on a seeded database of realistic size,
+and the check writes to it, so it runs only when that variable names one,
+e.g. after python -m bench.datagen --registrations 1000000 --reset.
+"""
+
+import os
+import subprocess
+import sys
+
+import psycopg2
+import pytest
+
+import db
+
+PLANCHECK_DB = os.getenv("PLANCHECK_POSTGRES_DB")
+
+
+@pytest.mark.skipif(not PLANCHECK_DB, reason="PLANCHECK_POSTGRES_DB is not set")
+def test_route_queries_stay_within_plan_budgets(tmp_path):
+    try:
+        psycopg2.connect(**dict(db.connection_params(), database=PLANCHECK_DB)).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"plan check database unavailable: {e}")
+
+    # A separate process: the check installs a statement hook and its own pool
+    result = subprocess.run(
+        [sys.executable, "-m", "bench.plancheck", "--report", str(tmp_path / "report.md")],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=dict(os.environ, POSTGRES_DB=PLANCHECK_DB),
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+
+from registrations import register_for_event
+
+
+@pytest.fixture
+def client(database):
+    from app_postgres import app
+
+    return app.test_client()
+
+
+@pytest.fixture
+def put_status(client):
+    from app_postgres import app
+
+    def put(principal, registration_id, body):
+        token = jwt.encode(
+            {
+                "user_id": principal["id"],
+                "exp": datetime.now(timezone.utc) + timedelta(minutes=5),
+            },
+            app.config["JWT_SECRET_KEY"],
+            algorithm="HS256",
+        )
+        return client.put(
+            f"/api/registrations/{registration_id}",
+            json=body,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    return put
+
+
+def register(connection, event_id, user):
+    outcome, registration = register_for_event(connection, event_id, user["id"])
+    assert outcome == "created"
+    return registration["id"]
+
+
+def test_organizer_confirms_a_registration(connection, make_user, make_event, put_status):
+    organizer = make_user("organizer")
+    registration = register(connection, make_event(organizer=organizer), make_user())
+
+    response = put_status(organizer, registration, {"status": "confirmed"})
+
+    assert response.status_code == 200
+    assert response.get_json()["id"] == registration
+    assert response.get_json()["registration_status"] == "confirmed"
+
+
+@pytest.mark.parametrize("body", [{}, {"status": "waitlisted"}, {"status": "approved"}])
+def test_status_must_be_settable(connection, make_user, make_event, put_status, body):
+    organizer = make_user("organizer")
+    registration = register(connection, make_event(organizer=organizer), make_user())
+
+    assert put_status(organizer, registration, body).status_code == 400
+
+
+def test_participants_and_other_organizers_are_refused(
+    connection, make_user, make_event, put_status
+):
+    registration = register(connection, make_event(), make_user())
+
+    assert put_status(make_user(), registration, {"status": "confirmed"}).status_code == 403
+    assert (
+        put_status(make_user("organizer"), registration, {"status": "confirmed"}).status_code
+        == 403
+    )
+
+
+def test_unknown_registration_is_not_found(make_user, put_status):
+    assert put_status(make_user("admin"), 0, {"status": "confirmed"}).status_code == 404
+
+
+def test_waitlisted_registration_cannot_be_confirmed(
+    connection, make_user, make_event, put_status
+):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=1, organizer=organizer)
+    register(connection, event_id, make_user())
+    registration = register(connection, event_id, make_user())
+
+    assert put_status(organizer, registration, {"status": "confirmed"}).status_code == 409
+    assert put_status(organizer, registration, {"status": "cancelled"}).status_code == 200
+
+
+def test_reinstating_past_capacity_is_waitlisted(connection, make_user, make_event, put_status):
+    organizer = make_user("organizer")
+    event_id = make_event(capacity=1, organizer=organizer)
+    cancelled = register(connection, event_id, make_user())
+    assert put_status(organizer, cancelled, {"status": "cancelled"}).status_code == 200
+    register(connection, event_id, make_user())
+
+    response = put_status(organizer, cancelled, {"status": "confirmed"})
+
+    assert response.status_code == 409
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT registration_status FROM registrations WHERE id = %s", (cancelled,)
+        )
+        assert cur.fetchone()[0] == "waitlisted"
+        cur.execute(
+            """
+            SELECT count(*) FROM event_slots
+            WHERE event_id = %s AND registration_id IS NOT NULL
+        """,
+            (event_id,),
+        )
+        assert cur.fetchone()[0] == 1
+    connection.commit()
@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from registrations import LOCK_TEAMS_SQL, REGISTER_SQL, register_for_event
+
+
+def registration_count(connection, event_id):
+    with connection.cursor() as cur:
+        cur.execute("SELECT count(*) FROM registrations WHERE event_id = %s", (event_id,))
+        count = cur.fetchone()[0]
+    connection.commit()
+    return count
+
+
+def test_register_creates_a_pending_registration(connection, make_user, make_event):
+    user = make_user()
+    event_id = make_event()
+
+    outcome, registration = register_for_event(connection, event_id, user["id"])
+
+    assert outcome == "created"
+    assert registration["user_id"] == user["id"]
+    assert registration["event_id"] == event_id
+    assert registration["registration_status"] == "pending"
+    assert registration["slot_no"] is None
+
+
+def test_register_is_closed_after_the_deadline(connection, make_user, make_event):
+    user = make_user()
+    event_id = make_event(deadline_days=-1)
+
+    assert register_for_event(connection, event_id, user["id"]) == ("closed", None)
+    assert register_for_event(connection, 0, user["id"]) == ("closed", None)
+
+
+def test_register_twice_conflicts(connection, make_user, make_event):
+    user = make_user()
+    event_id = make_event()
+
+    assert register_for_event(connection, event_id, user["id"])[0] == "created"
+    assert register_for_event(connection, event_id, user["id"]) == ("conflict", None)
+    assert registration_count(connection, event_id) == 1
+
+
+def test_register_alone_conflicts_with_own_team(connection, make_user, make_event, make_team):
+    captain, member = make_user(), make_user()
+    event_id = make_event()
+    team_id = make_team(event_id, [captain, member])
+
+    assert register_for_event(connection, event_id, captain["id"], team_id)[0] == "created"
+    assert register_for_event(connection, event_id, member["id"]) == ("conflict", None)
+    # The same team cannot register twice either
+    assert register_for_event(connection, event_id, member["id"], team_id) == ("conflict", None)
+
+
+def test_concurrent_duplicates_create_one_registration(connection, make_user, make_event):
+    user = make_user()
+    event_id = make_event()
+
+    def register(_):
+        borrowed = db.get_db_connection()
+        try:
+            return register_for_event(borrowed, event_id, user["id"])[0]
+        finally:
+            borrowed.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(register, range(8)))
+
+    assert sorted(outcomes) == ["conflict"] * 7 + ["created"]
+    assert registration_count(connection, event_id) == 1
+
+
+def test_member_registration_waits_for_team_registration(
+    connection, make_user, make_event, make_team
+):
+    captain, member = make_user(), make_user()
+    event_id = make_event()
+    team_id = make_team(event_id, [captain, member])
+
+    # The team registration is in flight: locked and inserted, not committed
+    params = {"event_id": event_id, "user_id": captain["id"], "team_id": team_id}
+    with connection.cursor() as cur:
+        cur.execute(LOCK_TEAMS_SQL, params)
+        cur.execute(REGISTER_SQL, params)
+
+    outcomes = []
+
+    def register_member():
+        borrowed = db.get_db_connection()
+        try:
+            outcomes.append(register_for_event(borrowed, event_id, member["id"])[0])
+        finally:
+            borrowed.close()
+
+    thread = threading.Thread(target=register_member)
+    thread.start()
+    time.sleep(0.5)
+    assert thread.is_alive(), "member registration did not wait for the team lock"
+
+    connection.commit()
+    thread.join(timeout=10)
+    assert outcomes == ["conflict"]
+    assert registration_count(connection, event_id) == 1
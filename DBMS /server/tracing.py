@@ -0,0 +1,393 @@
+"""
+Request-scoped tracing spans
+
+Each sampled request gets a tree of spans: the route itself, middleware such
+as token_required, every SQL statement and JSON encoding. The current span
+lives in a context variable, so untraced code pays one lookup per span and
+nothing else. Finished traces are handed to a background exporter that
+appends them to a JSON-lines file or posts them to an OTLP/HTTP collector;
+the request never waits on either.
+
+Run a stub collector that prints and stores what it receives:
+    python tracing.py --port 4318
+"""
+
+import argparse
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "sports-events-api")
+QUEUE_SIZE = 1000
+BATCH_SIZE = 100
+
+# OTLP SpanKind values
+_OTLP_KINDS = {"server": 2, "db": 3}
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "trace", "name", "kind", "span_id", "parent_id", "start_ns", "end_ns", "attributes",
+        "token",
+    )
+
+    def __init__(self, trace, name, kind, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.token = None
+        trace.spans.append(self)
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms(), 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "sampled")
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.spans = []
+        self.sampled = sampled
+
+    @property
+    def root(self):
+        return self.spans[0]
+
+    def breakdown(self):
+        """
+        Return {kind: [self time in ms, span count]}
+
+        Self time excludes child spans, so the kinds add up to the root's
+        duration; e.g. the user lookup inside token_required counts as db, not
+        auth.
+        """
+        child_ns = {}
+        for span in self.spans:
+            if span.parent_id is not None:
+                duration = (span.end_ns or span.start_ns) - span.start_ns
+                child_ns[span.parent_id] = child_ns.get(span.parent_id, 0) + duration
+        totals = {}
+        for span in self.spans:
+            own = (span.end_ns or span.start_ns) - span.start_ns - child_ns.get(span.span_id, 0)
+            entry = totals.setdefault("app" if span.kind == "server" else span.kind, [0.0, 0])
+            entry[0] += own / 1e6
+            entry[1] += 1
+        return totals
+
+    def timing_header(self):
+        """Summarize the trace in Server-Timing syntax for X-Debug-Timing."""
+        parts = [f"total;dur={self.root.duration_ms():.2f}"]
+        for kind, (ms, count) in sorted(self.breakdown().items()):
+            parts.append(f"{kind};dur={ms:.2f};count={count}")
+        parts.append(f'trace;desc="{self.trace_id}"')
+        return ", ".join(parts)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms(), 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+def _parse_traceparent(header):
+    # W3C trace context: version-traceid-parentid-flags
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def start_trace(name, traceparent=None, force=False, **attributes):
+    """
+    Begin the trace for a request and make its root span current
+
+    An incoming sampled traceparent continues the caller's trace; otherwise
+    the trace is sampled at TRACE_SAMPLE_RATE. force records the trace even
+    when it is not sampled, for X-Debug-Timing.
+
+    Returns:
+        The Trace, or None when the request is not traced
+    """
+    parent = _parse_traceparent(traceparent)
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        sampled = SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+    if not (sampled or force):
+        # Clear whatever a previous request on this thread left behind
+        _current.set(None)
+        return None
+    trace = Trace(trace_id, sampled)
+    root = Span(trace, name, "server", parent_id, attributes)
+    root.token = _current.set(root)
+    return trace
+
+
+def finish_trace(trace, **attributes):
+    """End the root span, restore the context and queue sampled traces for export."""
+    end_span(trace.root, **attributes)
+    if trace.sampled:
+        get_exporter().submit(trace)
+
+
+def start_span(name, kind="internal", **attributes):
+    """Start a child of the current span; returns None when nothing is traced."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    span = Span(parent.trace, name, kind, parent.span_id, attributes)
+    span.token = _current.set(span)
+    return span
+
+
+def end_span(span, **attributes):
+    if span is None:
+        return
+    span.end_ns = time.time_ns()
+    span.attributes.update(attributes)
+    try:
+        _current.reset(span.token)
+    except ValueError:
+        # Ended from a different context than it was started in
+        _current.set(None)
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    current = start_span(name, kind, **attributes)
+    try:
+        yield current
+    except Exception as e:
+        if current is not None:
+            current.set("error", str(e))
+        raise
+    finally:
+        end_span(current)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces):
+    """Encode traces as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    spans = []
+    for trace in traces:
+        for span in trace.spans:
+            otlp = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": _OTLP_KINDS.get(span.kind, 1),
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in {"span.kind": span.kind, **span.attributes}.items()
+                ],
+            }
+            if span.parent_id:
+                otlp["parentSpanId"] = span.parent_id
+            if "error" in span.attributes:
+                otlp["status"] = {"code": 2, "message": str(span.attributes["error"])}
+            spans.append(otlp)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class JsonlSink:
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+
+    def write(self, traces):
+        with open(self.path, "a", encoding="utf-8") as handle:
+            for trace in traces:
+                handle.write(json.dumps(trace.to_dict(), default=str) + "\n")
+
+
+class OtlpSink:
+    def __init__(self, endpoint=OTLP_ENDPOINT):
+        self.endpoint = endpoint
+
+    def write(self, traces):
+        body = json.dumps(to_otlp(traces), default=str).encode()
+        req = urllib.request.Request(
+            self.endpoint, data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(req, timeout=5) as response:
+            response.read()
+
+
+class Exporter(threading.Thread):
+    """Drains finished traces to a sink in batches; drops traces when it falls behind."""
+
+    def __init__(self, sink):
+        super().__init__(name="trace-exporter", daemon=True)
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self.exported = 0
+
+    def submit(self, trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.sink.write(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error("Error exporting traces: %s", e)
+
+
+class _NullExporter:
+    def submit(self, trace):
+        pass
+
+
+_exporter = None
+_exporter_pid = None
+_lock = threading.Lock()
+
+
+def get_exporter():
+    """Return this process's exporter, starting its thread on first use."""
+    global _exporter, _exporter_pid
+    pid = os.getpid()
+    if _exporter is not None and _exporter_pid == pid:
+        return _exporter
+    with _lock:
+        if _exporter is None or _exporter_pid != pid:
+            if EXPORTER == "otlp":
+                _exporter = Exporter(OtlpSink())
+            elif EXPORTER == "jsonl":
+                _exporter = Exporter(JsonlSink())
+            else:
+                _exporter = _NullExporter()
+            if isinstance(_exporter, Exporter):
+                _exporter.start()
+            _exporter_pid = pid
+    return _exporter
+
+
+class _CollectorHandler(BaseHTTPRequestHandler):
+    output = None
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_error(400, "Only OTLP/HTTP JSON is supported")
+            return
+        for resource in payload.get("resourceSpans", []):
+            for scope in resource.get("scopeSpans", []):
+                for span in scope.get("spans", []):
+                    duration = (
+                        int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+                    ) / 1e6
+                    print(f"{span['traceId'][:8]} {span['name']} {duration:.2f} ms")
+        if self.output:
+            with open(self.output, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(payload) + "\n")
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OTLP/HTTP trace collector stub")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", help="also append each request body to this file")
+    args = parser.parse_args()
+
+    _CollectorHandler.output = args.output
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _CollectorHandler)
+    print(f"Collecting OTLP/HTTP JSON traces on http://127.0.0.1:{args.port}/v1/traces")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
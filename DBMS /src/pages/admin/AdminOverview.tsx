@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { ArrowUp, ArrowDown, Users, Calendar, Flag, DollarSign } from 'lucide-react';
-import { mockUsers, mockEvents, mockTeams, mockPayments, mockRegistrations } from '../../utils/mockData';
+import { reportsService } from '../../services/reports.service';
 
 // Mock data for charts
 const mockRevenueData = [
@@ -31,26 +31,21 @@ const AdminOverview: React.FC = () => {
   });
 
   useEffect(() => {
-    // Calculate statistics from mock data
-    const totalUsers = mockUsers.length;
-    const totalEvents = mockEvents.length;
-    const totalTeams = mockTeams.length;
-    
-    const totalRevenue = mockPayments.reduce((sum, payment) => {
-      return sum + (payment.payment_status === 'completed' ? payment.amount : 0);
-    }, 0);
-    
-    const pendingRegistrations = mockRegistrations.filter(
-      reg => reg.registration_status === 'pending'
-    ).length;
-
-    setStats({
-      totalUsers,
-      totalEvents,
-      totalTeams,
-      totalRevenue,
-      pendingRegistrations,
-    });
+    // Totals come precomputed from the server's reporting rollup
+    reportsService
+      .getOverview()
+      .then(({ data }) => {
+        const overview = data[0];
+        if (!overview) return;
+        setStats({
+          totalUsers: overview.total_users,
+          totalEvents: overview.total_events,
+          totalTeams: overview.total_teams,
+          totalRevenue: Number(overview.total_revenue),
+          pendingRegistrations: overview.pending_registrations,
+        });
+      })
+      .catch((error) => console.error('Failed to load overview report', error));
   }, []);
 
   return (
@@ -12,14 +12,39 @@ export interface Event {
   registration_deadline: string;
   fee: number;
   organizer_id: number;
+  updated_at?: string;
+}
+
+export interface EventQuery {
+  status?: string;
+  category?: string;
+  date_from?: string;
+  date_to?: string;
+  fee_min?: number;
+  fee_max?: number;
+  limit?: number;
+  cursor?: string;
+}
+
+export interface EventPage {
+  events: Event[];
+  nextCursor: string | null;
 }
 
 export const eventsService = {
-  async getAllEvents() {
-    const response = await api.get('/events');
+  async getAllEvents(query: EventQuery = {}) {
+    const response = await api.get('/events', { params: query });
     return response.data;
   },
 
+  async getEventsPage(query: EventQuery = {}): Promise<EventPage> {
+    const response = await api.get('/events', { params: query });
+    return {
+      events: response.data,
+      nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
+  },
+
   async getEventById(id: number) {
     const response = await api.get(`/events/${id}`);
     return response.data;
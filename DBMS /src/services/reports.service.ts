@@ -0,0 +1,41 @@
+import api from '../utils/api';
+
+export interface PlatformOverview {
+  total_users: number;
+  total_events: number;
+  total_teams: number;
+  total_revenue: string;
+  pending_registrations: number;
+}
+
+export interface ReportResponse<T> {
+  data: T[];
+  refreshed_at: string | null;
+}
+
+export const reportsService = {
+  async getOverview() {
+    const response = await api.get<ReportResponse<PlatformOverview>>('/reports/overview');
+    return response.data;
+  },
+
+  async getRegistrationStats(eventId?: number) {
+    const response = await api.get('/reports/registrations', { params: { event_id: eventId } });
+    return response.data;
+  },
+
+  async getRevenue(params: { event_id?: number; date_from?: string; date_to?: string } = {}) {
+    const response = await api.get('/reports/revenue', { params });
+    return response.data;
+  },
+
+  async getTeamParticipation(eventId?: number) {
+    const response = await api.get('/reports/teams', { params: { event_id: eventId } });
+    return response.data;
+  },
+
+  async getFeedback(eventId?: number) {
+    const response = await api.get('/reports/feedback', { params: { event_id: eventId } });
+    return response.data;
+  },
+};
@@ -31,9 +31,27 @@ CREATE TABLE IF NOT EXISTS events (
     registration_deadline DATE NOT NULL,
     fee DECIMAL(10, 2) NOT NULL,
     organizer_id INTEGER REFERENCES users(id),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    capacity INTEGER CONSTRAINT events_capacity_range
+        CHECK (capacity IS NULL OR capacity BETWEEN 1 AND 100000),
+    -- Venue coordinates for nearby search
+    location GEOGRAPHY(Point, 4326),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Row version used for ETags
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_set_updated_at ON events;
+CREATE TRIGGER events_set_updated_at
+    BEFORE UPDATE ON events
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
 -- Teams table
 CREATE TABLE IF NOT EXISTS teams (
     id SERIAL PRIMARY KEY,
@@ -57,10 +75,19 @@ CREATE TABLE IF NOT EXISTS registrations (
     user_id INTEGER REFERENCES users(id),
     team_id INTEGER REFERENCES teams(id),
     event_id INTEGER REFERENCES events(id) NOT NULL,
-    registration_status VARCHAR(20) CHECK (registration_status IN ('pending', 'confirmed', 'cancelled')) DEFAULT 'pending',
+    registration_status VARCHAR(20) CHECK (registration_status IN ('pending', 'confirmed', 'cancelled', 'waitlisted')) DEFAULT 'pending',
     registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Event Slots table: one pre-created row per seat of an event with a
+-- capacity, claimed by registrations with SKIP LOCKED
+CREATE TABLE IF NOT EXISTS event_slots (
+    event_id INTEGER REFERENCES events(id) ON DELETE CASCADE NOT NULL,
+    slot_no INTEGER NOT NULL,
+    registration_id INTEGER UNIQUE REFERENCES registrations(id) ON DELETE SET NULL,
+    PRIMARY KEY (event_id, slot_no)
+);
+
 -- Payments table
 CREATE TABLE IF NOT EXISTS payments (
     id SERIAL PRIMARY KEY,
@@ -99,16 +126,468 @@ CREATE TABLE IF NOT EXISTS communication_logs (
     user_id INTEGER REFERENCES users(id) NOT NULL,
     message_type VARCHAR(50) NOT NULL,
     message_content TEXT NOT NULL,
-    sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20),
+    job_id BIGINT
+);
+
+-- Background job queue, drained by server/jobs.py workers
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    locked_by VARCHAR(100),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Event Stats table: exact per-event counters kept by triggers, split over
+-- shard rows that are summed on read
+CREATE TABLE IF NOT EXISTS event_stats (
+    event_id INTEGER REFERENCES events(id) ON DELETE CASCADE NOT NULL,
+    shard SMALLINT NOT NULL,
+    registered INTEGER NOT NULL DEFAULT 0,
+    confirmed INTEGER NOT NULL DEFAULT 0,
+    waitlisted INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, shard)
+);
+
+-- Hashed n-gram embeddings of events for recommendations (see
+-- server/recommendations.py); active marks events still open for registration
+CREATE TABLE IF NOT EXISTS event_embeddings (
+    event_id INTEGER PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+    embedding vector(256) NOT NULL,
+    active BOOLEAN NOT NULL,
+    source_updated_at TIMESTAMP NOT NULL
 );
 
 -- Create indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_events_date ON events(event_date);
 CREATE INDEX IF NOT EXISTS idx_events_status ON events(status);
+-- Partial job indexes stay as small as the backlog, not the job history
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(run_at, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_jobs_done ON jobs(finished_at) WHERE status = 'done';
+-- Composite indexes backing keyset pagination on (event_date, id)
+CREATE INDEX IF NOT EXISTS idx_events_date_id ON events(event_date, id);
+CREATE INDEX IF NOT EXISTS idx_events_status_date_id ON events(status, event_date, id);
+CREATE INDEX IF NOT EXISTS idx_events_category_date_id ON events(category, event_date, id);
+CREATE INDEX IF NOT EXISTS idx_events_location ON events USING GIST (location);
 CREATE INDEX IF NOT EXISTS idx_registrations_event ON registrations(event_id);
 CREATE INDEX IF NOT EXISTS idx_registrations_user ON registrations(user_id);
 CREATE INDEX IF NOT EXISTS idx_registrations_team ON registrations(team_id);
+-- One registration per user and per team for each event; these back the
+-- INSERT ... ON CONFLICT in create_registration
+CREATE UNIQUE INDEX IF NOT EXISTS uq_registrations_event_user ON registrations(event_id, user_id) WHERE user_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_registrations_event_team ON registrations(event_id, team_id) WHERE team_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_registrations_waitlist ON registrations(event_id, registration_date, id) WHERE registration_status = 'waitlisted';
+CREATE INDEX IF NOT EXISTS idx_event_slots_free ON event_slots(event_id, slot_no) WHERE registration_id IS NULL;
 CREATE INDEX IF NOT EXISTS idx_team_members_user ON team_members(user_id);
 CREATE INDEX IF NOT EXISTS idx_payments_registration ON payments(registration_id);
 CREATE INDEX IF NOT EXISTS idx_feedback_event ON feedback(event_id);
 CREATE INDEX IF NOT EXISTS idx_results_event ON results(event_id);
+-- BM25 full-text search over events (see server/search.py)
+CREATE INDEX IF NOT EXISTS idx_events_bm25 ON events
+    USING bm25 (id, name, description, venue, category)
+    WITH (key_field = 'id');
+CREATE INDEX IF NOT EXISTS idx_event_embeddings_active ON event_embeddings
+    USING hnsw (embedding vector_cosine_ops) WHERE active;
+
+-- Seat allocation: keep event_slots in step with events.capacity, hand a
+-- cancelled seat to the oldest waitlisted registration and seat a cancelled
+-- registration that is reinstated
+CREATE OR REPLACE FUNCTION sync_event_slots() RETURNS trigger AS $$
+BEGIN
+    IF NEW.capacity IS NULL THEN
+        -- Unlimited: drop free slots and admit the whole waitlist
+        DELETE FROM event_slots WHERE event_id = NEW.id AND registration_id IS NULL;
+        UPDATE registrations SET registration_status = 'pending'
+        WHERE event_id = NEW.id AND registration_status = 'waitlisted';
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO event_slots (event_id, slot_no)
+    SELECT NEW.id, g FROM generate_series(1, NEW.capacity) AS g
+    ON CONFLICT DO NOTHING;
+    -- Shrinking never evicts a seat that is already taken
+    DELETE FROM event_slots
+    WHERE event_id = NEW.id AND slot_no > NEW.capacity AND registration_id IS NULL;
+
+    -- Seat registrations that hold no slot yet: active ones from before the
+    -- capacity was set first, then the waitlist in arrival order
+    WITH free AS (
+        SELECT slot_no, row_number() OVER (ORDER BY slot_no) AS n
+        FROM event_slots
+        WHERE event_id = NEW.id AND registration_id IS NULL
+    ),
+    waiting AS (
+        SELECT r.id, row_number() OVER (
+            ORDER BY r.registration_status = 'waitlisted', r.registration_date, r.id
+        ) AS n
+        FROM registrations r
+        WHERE r.event_id = NEW.id
+            AND r.registration_status IN ('pending', 'confirmed', 'waitlisted')
+            AND NOT EXISTS (SELECT 1 FROM event_slots s WHERE s.registration_id = r.id)
+    ),
+    assigned AS (
+        UPDATE event_slots s SET registration_id = waiting.id
+        FROM free JOIN waiting USING (n)
+        WHERE s.event_id = NEW.id AND s.slot_no = free.slot_no
+        RETURNING s.registration_id
+    )
+    UPDATE registrations SET registration_status = 'pending'
+    WHERE id IN (SELECT registration_id FROM assigned)
+        AND registration_status = 'waitlisted';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION release_event_slot() RETURNS trigger AS $$
+DECLARE
+    freed INTEGER;
+    promoted INTEGER;
+BEGIN
+    UPDATE event_slots SET registration_id = NULL
+    WHERE registration_id = OLD.id
+    RETURNING slot_no INTO freed;
+    IF freed IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT id INTO promoted FROM registrations
+    WHERE event_id = OLD.event_id AND registration_status = 'waitlisted'
+    ORDER BY registration_date, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+    IF promoted IS NOT NULL THEN
+        UPDATE event_slots SET registration_id = promoted
+        WHERE event_id = OLD.event_id AND slot_no = freed;
+        UPDATE registrations SET registration_status = 'pending' WHERE id = promoted;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION claim_event_slot() RETURNS trigger AS $$
+DECLARE
+    seat INTEGER;
+BEGIN
+    IF (SELECT capacity FROM events WHERE id = NEW.event_id) IS NULL
+        OR EXISTS (SELECT 1 FROM event_slots WHERE registration_id = NEW.id) THEN
+        RETURN NEW;
+    END IF;
+
+    -- The same pick as REGISTER_SQL; with no seat free the row joins the waitlist
+    SELECT slot_no INTO seat FROM event_slots
+    WHERE event_id = NEW.event_id AND registration_id IS NULL
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+    IF seat IS NULL THEN
+        NEW.registration_status := 'waitlisted';
+    ELSE
+        UPDATE event_slots SET registration_id = NEW.id
+        WHERE event_id = NEW.event_id AND slot_no = seat;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_sync_slots_insert ON events;
+CREATE TRIGGER events_sync_slots_insert
+    AFTER INSERT ON events
+    FOR EACH ROW WHEN (NEW.capacity IS NOT NULL)
+    EXECUTE FUNCTION sync_event_slots();
+
+DROP TRIGGER IF EXISTS events_sync_slots_update ON events;
+CREATE TRIGGER events_sync_slots_update
+    AFTER UPDATE OF capacity ON events
+    FOR EACH ROW WHEN (OLD.capacity IS DISTINCT FROM NEW.capacity)
+    EXECUTE FUNCTION sync_event_slots();
+
+DROP TRIGGER IF EXISTS registrations_release_slot ON registrations;
+CREATE TRIGGER registrations_release_slot
+    AFTER UPDATE OF registration_status ON registrations
+    FOR EACH ROW WHEN (
+        NEW.registration_status = 'cancelled'
+        AND OLD.registration_status <> 'cancelled'
+    )
+    EXECUTE FUNCTION release_event_slot();
+
+DROP TRIGGER IF EXISTS registrations_claim_slot ON registrations;
+CREATE TRIGGER registrations_claim_slot
+    BEFORE UPDATE OF registration_status ON registrations
+    FOR EACH ROW WHEN (
+        OLD.registration_status = 'cancelled'
+        AND NEW.registration_status IN ('pending', 'confirmed')
+    )
+    EXECUTE FUNCTION claim_event_slot();
+
+-- Event counters: triggers push deltas into event_stats
+CREATE OR REPLACE FUNCTION bump_event_stats(
+    p_event_id INTEGER,
+    d_registered INTEGER,
+    d_confirmed INTEGER,
+    d_waitlisted INTEGER,
+    d_revenue NUMERIC,
+    d_rating_sum INTEGER,
+    d_rating_count INTEGER
+) RETURNS void AS $$
+    -- Concurrent writers land on different shard rows (by backend pid), so
+    -- a popular event does not serialize every registration on one row
+    INSERT INTO event_stats AS s (
+        event_id, shard, registered, confirmed, waitlisted,
+        revenue, rating_sum, rating_count
+    )
+    VALUES (
+        p_event_id, pg_backend_pid() % 8, d_registered, d_confirmed,
+        d_waitlisted, d_revenue, d_rating_sum, d_rating_count
+    )
+    ON CONFLICT (event_id, shard) DO UPDATE SET
+        registered = s.registered + EXCLUDED.registered,
+        confirmed = s.confirmed + EXCLUDED.confirmed,
+        waitlisted = s.waitlisted + EXCLUDED.waitlisted,
+        revenue = s.revenue + EXCLUDED.revenue,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+        rating_count = s.rating_count + EXCLUDED.rating_count;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION registrations_event_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_event_stats(
+            OLD.event_id,
+            -(OLD.registration_status IN ('pending', 'confirmed'))::int,
+            -(OLD.registration_status = 'confirmed')::int,
+            -(OLD.registration_status = 'waitlisted')::int,
+            0, 0, 0
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_event_stats(
+            NEW.event_id,
+            (NEW.registration_status IN ('pending', 'confirmed'))::int,
+            (NEW.registration_status = 'confirmed')::int,
+            (NEW.registration_status = 'waitlisted')::int,
+            0, 0, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION payments_event_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_status = 'completed' THEN
+        PERFORM bump_event_stats(
+            (SELECT event_id FROM registrations WHERE id = OLD.registration_id),
+            0, 0, 0, -OLD.amount, 0, 0
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_status = 'completed' THEN
+        PERFORM bump_event_stats(
+            (SELECT event_id FROM registrations WHERE id = NEW.registration_id),
+            0, 0, 0, NEW.amount, 0, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION feedback_event_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+        PERFORM bump_event_stats(OLD.event_id, 0, 0, 0, 0, -OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+        PERFORM bump_event_stats(NEW.event_id, 0, 0, 0, 0, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS registrations_event_stats_insert_delete ON registrations;
+CREATE TRIGGER registrations_event_stats_insert_delete
+    AFTER INSERT OR DELETE ON registrations
+    FOR EACH ROW
+    EXECUTE FUNCTION registrations_event_stats();
+
+DROP TRIGGER IF EXISTS registrations_event_stats_update ON registrations;
+CREATE TRIGGER registrations_event_stats_update
+    AFTER UPDATE OF registration_status, event_id ON registrations
+    FOR EACH ROW WHEN (
+        OLD.registration_status IS DISTINCT FROM NEW.registration_status
+        OR OLD.event_id IS DISTINCT FROM NEW.event_id
+    )
+    EXECUTE FUNCTION registrations_event_stats();
+
+DROP TRIGGER IF EXISTS payments_event_stats ON payments;
+CREATE TRIGGER payments_event_stats
+    AFTER INSERT OR UPDATE OR DELETE ON payments
+    FOR EACH ROW
+    EXECUTE FUNCTION payments_event_stats();
+
+DROP TRIGGER IF EXISTS feedback_event_stats ON feedback;
+CREATE TRIGGER feedback_event_stats
+    AFTER INSERT OR UPDATE OR DELETE ON feedback
+    FOR EACH ROW
+    EXECUTE FUNCTION feedback_event_stats();
+
+-- Cache invalidation: row changes are broadcast on commit to the listener
+-- thread in every API worker (see server/invalidation.py)
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+DECLARE
+    rec JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := to_jsonb(OLD);
+    ELSE
+        rec := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify('cache_invalidation', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', rec->'id',
+        'event_id', rec->'event_id',
+        'user_id', rec->'user_id'
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_cache_invalidation ON events;
+-- A new event cannot be cached yet, so inserts (bulk imports included) are
+-- not broadcast
+CREATE TRIGGER events_cache_invalidation
+    AFTER UPDATE OR DELETE ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS users_cache_invalidation ON users;
+CREATE TRIGGER users_cache_invalidation
+    AFTER UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS registrations_cache_invalidation ON registrations;
+CREATE TRIGGER registrations_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE ON registrations
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS feedback_cache_invalidation ON feedback;
+CREATE TRIGGER feedback_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE ON feedback
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+-- Registration notifications are enqueued with the change itself, so
+-- waitlist promotions and bulk updates are covered as well
+CREATE OR REPLACE FUNCTION enqueue_registration_notification() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO jobs (job_type, payload)
+    VALUES ('registration_status', json_build_object(
+        'registration_id', NEW.id,
+        'status', NEW.registration_status
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS registrations_notify_insert ON registrations;
+CREATE TRIGGER registrations_notify_insert
+    AFTER INSERT ON registrations
+    FOR EACH ROW EXECUTE FUNCTION enqueue_registration_notification();
+
+DROP TRIGGER IF EXISTS registrations_notify_update ON registrations;
+CREATE TRIGGER registrations_notify_update
+    AFTER UPDATE OF registration_status ON registrations
+    FOR EACH ROW WHEN (OLD.registration_status IS DISTINCT FROM NEW.registration_status)
+    EXECUTE FUNCTION enqueue_registration_notification();
+
+-- Reporting rollups for the dashboards, refreshed CONCURRENTLY by
+-- server/reports.py
+CREATE TABLE IF NOT EXISTS report_refreshes (
+    view_name VARCHAR(100) PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_platform_overview AS
+SELECT
+    1 AS id,
+    (SELECT count(*) FROM users) AS total_users,
+    (SELECT count(*) FROM events) AS total_events,
+    (SELECT count(*) FROM teams) AS total_teams,
+    (SELECT COALESCE(sum(amount), 0) FROM payments
+        WHERE payment_status = 'completed') AS total_revenue,
+    (SELECT count(*) FROM registrations
+        WHERE registration_status = 'pending') AS pending_registrations;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_platform_overview ON mv_platform_overview(id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_event_registration_stats AS
+SELECT
+    e.id AS event_id,
+    e.name AS event_name,
+    e.category,
+    e.organizer_id,
+    count(r.id) AS total,
+    count(r.id) FILTER (WHERE r.registration_status = 'pending') AS pending,
+    count(r.id) FILTER (WHERE r.registration_status = 'confirmed') AS confirmed,
+    count(r.id) FILTER (WHERE r.registration_status = 'cancelled') AS cancelled,
+    count(r.id) FILTER (WHERE r.registration_status = 'waitlisted') AS waitlisted
+FROM events e
+LEFT JOIN registrations r ON r.event_id = e.id
+GROUP BY e.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_event_registration_stats ON mv_event_registration_stats(event_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_event_revenue_daily AS
+SELECT
+    r.event_id,
+    e.organizer_id,
+    COALESCE(p.payment_date, p.created_at)::date AS day,
+    count(*) AS payments,
+    COALESCE(sum(p.amount) FILTER (WHERE p.payment_status = 'completed'), 0) AS revenue,
+    COALESCE(sum(p.amount) FILTER (WHERE p.payment_status = 'refunded'), 0) AS refunded
+FROM payments p
+JOIN registrations r ON r.id = p.registration_id
+JOIN events e ON e.id = r.event_id
+WHERE COALESCE(p.payment_date, p.created_at) IS NOT NULL
+GROUP BY r.event_id, e.organizer_id, COALESCE(p.payment_date, p.created_at)::date;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_event_revenue_daily ON mv_event_revenue_daily(event_id, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_team_participation AS
+SELECT
+    t.event_id,
+    e.name AS event_name,
+    e.organizer_id,
+    count(DISTINCT t.id) AS teams,
+    count(tm.user_id) AS members
+FROM teams t
+JOIN events e ON e.id = t.event_id
+LEFT JOIN team_members tm ON tm.team_id = t.id
+GROUP BY t.event_id, e.name, e.organizer_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_team_participation ON mv_team_participation(event_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_event_feedback AS
+SELECT
+    f.event_id,
+    e.name AS event_name,
+    e.organizer_id,
+    count(*) AS responses,
+    round(avg(f.rating), 2) AS avg_rating,
+    count(*) FILTER (WHERE f.rating = 1) AS rating_1,
+    count(*) FILTER (WHERE f.rating = 2) AS rating_2,
+    count(*) FILTER (WHERE f.rating = 3) AS rating_3,
+    count(*) FILTER (WHERE f.rating = 4) AS rating_4,
+    count(*) FILTER (WHERE f.rating = 5) AS rating_5
+FROM feedback f
+JOIN events e ON e.id = f.event_id
+GROUP BY f.event_id, e.name, e.organizer_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_event_feedback ON mv_event_feedback(event_id);
+CREATE INDEX IF NOT EXISTS idx_mv_event_registration_stats_organizer ON mv_event_registration_stats(organizer_id);
+CREATE INDEX IF NOT EXISTS idx_mv_event_revenue_daily_organizer ON mv_event_revenue_daily(organizer_id, day);